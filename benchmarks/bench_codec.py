@@ -0,0 +1,93 @@
+# Compares the size and the encoding/decoding/scanning speed of the legacy and
+# the varint record encoding on a synthetic trace, run with
+#   PYTHONPATH=src python benchmarks/bench_codec.py [records]
+import os
+import pickle
+import random
+import sys
+import tempfile
+import time
+
+from sflkitlib.events import codec, event
+
+FILE = "main.py"
+
+
+def base_events(n: int):
+    events = dict()
+    for event_id in range(n):
+        kind = event_id % 5
+        if kind == 0:
+            events[event_id] = event.DefEvent(FILE, event_id, event_id, "x")
+        elif kind == 1:
+            events[event_id] = event.ConditionEvent(FILE, event_id, event_id, "c", "t")
+        elif kind == 2:
+            events[event_id] = event.UseEvent(FILE, event_id, event_id, "x")
+        else:
+            events[event_id] = event.LineEvent(FILE, event_id, event_id)
+    return events
+
+
+def records(events, n: int):
+    rng = random.Random(0)
+    ids = list(events)
+    var_ids = [id(object()) for _ in range(64)]
+    trace = list()
+    for _ in range(n):
+        e = events[rng.choice(ids)]
+        if e.event_type == event.EventType.DEF:
+            value = pickle.dumps(rng.randrange(1000))
+            trace.append((e, (rng.choice(var_ids), value, "int")))
+        elif e.event_type == event.EventType.CONDITION:
+            trace.append((e, (rng.random() < 0.5,)))
+        elif e.event_type == event.EventType.USE:
+            trace.append((e, (rng.choice(var_ids),)))
+        else:
+            trace.append((e, ()))
+    return trace
+
+
+def encode(encoding: codec.Encoding, trace):
+    encoders = {
+        event.EventType.DEF: encoding.def_event,
+        event.EventType.CONDITION: encoding.condition_event,
+        event.EventType.USE: encoding.use_event,
+        event.EventType.LINE: encoding.event,
+    }
+    start = time.perf_counter()
+    data = [encoding.header()]
+    for e, args in trace:
+        data.append(encoders[e.event_type](e.event_id, *args))
+    return b"".join(data), time.perf_counter() - start
+
+
+def main(n: int = 200_000):
+    events = base_events(2_000)
+    trace = records(events, n)
+    print(
+        f"{'format':<8} {'bytes':>10} {'bytes/rec':>10} "
+        f"{'encode s':>10} {'decode s':>10} {'scan s':>10}"
+    )
+    for name, version in codec.FORMATS.items():
+        data, encode_time = encode(codec.encodings[version], trace)
+        fd, path = tempfile.mkstemp()
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(data)
+        try:
+            start = time.perf_counter()
+            decoded = event.load(path, events)
+            decode_time = time.perf_counter() - start
+            start = time.perf_counter()
+            statistics = event.scan(path, events)
+            scan_time = time.perf_counter() - start
+        finally:
+            os.remove(path)
+        assert len(decoded) == n == statistics.records
+        print(
+            f"{name:<8} {len(data):>10} {len(data) / n:>10.2f} "
+            f"{encode_time:>10.3f} {decode_time:>10.3f} {scan_time:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,42 @@
+# Measures the cost of importing sflkitlib.lib per interpreter start, compared
+# to an interpreter that imports nothing, run with
+#   PYTHONPATH=src python benchmarks/bench_import.py [starts]
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+PROGRAMS = {
+    "bare": "pass",
+    "import": "import sflkitlib.lib",
+    "event": "import sflkitlib.lib as lib\nlib.add_line_event(0)",
+    "value": "import sflkitlib.lib as lib\nlib.add_def_event(0, 1, 5, int)",
+}
+
+
+def run(program: str, starts: int, env) -> float:
+    start = time.perf_counter()
+    for _ in range(starts):
+        subprocess.run([sys.executable, "-c", program], env=env, check=True)
+    return (time.perf_counter() - start) / starts
+
+
+def main(starts: int = 50):
+    directory = tempfile.mkdtemp()
+    env = dict(os.environ)
+    env["EVENTS_PATH"] = os.path.join(directory, "events")
+    try:
+        bare = run(PROGRAMS["bare"], starts, env)
+        print(f"{'program':<8} {'ms/start':>10} {'ms/import':>10}")
+        for name, program in PROGRAMS.items():
+            seconds = bare if name == "bare" else run(program, starts, env)
+            print(f"{name:<8} {1000 * seconds:>10.2f} {1000 * (seconds - bare):>10.2f}")
+    finally:
+        if os.path.exists(env["EVENTS_PATH"]):
+            os.remove(env["EVENTS_PATH"])
+        os.rmdir(directory)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -1,5 +1,10 @@
 import sys
-from typing import Set, List
+
+# typing is only imported by type checkers, as it dominates the import time of
+# sflkitlib.lib in every instrumented process
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import List
 
 sys.path = sys.path[1:] + sys.path[:1]
 import enum
@@ -28,7 +33,7 @@ class EventType(enum.Enum):
     TEST_ASSERT = 17
 
     @classmethod
-    def events(cls) -> List["EventType"]:
+    def events(cls) -> "List[EventType]":
         return [
             cls.LINE,
             cls.BRANCH,
@@ -45,7 +50,7 @@ class EventType(enum.Enum):
         ]
 
     @classmethod
-    def test_events(cls) -> List["EventType"]:
+    def test_events(cls) -> "List[EventType]":
         return [
             cls.TEST_START,
             cls.TEST_END,
@@ -60,4 +65,17 @@ class EventType(enum.Enum):
         return self in self.test_events()
 
 
-__all__ = ["event", "EventType"]
+__all__ = [
+    "cache",
+    "catalog",
+    "collector",
+    "compare",
+    "event",
+    "index",
+    "merge",
+    "recovery",
+    "ring",
+    "spectrum",
+    "store",
+    "EventType",
+]
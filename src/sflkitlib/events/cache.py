@@ -0,0 +1,217 @@
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from sflkitlib.events import EventType
+from sflkitlib.events.catalog import load_catalog
+from sflkitlib.events.event import Capture, Event, load, segment_paths
+
+sys.path = sys.path[1:] + sys.path[:1]
+import array
+import collections
+import hashlib
+import os
+import pickle
+
+sys.path = sys.path[-1:] + sys.path[:-1]
+
+VERSION = 1
+# the arguments of instantiate() for the events that have a payload
+ARGS = {
+    EventType.DEF: ("var_id", "value", "type_"),
+    EventType.USE: ("var_id",),
+    EventType.FUNCTION_EXIT: ("return_value", "type_"),
+    EventType.CONDITION: ("value",),
+    EventType.LEN: ("var_id", "length"),
+    EventType.TEST_DEF: ("var_id",),
+    EventType.TEST_USE: ("var_id",),
+}
+
+
+def file_identity(path, content: bool = False) -> Tuple:
+    path = os.path.abspath(str(path))
+    if content:
+        digest = hashlib.sha256()
+        with open(path, "rb") as fp:
+            for chunk in iter(lambda: fp.read(1 << 20), b""):
+                digest.update(chunk)
+        return path, digest.hexdigest()
+    stat = os.stat(path)
+    return path, stat.st_size, stat.st_mtime_ns
+
+
+def trace_identity(path, content: bool = False) -> Tuple:
+    return tuple(
+        file_identity(segment, content) for segment in segment_paths(path) or [path]
+    )
+
+
+def estimate_size(events: Iterable[Event]) -> int:
+    # the memory of the event objects and of their payloads, which are decoded
+    # per record, without the strings they share with their base events
+    size = 0
+    for event in events:
+        size += sys.getsizeof(event) + sys.getsizeof(event.__dict__)
+        for name in ARGS.get(event.event_type, ()):
+            size += sys.getsizeof(getattr(event, name))
+    return size
+
+
+def encode_events(events: List[Event]) -> bytes:
+    # The decoded form of a trace: the event ids as an array and the payloads
+    # as a list, the rest is restored from the base events.
+    ids = array.array("q")
+    args = list()
+    captures = dict()
+    for position, event in enumerate(events):
+        ids.append(event.event_id)
+        names = ARGS.get(event.event_type)
+        if names is not None:
+            args.append(tuple(getattr(event, name) for name in names))
+        if event.capture is not None:
+            capture = event.capture
+            captures[position] = (capture.policy, capture.length, capture.fingerprint)
+    return pickle.dumps(
+        (VERSION, ids.tobytes(), args, captures), protocol=pickle.HIGHEST_PROTOCOL
+    )
+
+
+def decode_events(data: bytes, base_events: Dict[int, Event]) -> List[Event]:
+    version, ids, args, captures = pickle.loads(data)
+    if version != VERSION:
+        raise ValueError(f"unsupported decoded trace version {version}")
+    event_ids = array.array("q")
+    event_ids.frombytes(ids)
+    args = iter(args)
+    payload = {
+        event_id: event.event_type in ARGS for event_id, event in base_events.items()
+    }
+    events = [
+        base_events[event_id].instantiate(*next(args))
+        if payload[event_id]
+        else base_events[event_id].instantiate()
+        for event_id in event_ids
+    ]
+    for position, capture in captures.items():
+        events[position].capture = Capture(*capture)
+    return events
+
+
+class TraceCache:
+    # Keeps decoded traces and catalogs in memory and drops the least recently
+    # used ones once their estimated size exceeds budget bytes. A trace is
+    # keyed by the path, size and mtime of its segments, or their content hash
+    # with content=True, and by its catalog, which is a catalog file or a dict
+    # of base events. With a directory, traces decoded with a catalog file are
+    # also stored there in a compact decoded form, which later caches restore
+    # instead of decoding the trace. Cached catalogs are shared and must not
+    # be modified.
+    def __init__(
+        self, budget: int = 1 << 28, directory=None, content: bool = False
+    ):
+        self.budget = budget
+        self.directory = None if directory is None else str(directory)
+        self.content = content
+        # key -> (value, size, the dict of base events a key refers to by id)
+        self.entries: Dict[Tuple, Tuple[Any, int, Any]] = collections.OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.restores = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key: Tuple) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: Tuple, value: Any, size: int, anchor: Any = None):
+        if key in self.entries:
+            self.size -= self.entries.pop(key)[1]
+        if size > self.budget:
+            return
+        while self.entries and self.size + size > self.budget:
+            self.size -= self.entries.popitem(last=False)[1][1]
+        self.entries[key] = (value, size, anchor)
+        self.size += size
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+    def catalog(self, path) -> Dict[int, Event]:
+        key = ("catalog", file_identity(path, self.content))
+        base_events = self.get(key)
+        if base_events is None:
+            base_events = load_catalog(path)
+            self.put(key, base_events, estimate_size(base_events.values()))
+        return base_events
+
+    def stored_path(self, key: Tuple) -> str:
+        return os.path.join(
+            self.directory, hashlib.sha256(repr(key).encode("utf8")).hexdigest()
+        )
+
+    def restore(self, key: Tuple, base_events: Dict[int, Event]):
+        path = self.stored_path(key)
+        if not os.path.exists(path):
+            return None
+        # noinspection PyBroadException
+        try:
+            with open(path, "rb") as fp:
+                stored_key, data = pickle.load(fp)
+            if stored_key != key:
+                return None
+            events = decode_events(data, base_events)
+        except:
+            return None
+        self.restores += 1
+        return events
+
+    def store(self, key: Tuple, events: List[Event]):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.stored_path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        # noinspection PyBroadException
+        try:
+            with open(tmp, "wb") as fp:
+                pickle.dump((key, encode_events(events)), fp)
+            os.replace(tmp, path)
+        except:
+            # e.g. values that cannot be pickled, the trace is only cached in
+            # memory
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def load(self, path, catalog: Union[str, os.PathLike, Dict[int, Event]]):
+        # returns a new list of the events that event.load returns
+        if isinstance(catalog, dict):
+            base_events, anchor = catalog, catalog
+            catalog_key = ("events", id(catalog))
+            persistent = False
+        else:
+            base_events, anchor = self.catalog(catalog), None
+            catalog_key = file_identity(catalog, self.content)
+            persistent = self.directory is not None
+        key = ("trace", trace_identity(path, self.content), catalog_key)
+        events = self.get(key)
+        if events is None:
+            events = self.restore(key, base_events) if persistent else None
+            if events is None:
+                events = load(path, base_events)
+                if persistent:
+                    self.store(key, events)
+            self.put(key, events, estimate_size(events), anchor)
+        return list(events)
+
+
+default_cache = TraceCache()
+
+
+def load_cached(path, catalog: Union[str, os.PathLike, Dict[int, Event]]):
+    return default_cache.load(path, catalog)
@@ -0,0 +1,117 @@
+import sys
+from typing import Dict, Iterable, Iterator, List, TextIO
+
+from sflkitlib.events import EventType
+from sflkitlib.events.event import Event, deserialize, event_mapping
+
+sys.path = sys.path[1:] + sys.path[:1]
+import json
+
+sys.path = sys.path[-1:] + sys.path[:-1]
+
+# The compact catalog is a JSON Lines file that starts with the header line
+# {"catalog": 1}. A line ["<file>"] interns the next file string, a line
+# {"type": <event type>, "fields": [...]} declares the fields of an event type
+# beyond file, line and id, and a line [<event type>, <file index>, <line>,
+# <id>, <field values>...] is an event. Files and fields are declared before
+# their first use, so the catalog can be written and read one event at a time.
+# The fields are declared in the order of serialize(), which is the order of
+# the constructor arguments after file, line and id that deserialize() uses,
+# so events are constructed directly from the field values.
+CATALOG = "catalog"
+VERSION = 1
+BASE_FIELDS = ("file", "line", "id", "event_type")
+
+
+class CatalogWriter:
+    def __init__(self, fp: TextIO):
+        self.fp = fp
+        self.files: Dict[str, int] = dict()
+        self.fields: Dict[int, List[str]] = dict()
+        fp.write(json.dumps({CATALOG: VERSION}) + "\n")
+
+    def write(self, event: Event):
+        serialized = event.serialize()
+        event_type = serialized["event_type"]
+        fields = self.fields.get(event_type)
+        if fields is None:
+            fields = [f for f in serialized if f not in BASE_FIELDS]
+            self.fields[event_type] = fields
+            self.fp.write(json.dumps({"type": event_type, "fields": fields}) + "\n")
+        file = self.files.get(event.file)
+        if file is None:
+            file = self.files[event.file] = len(self.files)
+            self.fp.write(json.dumps([event.file]) + "\n")
+        self.fp.write(
+            json.dumps(
+                [event_type, file, event.line, event.event_id]
+                + [serialized[f] for f in fields]
+            )
+            + "\n"
+        )
+
+    def write_all(self, events: Iterable[Event]):
+        for event in events:
+            self.write(event)
+
+
+def read_compact(lines: Iterable[str]) -> Iterator[Event]:
+    files: List[str] = list()
+    constructors = dict()
+    for line in lines:
+        if not line.strip():
+            continue
+        entry = json.loads(line)
+        if isinstance(entry, dict):
+            constructors[entry["type"]] = event_mapping[EventType(entry["type"])]
+        elif len(entry) == 1:
+            files.append(entry[0])
+        else:
+            yield constructors[entry[0]](files[entry[1]], *entry[2:])
+
+
+def read_lines(lines: Iterable[str]) -> Iterator[Event]:
+    for line in lines:
+        if line.strip():
+            yield deserialize(json.loads(line))
+
+
+def iter_catalog_stream(fp: TextIO) -> Iterator[Event]:
+    # Yields the events of a compact catalog, a JSON Lines file with one
+    # serialized event per line or, without streaming, a JSON document as
+    # read by event.load_json.
+    first = fp.readline()
+    if first.lstrip().startswith("["):
+        fp.seek(0)
+        yield from map(deserialize, json.load(fp))
+        return
+    header = json.loads(first) if first.strip() else None
+    if isinstance(header, dict) and CATALOG in header:
+        if header[CATALOG] != VERSION:
+            raise ValueError(f"unsupported catalog version {header[CATALOG]}")
+        yield from read_compact(fp)
+    else:
+        if header is not None:
+            yield deserialize(header)
+        yield from read_lines(fp)
+
+
+def iter_catalog(path) -> Iterator[Event]:
+    with open(path, "r") as fp:
+        yield from iter_catalog_stream(fp)
+
+
+def load_catalog(path) -> Dict[int, Event]:
+    return {event.event_id: event for event in iter_catalog(path)}
+
+
+def dump_catalog(path, events: Iterable[Event]):
+    with open(path, "w") as fp:
+        CatalogWriter(fp).write_all(events)
+
+
+def dump_lines(path, events: Iterable[Event]):
+    with open(path, "w") as fp:
+        for event in events:
+            fp.write(json.dumps(event.serialize()) + "\n")
+
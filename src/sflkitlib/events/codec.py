@@ -1,9 +1,12 @@
-from typing import Union, Any
+# typing is only imported by type checkers, see sflkitlib.events
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Union, Any, BinaryIO, Callable, List, Optional, Tuple
 
 ENDIAN = "big"
 
 
-def get_byte_length(x: Union[int, float]):
+def get_byte_length(x: "Union[int, float]"):
     return max((x.bit_length() + 7) // 8, 1)
 
 
@@ -33,13 +36,16 @@ def encode_base_def_event(
 def encode_def_event(
     event_id: int,
     var_id: int,
-    value: Any,
-    type_: str,
+    value: "Any",
+    type_: "Union[str, bytes]",
 ):
     if isinstance(value, bytes):
         value = value
     else:
         value = str(value).encode("utf8")
+    # the recorder passes type names it has already encoded
+    if isinstance(type_, str):
+        type_ = type_.encode("utf8")
     len_value = len(value)
     len_type = len(type_)
     return encode_base_def_event(event_id, var_id) + b"".join(
@@ -47,20 +53,22 @@ def encode_def_event(
             len_value.to_bytes(4, ENDIAN),
             value,
             len_type.to_bytes(2, ENDIAN),
-            type_.encode("utf8"),
+            type_,
         ]
     )
 
 
 def encode_function_exit_event(
     event_id: int,
-    return_value: Any,
-    type_: str,
+    return_value: "Any",
+    type_: "Union[str, bytes]",
 ):
     if isinstance(return_value, bytes):
         value = return_value
     else:
         value = str(return_value).encode("utf8")
+    if isinstance(type_, str):
+        type_ = type_.encode("utf8")
     len_value = len(value)
     len_type = len(type_)
     return encode_event(event_id) + b"".join(
@@ -68,7 +76,7 @@ def encode_function_exit_event(
             len_value.to_bytes(4, ENDIAN),
             value,
             len_type.to_bytes(2, ENDIAN),
-            type_.encode("utf8"),
+            type_,
         ]
     )
 
@@ -112,3 +120,376 @@ def encode_len_event(
             length.to_bytes(len_length, ENDIAN),
         ]
     )
+
+
+# A record starting with a zero length byte is an extended record, the next byte
+# holds its kind. encode_event never produces a zero length byte.
+EXTENDED = 0
+CONDITION_BLOCK = 1
+FORMAT = 2
+SYNC = 3
+HIT_COUNTS = 4
+CAPTURE = 5
+LOOP_SUMMARY = 6
+
+# How a str, bytes or bytearray value was captured, see encode_capture
+EXACT = 0
+TRUNCATE = 1
+FINGERPRINT = 2
+CAPTURE_POLICIES = {"exact": EXACT, "truncate": TRUNCATE, "fingerprint": FINGERPRINT}
+
+# Versions of the record encoding, a trace without a format record is LEGACY.
+LEGACY = 1
+VARINT = 2
+FORMATS = {"legacy": LEGACY, "varint": VARINT}
+# Set in the version of a format record if every following record, as written
+# by one write of the recorder, ends in a varint of the nanoseconds since the
+# previous record. Format and sync records carry no timestamp.
+TIMESTAMPED = 0x80
+
+
+def base_version(version: int) -> int:
+    return version & ~TIMESTAMPED
+
+
+def encode_extended(kind: int):
+    return b"".join(
+        [
+            EXTENDED.to_bytes(1, ENDIAN),
+            kind.to_bytes(1, ENDIAN),
+        ]
+    )
+
+
+def encode_condition_block(
+    event_id: int,
+    count: int,
+    bits: int,
+):
+    # bit i of bits holds the outcome of the i-th evaluation of the condition
+    len_count = get_byte_length(count)
+    return (
+        encode_extended(CONDITION_BLOCK)
+        + encode_event(event_id)
+        + b"".join(
+            [
+                len_count.to_bytes(1, ENDIAN),
+                count.to_bytes(len_count, ENDIAN),
+                bits.to_bytes((count + 7) // 8, "little"),
+            ]
+        )
+    )
+
+
+def encode_len_int(x: int):
+    len_x = get_byte_length(x)
+    return len_x.to_bytes(1, ENDIAN) + x.to_bytes(len_x, ENDIAN)
+
+
+def encode_hit_counts(counts: "List[Tuple[int, int]]"):
+    # (event_id, count) pairs standing for count hits of each event in unknown
+    # order, written instead of the events once a trace exceeded its budget
+    return encode_extended(HIT_COUNTS) + b"".join(
+        [encode_len_int(len(counts))]
+        + [encode_len_int(event_id) + encode_len_int(c) for event_id, c in counts]
+    )
+
+
+def encode_capture(policy: int, length: int, fingerprint: int = 0):
+    # Precedes a DEF or FUNCTION_EXIT record whose value was not captured
+    # exactly: length is the length of the original value, a truncated value
+    # keeps its prefix, a fingerprinted value keeps only the CRC-32 of its
+    # utf8 encoding.
+    return b"".join(
+        [
+            encode_extended(CAPTURE),
+            policy.to_bytes(1, ENDIAN),
+            encode_len_int(length),
+            fingerprint.to_bytes(4, ENDIAN) if policy == FINGERPRINT else b"",
+        ]
+    )
+
+
+def encode_loop_summary(
+    begin_id: int, count: int, hit_id: "Optional[int]", end_id: "Optional[int]"
+):
+    # Stands for the LOOP_BEGIN, count LOOP_HITs and the LOOP_END of one run of
+    # a loop. hit_id is only written for count > 0, end_id is None for a loop
+    # that was left by an exception.
+    return encode_extended(LOOP_SUMMARY) + b"".join(
+        [
+            encode_len_int(begin_id),
+            encode_len_int(count),
+            encode_len_int(hit_id) if count else b"",
+            (end_id is not None).to_bytes(1, ENDIAN),
+            encode_len_int(end_id) if end_id is not None else b"",
+        ]
+    )
+
+
+def encode_format(version: int):
+    return encode_extended(FORMAT) + version.to_bytes(1, ENDIAN)
+
+
+# A rotated trace at path lists the names of its segment files, oldest first and
+# one per line, in path + SEGMENTS. Only the files listed there belong to it.
+SEGMENTS = ".segments"
+
+
+# A sync record carries a marker and the CRC-32 of all bytes since the previous
+# sync record or the start of the trace, so a damaged trace can be verified and
+# resynchronized at the next sync record. It is the same in every format.
+SYNC_MARKER = b"SFLK"
+
+
+def encode_sync(crc: int):
+    return encode_extended(SYNC) + SYNC_MARKER + crc.to_bytes(4, ENDIAN)
+
+
+class SyncWriter:
+    # Writes a sync record after every interval bytes and when closed, which
+    # lets a damaged trace be verified and resynchronized when recovering it.
+    # crc32 is zlib.crc32, which the caller imports.
+    def __init__(
+        self, stream: "BinaryIO", interval: int, crc32: "Callable[[bytes, int], int]"
+    ):
+        self.stream = stream
+        self.interval = interval
+        self.crc32 = crc32
+        self.crc = 0
+        self.written = 0
+
+    def write(self, data: bytes):
+        self.stream.write(data)
+        self.crc = self.crc32(data, self.crc)
+        self.written += len(data)
+        if self.written >= self.interval:
+            self.sync()
+
+    def sync(self):
+        self.stream.write(encode_sync(self.crc))
+        self.crc = 0
+        self.written = 0
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        if self.written:
+            self.sync()
+        self.stream.close()
+
+
+# The VARINT encoding writes ids, var_ids and lengths as unsigned LEB128
+# varints. Event ids are shifted by one, so a leading zero byte still marks an
+# extended record. The one byte varints are shared and two byte varints, e.g.
+# most event ids, are built without a loop.
+VARINT_BYTES = [bytes((x,)) for x in range(0x80)]
+
+
+def encode_varint(x: int):
+    if x < 0x80:
+        return VARINT_BYTES[x]
+    if x < 0x4000:
+        return bytes(((x & 0x7F) | 0x80, x >> 7))
+    result = bytearray()
+    while x >= 0x80:
+        result.append((x & 0x7F) | 0x80)
+        x >>= 7
+    result.append(x)
+    return bytes(result)
+
+
+def encode_varint_event(event_id: int):
+    if event_id < 0x7F:
+        return VARINT_BYTES[event_id + 1]
+    return encode_varint(event_id + 1)
+
+
+def encode_varint_base_def_event(
+    event_id: int,
+    var_id: int,
+):
+    return encode_varint(event_id + 1) + encode_varint(var_id)
+
+
+def encode_varint_def_event(
+    event_id: int,
+    var_id: int,
+    value: "Any",
+    type_: "Union[str, bytes]",
+):
+    if not isinstance(value, bytes):
+        value = str(value).encode("utf8")
+    if isinstance(type_, str):
+        type_ = type_.encode("utf8")
+    return b"".join(
+        [
+            encode_varint(event_id + 1),
+            encode_varint(var_id),
+            encode_varint(len(value)),
+            value,
+            encode_varint(len(type_)),
+            type_,
+        ]
+    )
+
+
+def encode_varint_function_exit_event(
+    event_id: int,
+    return_value: "Any",
+    type_: "Union[str, bytes]",
+):
+    if isinstance(return_value, bytes):
+        value = return_value
+    else:
+        value = str(return_value).encode("utf8")
+    if isinstance(type_, str):
+        type_ = type_.encode("utf8")
+    return b"".join(
+        [
+            encode_varint(event_id + 1),
+            encode_varint(len(value)),
+            value,
+            encode_varint(len(type_)),
+            type_,
+        ]
+    )
+
+
+def encode_varint_condition_event(
+    event_id: int,
+    value: any,
+):
+    return encode_varint_event(event_id) + (b"\x01" if value else b"\x00")
+
+
+def encode_varint_use_event(
+    event_id: int,
+    var_id: int,
+):
+    return encode_varint(event_id + 1) + encode_varint(var_id)
+
+
+def encode_varint_len_event(
+    event_id: int,
+    var_id: int,
+    length: int,
+):
+    return encode_varint(event_id + 1) + encode_varint(var_id) + encode_varint(length)
+
+
+def encode_varint_condition_block(
+    event_id: int,
+    count: int,
+    bits: int,
+):
+    return b"".join(
+        [
+            encode_extended(CONDITION_BLOCK),
+            encode_varint(event_id),
+            encode_varint(count),
+            bits.to_bytes((count + 7) // 8, "little"),
+        ]
+    )
+
+
+def encode_varint_hit_counts(counts: "List[Tuple[int, int]]"):
+    return encode_extended(HIT_COUNTS) + b"".join(
+        [encode_varint(len(counts))]
+        + [encode_varint(event_id) + encode_varint(c) for event_id, c in counts]
+    )
+
+
+def encode_varint_capture(policy: int, length: int, fingerprint: int = 0):
+    return b"".join(
+        [
+            encode_extended(CAPTURE),
+            policy.to_bytes(1, ENDIAN),
+            encode_varint(length),
+            fingerprint.to_bytes(4, ENDIAN) if policy == FINGERPRINT else b"",
+        ]
+    )
+
+
+def encode_varint_loop_summary(
+    begin_id: int, count: int, hit_id: "Optional[int]", end_id: "Optional[int]"
+):
+    return encode_extended(LOOP_SUMMARY) + b"".join(
+        [
+            encode_varint(begin_id),
+            encode_varint(count),
+            encode_varint(hit_id) if count else b"",
+            (end_id is not None).to_bytes(1, ENDIAN),
+            encode_varint(end_id) if end_id is not None else b"",
+        ]
+    )
+
+
+class Encoding:
+    def __init__(
+        self,
+        version: int,
+        event,
+        base_def_event,
+        def_event,
+        function_exit_event,
+        condition_event,
+        use_event,
+        len_event,
+        condition_block,
+        hit_counts,
+        capture,
+        loop_summary,
+    ):
+        self.version = version
+        self.event = event
+        self.base_def_event = base_def_event
+        self.def_event = def_event
+        self.function_exit_event = function_exit_event
+        self.condition_event = condition_event
+        self.use_event = use_event
+        self.len_event = len_event
+        self.condition_block = condition_block
+        self.hit_counts = hit_counts
+        self.capture = capture
+        self.loop_summary = loop_summary
+
+    def header(self, timestamps: bool = False) -> bytes:
+        if timestamps:
+            return encode_format(self.version | TIMESTAMPED)
+        return b"" if self.version == LEGACY else encode_format(self.version)
+
+
+encodings = {
+    LEGACY: Encoding(
+        LEGACY,
+        encode_event,
+        encode_base_def_event,
+        encode_def_event,
+        encode_function_exit_event,
+        encode_condition_event,
+        encode_use_event,
+        encode_len_event,
+        encode_condition_block,
+        encode_hit_counts,
+        encode_capture,
+        encode_loop_summary,
+    ),
+    VARINT: Encoding(
+        VARINT,
+        encode_varint_event,
+        encode_varint_base_def_event,
+        encode_varint_def_event,
+        encode_varint_function_exit_event,
+        encode_varint_condition_event,
+        encode_varint_use_event,
+        encode_varint_len_event,
+        encode_varint_condition_block,
+        encode_varint_hit_counts,
+        encode_varint_capture,
+        encode_varint_loop_summary,
+    ),
+}
+
+DEFAULT_ENCODING = encodings[LEGACY]
@@ -0,0 +1,121 @@
+import sys
+from typing import Any, Dict, Optional
+
+from sflkitlib.events.event import Event, IncrementalLoader, dispatch_stream
+
+sys.path = sys.path[1:] + sys.path[:1]
+import os
+import selectors
+import socket
+
+sys.path = sys.path[-1:] + sys.path[:-1]
+
+
+class Connection:
+    def __init__(
+        self, sock: socket.socket, base_events: Dict[int, Event], output=None
+    ):
+        self.sock = sock
+        self.loader = IncrementalLoader(base_events)
+        self.output = output
+
+    def close(self):
+        self.sock.close()
+        if self.output is not None:
+            self.output.close()
+
+
+# Reference collector for instrumented programs running with
+# EVENTS_TRANSPORT=unix:<path>. Every connection is decoded incrementally and
+# its events are handled by the models. If output is given, e.g. "events_{}",
+# the raw trace of the n-th connection is additionally written to
+# output.format(n) in batches of batch_size bytes.
+# A connection is only read when its previous data has been handled, so a
+# slow analysis fills the socket buffer and blocks the instrumented program
+# instead of growing the memory of the collector.
+class Collector:
+    def __init__(
+        self,
+        path: str,
+        base_events: Dict[int, Event],
+        *models: Any,
+        output: Optional[str] = None,
+        batch_size: int = 1 << 16,
+    ):
+        self.path = path
+        self.base_events = base_events
+        self.models = models
+        self.output = output
+        self.batch_size = batch_size
+        self.connections = 0
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen()
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.server, selectors.EVENT_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def accept(self):
+        sock, _ = self.server.accept()
+        output = None
+        if self.output is not None:
+            output = open(
+                self.output.format(self.connections), "wb", buffering=self.batch_size
+            )
+        self.connections += 1
+        self.selector.register(
+            sock,
+            selectors.EVENT_READ,
+            Connection(sock, self.base_events, output),
+        )
+
+    def receive(self, connection: Connection) -> bool:
+        data = connection.sock.recv(self.batch_size)
+        if not data:
+            self.selector.unregister(connection.sock)
+            connection.close()
+            return False
+        if connection.output is not None:
+            connection.output.write(data)
+        for event in connection.loader.feed(data):
+            for model in self.models:
+                event.handle(model)
+        return True
+
+    def serve(self, connections: Optional[int] = None, timeout: float = None):
+        # Handles events until the given number of connections has been closed,
+        # or forever if connections is None. Returns early if no connection
+        # becomes ready within timeout seconds.
+        closed = 0
+        while connections is None or closed < connections:
+            ready = self.selector.select(timeout)
+            if not ready:
+                return
+            for key, _ in ready:
+                if key.fileobj is self.server:
+                    self.accept()
+                elif not self.receive(key.data):
+                    closed += 1
+
+    def close(self):
+        for key in list(self.selector.get_map().values()):
+            if key.data is not None:
+                key.data.close()
+        self.selector.close()
+        self.server.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def collect_pipe(path: str, base_events: Dict[int, Event], *models: Any):
+    # Reference collector for EVENTS_TRANSPORT=pipe:<path>, returns once the
+    # instrumented program has closed the pipe.
+    if not os.path.exists(path):
+        os.mkfifo(path)
+    with open(path, "rb") as fp:
+        dispatch_stream(fp, base_events, *models)
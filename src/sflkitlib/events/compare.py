@@ -0,0 +1,233 @@
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from sflkitlib.events import EventType
+from sflkitlib.events.event import (
+    Event,
+    Format,
+    load_event_args,
+    load_next_base_event,
+    open_trace,
+    skip_event_args,
+)
+
+sys.path = sys.path[1:] + sys.path[:1]
+import itertools
+
+sys.path = sys.path[-1:] + sys.path[:-1]
+
+
+def hits(path, base_events: Dict[int, Event]) -> Iterator[Tuple[int, Event]]:
+    # Yields the offset of each record and the base event it hits, payloads are
+    # skipped. Extended records yield their base events once per hit.
+    fmt = Format()
+    with open_trace(path) as fp:
+        while True:
+            offset = fp.tell()
+            # noinspection PyBroadException
+            try:
+                event = load_next_base_event(fp, base_events, fmt)
+                if event.extended:
+                    record = event.instantiate(*load_event_args(fp, event, fmt))
+                else:
+                    skip_event_args(fp, event, fmt)
+                    record = None
+            except:
+                return
+            if record is None:
+                yield offset, event
+            else:
+                for event_id, count in record.hit_counts():
+                    for _ in range(count):
+                        yield offset, base_events[event_id]
+
+
+class Cursor:
+    # Splits the hits of a trace into blocks, a block runs from a TEST_START to
+    # its TEST_END or the next TEST_START. Hits outside of tests form blocks of
+    # the test None.
+    def __init__(self, records: Iterator[Tuple[int, Event]]):
+        self.records = records
+        self.current = next(records, None)
+
+    @property
+    def exhausted(self) -> bool:
+        return self.current is None
+
+    @property
+    def test(self) -> Optional[str]:
+        event = self.current[1]
+        return event.test if event.event_type == EventType.TEST_START else None
+
+    def block(self) -> Iterator[Tuple[int, Event]]:
+        first = True
+        while self.current is not None:
+            event = self.current[1]
+            if event.event_type == EventType.TEST_START and not first:
+                return
+            first = False
+            yield self.current
+            self.current = next(self.records, None)
+            if event.event_type == EventType.TEST_END:
+                return
+
+
+class Divergence:
+    # The first position in a test at which the traces hit different events,
+    # position counts the hits from the start of the block. offsets and
+    # event_ids are None for traces that have already finished the block.
+    def __init__(
+        self,
+        test: Optional[str],
+        position: int,
+        offsets: List[Optional[int]],
+        event_ids: List[Optional[int]],
+    ):
+        self.test = test
+        self.position = position
+        self.offsets = offsets
+        self.event_ids = event_ids
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}({self.test},{self.position},"
+            f"{self.event_ids})"
+        )
+
+
+class Counts:
+    def __init__(self, traces: int):
+        self.traces = traces
+        # event id -> number of hits in each trace
+        self.counts: Dict[int, List[int]] = dict()
+
+    def add(self, trace: int, event_id: int):
+        counts = self.counts.get(event_id)
+        if counts is None:
+            counts = self.counts[event_id] = [0] * self.traces
+        counts[trace] += 1
+
+    def hit_sets(self) -> List[Set[int]]:
+        return [
+            {event_id for event_id, counts in self.counts.items() if counts[trace]}
+            for trace in range(self.traces)
+        ]
+
+    def differences(self) -> Set[int]:
+        # the ids that are hit in some but not all traces
+        return {
+            event_id
+            for event_id, counts in self.counts.items()
+            if not all(counts) and any(counts)
+        }
+
+    def deltas(self, first: int = 0, second: int = 1) -> Dict[int, int]:
+        # the ids whose number of hits differs, mapped to second minus first
+        return {
+            event_id: counts[second] - counts[first]
+            for event_id, counts in self.counts.items()
+            if counts[second] != counts[first]
+        }
+
+
+class TestComparison(Counts):
+    def __init__(self, test: Optional[str], traces: int):
+        super().__init__(traces)
+        self.test = test
+        self.divergence: Optional[Divergence] = None
+        # the number of blocks of the test in each trace
+        self.runs = [0] * traces
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.test},{self.divergence})"
+
+
+class Comparison(Counts):
+    def __init__(self, paths: List[str]):
+        super().__init__(len(paths))
+        self.paths = paths
+        self.tests: Dict[Optional[str], TestComparison] = dict()
+        self.divergence: Optional[Divergence] = None
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}({len(self.tests)} tests,{self.divergence})"
+        )
+
+    def get_test(self, test: Optional[str]) -> TestComparison:
+        comparison = self.tests.get(test)
+        if comparison is None:
+            comparison = self.tests[test] = TestComparison(test, self.traces)
+        return comparison
+
+    def diverge(self, comparison: TestComparison, divergence: Divergence):
+        if comparison.divergence is None:
+            comparison.divergence = divergence
+        if self.divergence is None:
+            self.divergence = divergence
+
+    def count(self, comparison: TestComparison, trace: int, event_id: int):
+        self.add(trace, event_id)
+        comparison.add(trace, event_id)
+
+
+def compare_blocks(comparison: Comparison, cursors: List[Cursor]):
+    tests = [None if c.exhausted else c.test for c in cursors]
+    if any(c.exhausted for c in cursors) or len(set(tests)) > 1:
+        # the traces ran different tests here, their blocks are counted
+        # separately and diverge right at the start
+        for trace, cursor in enumerate(cursors):
+            if cursor.exhausted:
+                continue
+            test = comparison.get_test(tests[trace])
+            test.runs[trace] += 1
+            first = cursor.current
+            comparison.diverge(
+                test,
+                Divergence(
+                    tests[trace],
+                    0,
+                    [first[0] if i == trace else None for i in range(len(tests))],
+                    [
+                        first[1].event_id if i == trace else None
+                        for i in range(len(tests))
+                    ],
+                ),
+            )
+            for _, event in cursor.block():
+                comparison.count(test, trace, event.event_id)
+        return
+    test = comparison.get_test(tests[0])
+    for trace in range(len(cursors)):
+        test.runs[trace] += 1
+    blocks = [cursor.block() for cursor in cursors]
+    for position, records in enumerate(itertools.zip_longest(*blocks)):
+        event_ids = [None if r is None else r[1].event_id for r in records]
+        if test.divergence is None and len(set(event_ids)) > 1:
+            comparison.diverge(
+                test,
+                Divergence(
+                    tests[0],
+                    position,
+                    [None if r is None else r[0] for r in records],
+                    event_ids,
+                ),
+            )
+        for trace, event_id in enumerate(event_ids):
+            if event_id is not None:
+                comparison.count(test, trace, event_id)
+
+
+def compare(paths: List[Any], base_events: Dict[int, Event]) -> Comparison:
+    # Reads the traces together, e.g. of a passing and a failing run, and
+    # compares them overall and per test by hits per event id and the first
+    # divergence. Only the current record of each trace and the counts are
+    # kept in memory. Blocks are compared in lockstep, so the traces are
+    # expected to run the same tests in the same order. Where they do not,
+    # the blocks are counted separately and reported as diverging.
+    paths = [str(path) for path in paths]
+    comparison = Comparison(paths)
+    cursors = [Cursor(hits(path, base_events)) for path in paths]
+    while not all(cursor.exhausted for cursor in cursors):
+        compare_blocks(comparison, cursors)
+    return comparison
@@ -1,28 +1,57 @@
 import io
 import sys
 from abc import abstractmethod, ABC
-from typing import Any, List, Union, BinaryIO, Dict
+from typing import (
+    Any,
+    List,
+    Union,
+    BinaryIO,
+    Dict,
+    Iterator,
+    Optional,
+    AsyncIterator,
+    Tuple,
+    Set,
+    Callable,
+)
 
 from sflkitlib.events import EventType
 from sflkitlib.events.codec import (
-    encode_event,
-    encode_def_event,
-    encode_function_exit_event,
-    encode_condition_event,
-    encode_use_event,
-    encode_len_event,
+    CAPTURE,
+    CONDITION_BLOCK,
+    DEFAULT_ENCODING,
     ENDIAN,
-    encode_base_def_event,
+    EXTENDED,
+    FINGERPRINT,
+    FORMAT,
+    HIT_COUNTS,
+    LEGACY,
+    LOOP_SUMMARY,
+    SEGMENTS,
+    SYNC,
+    SYNC_MARKER,
+    TIMESTAMPED,
+    VARINT,
+    Encoding,
+    base_version,
+    encodings,
 )
 
 sys.path = sys.path[1:] + sys.path[:1]
 import json
+import mmap
+import os
 import pickle
+import time
 
 sys.path = sys.path[-1:] + sys.path[:-1]
 
 
 class Event(ABC):
+    extended = False
+    # how the value of a DEF or FUNCTION_EXIT event was captured if not exactly
+    capture = None
+
     def __init__(self, file: str, line: int, event_id: int, event_type: EventType):
         self.file = file
         self.line = line
@@ -61,8 +90,8 @@ class Event(ABC):
     def get_byte_length(x: Union[int, float]):
         return (x.bit_length() + 7) // 8
 
-    def dump(self) -> bytes:
-        return encode_event(self.event_id)
+    def dump(self, encoding: Encoding = DEFAULT_ENCODING) -> bytes:
+        return encoding.event(self.event_id)
 
     @staticmethod
     def deserialize(s: dict):
@@ -161,8 +190,8 @@ class DefEvent(Event):
         default["var"] = self.var
         return default
 
-    def dump(self):
-        return encode_def_event(
+    def dump(self, encoding: Encoding = DEFAULT_ENCODING):
+        return encoding.def_event(
             self.event_id,
             self.var_id,
             self.value,
@@ -263,8 +292,10 @@ class FunctionExitEvent(FunctionEvent):
     def handle(self, model: Any):
         model.handle_function_exit_event(self)
 
-    def dump(self):
-        return encode_function_exit_event(self.event_id, self.return_value, self.type_)
+    def dump(self, encoding: Encoding = DEFAULT_ENCODING):
+        return encoding.function_exit_event(
+            self.event_id, self.return_value, self.type_
+        )
 
     def serialize(self):
         default = super().serialize()
@@ -356,8 +387,8 @@ class ConditionEvent(Event):
         default["tmp_var"] = self.tmp_var
         return default
 
-    def dump(self):
-        return encode_condition_event(
+    def dump(self, encoding: Encoding = DEFAULT_ENCODING):
+        return encoding.condition_event(
             self.event_id,
             self.value,
         )
@@ -467,8 +498,8 @@ class UseEvent(Event):
         default["var"] = self.var
         return default
 
-    def dump(self):
-        return encode_use_event(self.event_id, self.var_id)
+    def dump(self, encoding: Encoding = DEFAULT_ENCODING):
+        return encoding.use_event(self.event_id, self.var_id)
 
     @staticmethod
     def deserialize(s: dict):
@@ -509,8 +540,8 @@ class LenEvent(Event):
         default["var"] = self.var
         return default
 
-    def dump(self):
-        return encode_len_event(
+    def dump(self, encoding: Encoding = DEFAULT_ENCODING):
+        return encoding.len_event(
             self.event_id,
             self.var_id,
             self.length,
@@ -637,8 +668,8 @@ class TestDefEvent(Event):
         default["var"] = self.var
         return default
 
-    def dump(self):
-        return encode_base_def_event(
+    def dump(self, encoding: Encoding = DEFAULT_ENCODING):
+        return encoding.base_def_event(
             self.event_id,
             self.var_id,
         )
@@ -675,8 +706,8 @@ class TestUseEvent(Event):
         default["var"] = self.var
         return default
 
-    def dump(self):
-        return encode_use_event(self.event_id, self.var_id)
+    def dump(self, encoding: Encoding = DEFAULT_ENCODING):
+        return encoding.use_event(self.event_id, self.var_id)
 
     @staticmethod
     def deserialize(s: dict):
@@ -705,6 +736,328 @@ class TestAssertEvent(Event):
         return TestAssertEvent(self.file, self.line, self.event_id)
 
 
+class ExtendedRecord(ABC):
+    # Base of records that start with codec.EXTENDED. They refer to a base event
+    # but are not events themselves, expand() returns the events they stand for.
+    extended = True
+
+    def __init__(self, event: Event):
+        self.event = event
+        self.file = event.file
+        self.line = event.line
+        self.event_id = event.event_id
+        self.event_type = event.event_type
+
+    @staticmethod
+    @abstractmethod
+    def load_base(
+        stream: BinaryIO, events: Dict[int, Event], fmt: "Format"
+    ) -> "ExtendedRecord":
+        raise NotImplementedError()
+
+    @abstractmethod
+    def load_args(self, stream: BinaryIO, fmt: "Format") -> tuple:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def skip_args(self, stream: BinaryIO, fmt: "Format"):
+        raise NotImplementedError()
+
+    @abstractmethod
+    def instantiate(self, *args):
+        raise NotImplementedError()
+
+    @abstractmethod
+    def expand(self) -> List[Event]:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def hit_counts(self) -> List[Tuple[int, int]]:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def dump(self, encoding: Encoding = DEFAULT_ENCODING) -> bytes:
+        raise NotImplementedError()
+
+    def handle(self, model: Any):
+        for event in self.expand():
+            event.handle(model)
+
+
+class ConditionBlock(ExtendedRecord):
+    def __init__(self, event: "ConditionEvent", count: int = 0, bits: int = 0):
+        super().__init__(event)
+        self.count = count
+        self.bits = bits
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}({self.file},{self.line},{self.event_id},"
+            f"{self.count})"
+        )
+
+    @property
+    def true_count(self) -> int:
+        return bin(self.bits).count("1")
+
+    @property
+    def false_count(self) -> int:
+        return self.count - self.true_count
+
+    @property
+    def outcomes(self) -> List[bool]:
+        return [bool(self.bits >> i & 1) for i in range(self.count)]
+
+    @staticmethod
+    def load_base(
+        stream: BinaryIO, events: Dict[int, Event], fmt: "Format"
+    ) -> "ConditionBlock":
+        return ConditionBlock(events[fmt.read_len_int(stream, 1)])
+
+    def load_args(self, stream: BinaryIO, fmt: "Format") -> tuple:
+        count = fmt.read_len_int(stream, 1)
+        return count, int.from_bytes(read_bytes(stream, (count + 7) // 8), "little")
+
+    def skip_args(self, stream: BinaryIO, fmt: "Format"):
+        count = fmt.read_len_int(stream, 1)
+        stream.seek((count + 7) // 8, io.SEEK_CUR)
+
+    def instantiate(self, count: int, bits: int):
+        return ConditionBlock(self.event, count, bits)
+
+    def expand(self) -> List[Event]:
+        return [self.event.instantiate(outcome) for outcome in self.outcomes]
+
+    def hit_counts(self) -> List[Tuple[int, int]]:
+        return [(self.event_id, self.count)]
+
+    def dump(self, encoding: Encoding = DEFAULT_ENCODING) -> bytes:
+        return encoding.condition_block(self.event_id, self.count, self.bits)
+
+    def handle(self, model: Any):
+        # models that only need the outcome counts can handle the block at once
+        handler = getattr(model, "handle_condition_block", None)
+        if handler is None:
+            super().handle(model)
+        else:
+            handler(self)
+
+
+class HitCounts(ExtendedRecord):
+    # Hit counts of events that were aggregated instead of recorded, e.g. after
+    # the trace exceeded its budget. It refers to many base events, so it has
+    # no single event id.
+    def __init__(
+        self, events: Dict[int, Event], counts: List[Tuple[int, int]] = None
+    ):
+        self.events = events
+        self.counts = counts or []
+        self.file = None
+        self.line = None
+        self.event_id = None
+        self.event_type = None
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({len(self.counts)})"
+
+    @staticmethod
+    def load_base(
+        stream: BinaryIO, events: Dict[int, Event], fmt: "Format"
+    ) -> "HitCounts":
+        return HitCounts(events)
+
+    def load_args(self, stream: BinaryIO, fmt: "Format") -> tuple:
+        counts = list()
+        for _ in range(fmt.read_len_int(stream, 1)):
+            event_id = fmt.read_len_int(stream, 1)
+            counts.append((event_id, fmt.read_len_int(stream, 1)))
+        return (counts,)
+
+    def skip_args(self, stream: BinaryIO, fmt: "Format"):
+        for _ in range(2 * fmt.read_len_int(stream, 1)):
+            fmt.skip_len_int(stream, 1)
+
+    def instantiate(self, counts: List[Tuple[int, int]]):
+        return HitCounts(self.events, counts)
+
+    def expand(self) -> List[Event]:
+        return [
+            self.events[event_id]
+            for event_id, count in self.counts
+            for _ in range(count)
+        ]
+
+    def hit_counts(self) -> List[Tuple[int, int]]:
+        return list(self.counts)
+
+    def dump(self, encoding: Encoding = DEFAULT_ENCODING) -> bytes:
+        return encoding.hit_counts(self.counts)
+
+    def handle(self, model: Any):
+        handler = getattr(model, "handle_hit_counts", None)
+        if handler is None:
+            super().handle(model)
+        else:
+            handler(self)
+
+
+class Capture:
+    # policy is one of codec.EXACT, TRUNCATE or FINGERPRINT, length the length
+    # of the original value and fingerprint the CRC-32 of its utf8 encoding
+    def __init__(self, policy: int, length: int, fingerprint: int = 0):
+        self.policy = policy
+        self.length = length
+        self.fingerprint = fingerprint
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}({self.policy},{self.length},"
+            f"{self.fingerprint})"
+        )
+
+    def __eq__(self, other):
+        return isinstance(other, Capture) and (
+            self.policy == other.policy
+            and self.length == other.length
+            and self.fingerprint == other.fingerprint
+        )
+
+
+class CapturedValue(ExtendedRecord):
+    # A DEF or FUNCTION_EXIT record whose value was truncated or replaced by a
+    # fingerprint, expand() returns the event with its capture set.
+    def __init__(self, event: Event, capture: Capture):
+        super().__init__(event)
+        self.capture = capture
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.event},{self.capture})"
+
+    @staticmethod
+    def load_base(
+        stream: BinaryIO, events: Dict[int, Event], fmt: "Format"
+    ) -> "CapturedValue":
+        policy = read_int(stream, 1)
+        length = fmt.read_len_int(stream, 1)
+        fingerprint = read_int(stream, 4) if policy == FINGERPRINT else 0
+        event = load_next_base_event(stream, events, fmt)
+        return CapturedValue(event, Capture(policy, length, fingerprint))
+
+    def load_args(self, stream: BinaryIO, fmt: "Format") -> tuple:
+        return load_payload(stream, self.event, fmt)
+
+    def skip_args(self, stream: BinaryIO, fmt: "Format"):
+        skip_payload(stream, self.event, fmt)
+
+    def instantiate(self, *args):
+        return CapturedValue(self.event.instantiate(*args), self.capture)
+
+    def expand(self) -> List[Event]:
+        self.event.capture = self.capture
+        return [self.event]
+
+    def hit_counts(self) -> List[Tuple[int, int]]:
+        return [(self.event_id, 1)]
+
+    def dump(self, encoding: Encoding = DEFAULT_ENCODING) -> bytes:
+        return (
+            encoding.capture(
+                self.capture.policy, self.capture.length, self.capture.fingerprint
+            )
+            + self.event.dump(encoding)
+        )
+
+
+class LoopSummary(ExtendedRecord):
+    # One run of a loop recorded as its number of iterations, expand() rebuilds
+    # the LOOP_BEGIN, LOOP_HIT and LOOP_END events. hit and end are None if the
+    # loop had no iterations or was left by an exception.
+    def __init__(
+        self,
+        events: Dict[int, Event],
+        event: "LoopBeginEvent",
+        count: int = 0,
+        hit: Optional["LoopHitEvent"] = None,
+        end: Optional["LoopEndEvent"] = None,
+    ):
+        super().__init__(event)
+        self.events = events
+        self.count = count
+        self.hit = hit
+        self.end = end
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}({self.file},{self.line},{self.event_id},"
+            f"{self.count})"
+        )
+
+    @staticmethod
+    def load_base(
+        stream: BinaryIO, events: Dict[int, Event], fmt: "Format"
+    ) -> "LoopSummary":
+        return LoopSummary(events, events[fmt.read_len_int(stream, 1)])
+
+    def load_args(self, stream: BinaryIO, fmt: "Format") -> tuple:
+        count = fmt.read_len_int(stream, 1)
+        hit = self.events[fmt.read_len_int(stream, 1)] if count else None
+        end = self.events[fmt.read_len_int(stream, 1)] if read_int(stream, 1) else None
+        return count, hit, end
+
+    def skip_args(self, stream: BinaryIO, fmt: "Format"):
+        if fmt.read_len_int(stream, 1):
+            fmt.skip_len_int(stream, 1)
+        if read_int(stream, 1):
+            fmt.skip_len_int(stream, 1)
+
+    def instantiate(
+        self,
+        count: int,
+        hit: Optional["LoopHitEvent"] = None,
+        end: Optional["LoopEndEvent"] = None,
+    ):
+        return LoopSummary(self.events, self.event, count, hit, end)
+
+    def expand(self) -> List[Event]:
+        events = [self.event] + [self.hit] * self.count
+        if self.end is not None:
+            events.append(self.end)
+        return events
+
+    def hit_counts(self) -> List[Tuple[int, int]]:
+        counts = [(self.event_id, 1)]
+        if self.count:
+            counts.append((self.hit.event_id, self.count))
+        if self.end is not None:
+            counts.append((self.end.event_id, 1))
+        return counts
+
+    def dump(self, encoding: Encoding = DEFAULT_ENCODING) -> bytes:
+        return encoding.loop_summary(
+            self.event_id,
+            self.count,
+            None if self.hit is None else self.hit.event_id,
+            None if self.end is None else self.end.event_id,
+        )
+
+    def handle(self, model: Any):
+        # models that only need the number of iterations can handle the summary
+        # at once
+        handler = getattr(model, "handle_loop_summary", None)
+        if handler is None:
+            super().handle(model)
+        else:
+            handler(self)
+
+
+extended_mapping = {
+    CONDITION_BLOCK: ConditionBlock,
+    HIT_COUNTS: HitCounts,
+    CAPTURE: CapturedValue,
+    LOOP_SUMMARY: LoopSummary,
+}
+
+
 def serialize(event: Event):
     return event.serialize()
 
@@ -737,24 +1090,32 @@ def deserialize(s: dict):
     return event_mapping[type_].deserialize(s)
 
 
-def dump(path: str, events: List[Event]):
+def dump(path: str, events: List[Event], encoding: Encoding = DEFAULT_ENCODING):
     with open(path, "wb") as fp:
+        fp.write(encoding.header())
         for e in events:
-            fp.write(e.dump())
+            fp.write(e.dump(encoding))
+
+
+def read_bytes(stream: BinaryIO, n: int) -> bytes:
+    b = stream.read(n)
+    if len(b) < n:
+        raise EOFError("truncated record")
+    return b
 
 
 def read_int(stream: BinaryIO, n: int, signed: bool = False) -> int:
-    return int.from_bytes(stream.read(n), ENDIAN, signed=signed)
+    return int.from_bytes(read_bytes(stream, n), ENDIAN, signed=signed)
 
 
 def read_len_str(stream: BinaryIO, n: int) -> str:
     length = read_int(stream, n)
-    return stream.read(length).decode("utf8")
+    return read_bytes(stream, length).decode("utf8")
 
 
 def read_len_bytes(stream: BinaryIO, n: int) -> bytes:
     length = read_int(stream, n)
-    return stream.read(length)
+    return read_bytes(stream, length)
 
 
 def read_len_int(stream: BinaryIO, n: int, signed: bool = False) -> int:
@@ -762,104 +1123,937 @@ def read_len_int(stream: BinaryIO, n: int, signed: bool = False) -> int:
     return read_int(stream, length, signed=signed)
 
 
-def load_event(e: bytes, base_events: Dict[int, Event]) -> Event:
-    return load_next_event(io.BytesIO(e), base_events)
+def skip_len(stream: BinaryIO, n: int):
+    stream.seek(read_int(stream, n), io.SEEK_CUR)
 
 
-def load_next_event(stream: BinaryIO, events: Dict[int, Event]) -> Event:
+def read_event_id(stream: BinaryIO) -> Optional[int]:
+    # returns None for an extended record
     test = stream.read(1)
     if not test:
         raise ValueError("empty stream")
-    event = events[read_int(stream, int.from_bytes(test, ENDIAN))]
-    if event.event_type == EventType.DEF:
-        # noinspection PyBroadException
-        var_id = read_len_int(stream, 1)
-        value = read_len_bytes(stream, 4)
-        type_ = read_len_str(stream, 2)
-        try:
-            return event.instantiate(
-                var_id,
-                pickle.loads(value),
-                type_,
-            )
-        except:
-            value = value.decode("utf8")
-            if value == "True":
-                return event.instantiate(
-                    var_id,
-                    True,
-                    type_,
-                )
-            elif value == "False":
-                return event.instantiate(
-                    var_id,
-                    False,
-                    type_,
-                )
-            else:
-                return event.instantiate(
-                    var_id,
-                    None,
-                    type_,
-                )
+    len_id = test[0]
+    if len_id == EXTENDED:
+        return None
+    return read_int(stream, len_id)
+
+
+def read_varint(stream: BinaryIO) -> int:
+    read = stream.read
+    result, shift = 0, 0
+    while True:
+        b = read(1)
+        if not b:
+            raise EOFError("truncated record")
+        b = b[0]
+        if b < 0x80:
+            return result | b << shift
+        result |= (b & 0x7F) << shift
+        shift += 7
+
+
+def read_varint_event_id(stream: BinaryIO) -> Optional[int]:
+    test = stream.read(1)
+    if not test:
+        raise ValueError("empty stream")
+    value = test[0]
+    if value >= 0x80:
+        value = (value & 0x7F) | read_varint(stream) << 7
+    if value == EXTENDED:
+        return None
+    return value - 1
+
+
+# The varint readers ignore the width n of the fixed length prefix, they share
+# the signature of the legacy readers so that Format can swap them.
+def read_varint_len_int(stream: BinaryIO, n: int, signed: bool = False) -> int:
+    return read_varint(stream)
+
+
+def read_varint_len_bytes(stream: BinaryIO, n: int) -> bytes:
+    return read_bytes(stream, read_varint(stream))
+
+
+def read_varint_len_str(stream: BinaryIO, n: int) -> str:
+    return read_bytes(stream, read_varint(stream)).decode("utf8")
+
+
+def skip_varint_len(stream: BinaryIO, n: int):
+    stream.seek(read_varint(stream), io.SEEK_CUR)
+
+
+def skip_varint(stream: BinaryIO, n: int):
+    read_varint(stream)
+
+
+class Format:
+    # The decoding state of a trace. A format record switches the version for all
+    # following records, so readers of whole traces keep one Format per trace.
+    def __init__(self, version: int = LEGACY):
+        # the nanoseconds since the first record of a timestamped trace, as of
+        # the last record read
+        self.time = 0
+        self.set_version(version)
+
+    def set_version(self, version: int):
+        base = base_version(version)
+        if base == LEGACY:
+            self.read_event_id = read_event_id
+            self.read_len_int = read_len_int
+            self.read_len_bytes = read_len_bytes
+            self.read_len_str = read_len_str
+            self.skip_len = skip_len
+            self.skip_len_int = skip_len
+        elif base == VARINT:
+            self.read_event_id = read_varint_event_id
+            self.read_len_int = read_varint_len_int
+            self.read_len_bytes = read_varint_len_bytes
+            self.read_len_str = read_varint_len_str
+            self.skip_len = skip_varint_len
+            self.skip_len_int = skip_varint
+        else:
+            raise ValueError(f"unsupported trace format {version}")
+        self.version = version
+        self.timestamps = bool(version & TIMESTAMPED)
+
+    @property
+    def encoding(self) -> Encoding:
+        return encodings[base_version(self.version)]
+
+
+def read_timestamp(stream: BinaryIO, fmt: Format):
+    if fmt.timestamps:
+        fmt.time += read_varint(stream)
+
+
+DEFAULT_FORMAT = Format()
+
+
+def load_event(e: bytes, base_events: Dict[int, Event]) -> Event:
+    return load_next_event(io.BytesIO(e), base_events)
+
+
+def load_value(value: bytes) -> Any:
+    # noinspection PyBroadException
+    try:
+        return pickle.loads(value)
+    except:
+        value = value.decode("utf8")
+        if value == "True":
+            return True
+        elif value == "False":
+            return False
+        else:
+            return None
+
+
+def load_next_base_event(
+    stream: BinaryIO, events: Dict[int, Event], fmt: Format = None
+) -> Event:
+    if fmt is None:
+        fmt = DEFAULT_FORMAT
+    while True:
+        event_id = fmt.read_event_id(stream)
+        if event_id is not None:
+            return events[event_id]
+        kind = read_int(stream, 1)
+        if kind == SYNC:
+            # sync records are only verified when recovering a trace
+            read_bytes(stream, len(SYNC_MARKER) + 4)
+            continue
+        if kind != FORMAT:
+            return extended_mapping[kind].load_base(stream, events, fmt)
+        if fmt is DEFAULT_FORMAT:
+            raise ValueError("format records can only be read with a Format")
+        fmt.set_version(read_int(stream, 1))
+
+
+def skip_sync_records(stream: BinaryIO, fmt: Format) -> List[Tuple[int, int]]:
+    # Reads the sync and format records in front of the next record and returns
+    # the byte ranges of the sync records. Their checksums only fit the trace
+    # they were written to, so they are left out when a trace is split.
+    syncs = list()
+    while True:
+        start = stream.tell()
+        prefix = stream.read(2)
+        if prefix == bytes((EXTENDED, SYNC)):
+            read_bytes(stream, len(SYNC_MARKER) + 4)
+            syncs.append((start, stream.tell()))
+        elif prefix == bytes((EXTENDED, FORMAT)):
+            fmt.set_version(read_int(stream, 1))
+        else:
+            stream.seek(start)
+            return syncs
+
+
+def load_event_args(stream: BinaryIO, event: Event, fmt: Format = None) -> tuple:
+    if fmt is None:
+        fmt = DEFAULT_FORMAT
+    args = load_payload(stream, event, fmt)
+    read_timestamp(stream, fmt)
+    return args
+
+
+def load_payload(stream: BinaryIO, event: Event, fmt: Format) -> tuple:
+    # the arguments of a record without its timestamp
+    if event.extended:
+        return event.load_args(stream, fmt)
+    elif event.event_type == EventType.DEF:
+        var_id = fmt.read_len_int(stream, 1)
+        value = fmt.read_len_bytes(stream, 4)
+        type_ = fmt.read_len_str(stream, 2)
+        return var_id, load_value(value), type_
     elif event.event_type == EventType.USE:
-        var_id = read_len_int(stream, 1)
-        return event.instantiate(var_id)
+        return (fmt.read_len_int(stream, 1),)
     elif event.event_type == EventType.FUNCTION_EXIT:
-        # noinspection PyBroadException
-        value = read_len_bytes(stream, 4)
-        type_ = read_len_str(stream, 2)
-        try:
-            return event.instantiate(
-                pickle.loads(value),
-                type_,
-            )
-        except:
-            value = value.decode("utf8")
-            if value == "True":
-                return event.instantiate(
-                    True,
-                    type_,
-                )
-            elif value == "False":
-                return event.instantiate(
-                    False,
-                    type_,
-                )
-            else:
-                return event.instantiate(
-                    None,
-                    type_,
-                )
+        value = fmt.read_len_bytes(stream, 4)
+        type_ = fmt.read_len_str(stream, 2)
+        return load_value(value), type_
     elif event.event_type == EventType.CONDITION:
-        value = bool(read_int(stream, 1))
-        return event.instantiate(value)
+        return (bool(read_int(stream, 1)),)
     elif event.event_type == EventType.LEN:
-        var_id = read_len_int(stream, 1)
-        length = read_len_int(stream, 1)
-        return event.instantiate(var_id, length)
+        var_id = fmt.read_len_int(stream, 1)
+        length = fmt.read_len_int(stream, 1)
+        return var_id, length
     elif event.event_type == EventType.TEST_DEF:
-        var_id = read_len_int(stream, 1)
-        return event.instantiate(var_id)
+        return (fmt.read_len_int(stream, 1),)
     elif event.event_type == EventType.TEST_USE:
-        var_id = read_len_int(stream, 1)
-        return event.instantiate(var_id)
+        return (fmt.read_len_int(stream, 1),)
     else:
-        return event.instantiate()
+        return ()
+
+
+def skip_event_args(stream: BinaryIO, event: Event, fmt: Format = None):
+    if fmt is None:
+        fmt = DEFAULT_FORMAT
+    skip_payload(stream, event, fmt)
+    read_timestamp(stream, fmt)
+
+
+def skip_payload(stream: BinaryIO, event: Event, fmt: Format):
+    if event.extended:
+        event.skip_args(stream, fmt)
+    elif event.event_type == EventType.DEF:
+        fmt.skip_len_int(stream, 1)
+        fmt.skip_len(stream, 4)
+        fmt.skip_len(stream, 2)
+    elif event.event_type == EventType.FUNCTION_EXIT:
+        fmt.skip_len(stream, 4)
+        fmt.skip_len(stream, 2)
+    elif event.event_type == EventType.CONDITION:
+        stream.seek(1, io.SEEK_CUR)
+    elif event.event_type == EventType.LEN:
+        fmt.skip_len_int(stream, 1)
+        fmt.skip_len_int(stream, 1)
+    elif event.event_type in (EventType.USE, EventType.TEST_DEF, EventType.TEST_USE):
+        fmt.skip_len_int(stream, 1)
+
+
+def load_next_event(
+    stream: BinaryIO, events: Dict[int, Event], fmt: Format = None
+) -> Event:
+    event = load_next_base_event(stream, events, fmt)
+    return event.instantiate(*load_event_args(stream, event, fmt))
+
+
+def segment_paths(path) -> List[str]:
+    # A trace rotated by sflkitlib.lib consists of path, path.1, path.2, ...
+    # as listed in its manifest. Leading segments may have been removed, so
+    # all listed ones that exist are returned. Without a manifest, the trace is
+    # path alone.
+    path = str(path)
+    manifest = path + SEGMENTS
+    if not os.path.exists(manifest):
+        return [path] if os.path.exists(path) else []
+    directory = os.path.dirname(path)
+    with open(manifest, "r") as fp:
+        paths = [os.path.join(directory, name) for name in fp.read().split()]
+    return [segment for segment in paths if os.path.exists(segment)]
+
+
+class TraceReader:
+    # Reads the segments of a rotated trace as one stream. Every segment starts
+    # with the format header and ends at a record boundary.
+    def __init__(self, paths: List[str]):
+        self.paths = paths
+        self.starts = list()
+        start = 0
+        for path in paths:
+            self.starts.append(start)
+            start += os.path.getsize(path)
+        self.size = start
+        self.index = 0
+        self.fp = open(paths[0], "rb") if paths else None
+
+    def open_segment(self, index: int):
+        self.fp.close()
+        self.index = index
+        self.fp = open(self.paths[index], "rb")
+
+    def read(self, n: int = -1) -> bytes:
+        if self.fp is None:
+            return b""
+        data = self.fp.read(n)
+        while (n < 0 or len(data) < n) and self.index + 1 < len(self.paths):
+            self.open_segment(self.index + 1)
+            data += self.fp.read(-1 if n < 0 else n - len(data))
+        return data
+
+    def tell(self) -> int:
+        return 0 if self.fp is None else self.starts[self.index] + self.fp.tell()
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if self.fp is None:
+            return 0
+        if whence == io.SEEK_CUR:
+            offset += self.tell()
+        elif whence == io.SEEK_END:
+            offset += self.size
+        index = len(self.starts) - 1
+        while index > 0 and self.starts[index] > offset:
+            index -= 1
+        if index != self.index:
+            self.open_segment(index)
+        self.fp.seek(offset - self.starts[index])
+        return offset
+
+    def close(self):
+        if self.fp is not None:
+            self.fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def open_trace(path) -> BinaryIO:
+    paths = segment_paths(path)
+    if not paths:
+        return open(path, "rb")
+    elif len(paths) == 1:
+        # the base path is gone if the oldest segments were removed
+        return open(paths[0], "rb")
+    return TraceReader(paths)
 
 
 def load(path, base_events: Dict[int, Event]) -> List[Event]:
     events = list()
-    with open(path, "rb") as fp:
+    fmt = Format()
+    with open_trace(path) as fp:
         while True:
             try:
-                events.append(load_next_event(fp, base_events))
+                event = load_next_event(fp, base_events, fmt)
             except:
                 break
+            if event.extended:
+                events.extend(event.expand())
+            else:
+                events.append(event)
     return events
 
 
+class IncrementalLoader:
+    def __init__(self, base_events: Dict[int, Event]):
+        self.base_events = base_events
+        self.buffer = b""
+        self.fmt = Format()
+
+    def feed(self, data: bytes) -> List[Event]:
+        # Decodes all records that are complete after appending data, a partial
+        # record at the end is kept until the next call.
+        buffer = self.buffer + data
+        stream = io.BytesIO(buffer)
+        events = list()
+        offset = 0
+        while offset < len(buffer):
+            try:
+                event = load_next_event(stream, self.base_events, self.fmt)
+            except EOFError:
+                break
+            if event.extended:
+                events.extend(event.expand())
+            else:
+                events.append(event)
+            offset = stream.tell()
+        self.buffer = buffer[offset:]
+        return events
+
+    @property
+    def pending(self) -> int:
+        return len(self.buffer)
+
+
+def follow(
+    path,
+    base_events: Dict[int, Event],
+    poll_interval: float = 0.1,
+    timeout: Optional[float] = None,
+) -> Iterator[Event]:
+    # Yields the events of a trace that is still being written. Only the offset
+    # of the last complete record is kept, a partial record at the end is
+    # decoded again once the file has grown. The iterator stops after timeout
+    # seconds without new data, or never if timeout is None.
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while not os.path.exists(path):
+        if deadline is not None and time.monotonic() >= deadline:
+            return
+        time.sleep(poll_interval)
+    with open(path, "rb") as fp:
+        offset, consumed = 0, 0
+        fmt = Format()
+        while True:
+            size = os.fstat(fp.fileno()).st_size
+            if size < offset:
+                # the trace was truncated and restarted, e.g. by lib.reset()
+                offset, consumed = 0, 0
+                fmt = Format()
+            if size > consumed:
+                fp.seek(offset)
+                try:
+                    while offset < size:
+                        event = load_next_event(fp, base_events, fmt)
+                        offset = fp.tell()
+                        if event.extended:
+                            yield from event.expand()
+                        else:
+                            yield event
+                except EOFError:
+                    pass
+                consumed = max(size, offset)
+                if timeout is not None:
+                    deadline = time.monotonic() + timeout
+            elif deadline is not None and time.monotonic() >= deadline:
+                return
+            else:
+                time.sleep(poll_interval)
+
+
+async def load_async(
+    reader: Any, base_events: Dict[int, Event], chunk_size: int = 1 << 16
+) -> AsyncIterator[Event]:
+    # Yields the events of an asynchronous source, e.g. an asyncio.StreamReader
+    # or any other object with a coroutine read(n). At most chunk_size bytes and
+    # one partial record are buffered per source, the next chunk is only read
+    # once the decoded events have been consumed.
+    loader = IncrementalLoader(base_events)
+    while True:
+        data = await reader.read(chunk_size)
+        if not data:
+            break
+        for event in loader.feed(data):
+            yield event
+
+
+class AsyncFileReader:
+    def __init__(self, path):
+        self.fp = open(path, "rb")
+
+    async def read(self, n: int) -> bytes:
+        # asyncio is only imported here, since importing it takes longer than
+        # this module and every process that reads a trace would pay for it
+        import asyncio
+
+        return await asyncio.get_event_loop().run_in_executor(None, self.fp.read, n)
+
+    def close(self):
+        self.fp.close()
+
+
+async def load_path_async(
+    path, base_events: Dict[int, Event], chunk_size: int = 1 << 16
+) -> AsyncIterator[Event]:
+    reader = AsyncFileReader(path)
+    try:
+        async for event in load_async(reader, base_events, chunk_size=chunk_size):
+            yield event
+    finally:
+        reader.close()
+
+
+class TestSpan:
+    # The byte range [start, end) of a TEST_START/TEST_END block in a trace
+    def __init__(self, test: str, test_id: int, start: int, end: int = None):
+        self.test = test
+        self.test_id = test_id
+        self.start = start
+        self.end = end
+        self.records = 0
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}({self.test},{self.start},{self.end},"
+            f"{self.records})"
+        )
+
+
+class TraceStatistics:
+    def __init__(self):
+        # the number of bytes up to the end of the last complete record
+        self.size = 0
+        self.records = 0
+        # hits per event id and event type, extended records count as the
+        # events they stand for
+        self.ids: Dict[int, int] = dict()
+        self.types: Dict[EventType, int] = dict()
+        # bytes of the records per event type, the format and sync records in
+        # front of a record are attributed to it
+        self.bytes: Dict[Optional[EventType], int] = dict()
+        self.tests: List[TestSpan] = list()
+        # the test block that is still open at the end of the scanned bytes
+        self.current: Optional[TestSpan] = None
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}({self.records} records,"
+            f"{len(self.tests)} tests)"
+        )
+
+
+# how scan_buffer skips the payload of an event type
+SCAN_NONE, SCAN_DEF, SCAN_EXIT, SCAN_CONDITION, SCAN_LEN, SCAN_INT = range(6)
+SCAN_KINDS = {
+    EventType.DEF: SCAN_DEF,
+    EventType.FUNCTION_EXIT: SCAN_EXIT,
+    EventType.CONDITION: SCAN_CONDITION,
+    EventType.LEN: SCAN_LEN,
+    EventType.USE: SCAN_INT,
+    EventType.TEST_DEF: SCAN_INT,
+    EventType.TEST_USE: SCAN_INT,
+}
+
+
+def scan_varint(buffer, offset: int) -> Tuple[int, int]:
+    result, shift = 0, 0
+    while True:
+        byte = buffer[offset]
+        offset += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, offset
+        shift += 7
+
+
+def scan_buffer(
+    buffer,
+    base_events: Dict[int, Event],
+    statistics: TraceStatistics = None,
+    offset: int = 0,
+) -> TraceStatistics:
+    # Walks the length fields of the records in buffer, e.g. bytes or an mmap,
+    # without decoding payloads or instantiating events. Only extended records
+    # are decoded as they carry the number of hits they stand for. offset is
+    # the position of buffer in the trace, which allows scanning the segments
+    # of a rotated trace into the same statistics. A truncated record at the
+    # end is not counted.
+    if statistics is None:
+        statistics = TraceStatistics()
+    ids, types, type_bytes = statistics.ids, statistics.types, statistics.bytes
+    kinds = {
+        event_id: SCAN_KINDS.get(event.event_type, SCAN_NONE)
+        for event_id, event in base_events.items()
+    }
+    boundaries = {
+        event_id
+        for event_id, event in base_events.items()
+        if event.event_type in (EventType.TEST_START, EventType.TEST_END)
+    }
+    counts, id_bytes, records = dict(), dict(), 0
+    tests = statistics.tests
+    test = statistics.current
+    stream = None
+    version = LEGACY
+    legacy, timestamped = True, False
+    size = len(buffer)
+    position = start = 0
+    while position < size:
+        # noinspection PyBroadException
+        try:
+            hits = None
+            if buffer[position] == EXTENDED:
+                kind = buffer[position + 1]
+                if kind == FORMAT:
+                    version = buffer[position + 2]
+                    legacy = base_version(version) == LEGACY
+                    timestamped = bool(version & TIMESTAMPED)
+                    position += 3
+                    continue
+                elif kind == SYNC:
+                    position += 2 + len(SYNC_MARKER) + 4
+                    continue
+                if stream is None:
+                    stream = buffer if hasattr(buffer, "seek") else io.BytesIO(buffer)
+                stream.seek(position)
+                fmt = Format(version)
+                event = load_next_base_event(stream, base_events, fmt)
+                hits = event.instantiate(
+                    *load_event_args(stream, event, fmt)
+                ).hit_counts()
+                position = stream.tell()
+                event_id = None
+            elif legacy:
+                length = buffer[position]
+                event_id = int.from_bytes(
+                    buffer[position + 1 : position + 1 + length], ENDIAN
+                )
+                position += 1 + length
+                kind = kinds[event_id]
+                if kind == SCAN_DEF:
+                    position += 1 + buffer[position]
+                    position += 4 + int.from_bytes(
+                        buffer[position : position + 4], ENDIAN
+                    )
+                    position += 2 + int.from_bytes(
+                        buffer[position : position + 2], ENDIAN
+                    )
+                elif kind == SCAN_EXIT:
+                    position += 4 + int.from_bytes(
+                        buffer[position : position + 4], ENDIAN
+                    )
+                    position += 2 + int.from_bytes(
+                        buffer[position : position + 2], ENDIAN
+                    )
+                elif kind == SCAN_CONDITION:
+                    position += 1
+                elif kind == SCAN_LEN:
+                    position += 1 + buffer[position]
+                    position += 1 + buffer[position]
+                elif kind == SCAN_INT:
+                    position += 1 + buffer[position]
+            else:
+                event_id, position = scan_varint(buffer, position)
+                event_id -= 1
+                kind = kinds[event_id]
+                if kind == SCAN_DEF:
+                    _, position = scan_varint(buffer, position)
+                    length, position = scan_varint(buffer, position)
+                    length, position = scan_varint(buffer, position + length)
+                    position += length
+                elif kind == SCAN_EXIT:
+                    length, position = scan_varint(buffer, position)
+                    length, position = scan_varint(buffer, position + length)
+                    position += length
+                elif kind == SCAN_CONDITION:
+                    position += 1
+                elif kind == SCAN_LEN:
+                    _, position = scan_varint(buffer, position)
+                    _, position = scan_varint(buffer, position)
+                elif kind == SCAN_INT:
+                    _, position = scan_varint(buffer, position)
+            if timestamped and hits is None:
+                _, position = scan_varint(buffer, position)
+        except:
+            break
+        if position > size:
+            break
+        records += 1
+        if hits is None:
+            # the types are derived from the ids after the scan
+            counts[event_id] = counts.get(event_id, 0) + 1
+            id_bytes[event_id] = id_bytes.get(event_id, 0) + position - start
+            if event_id not in boundaries:
+                start = position
+                if test is not None:
+                    test.records += 1
+                continue
+            event = base_events[event_id]
+        else:
+            type_bytes[event.event_type] = (
+                type_bytes.get(event.event_type, 0) + position - start
+            )
+            for hit_id, count in hits:
+                counts[hit_id] = counts.get(hit_id, 0) + count
+        if event.event_type == EventType.TEST_START:
+            if test is not None:
+                test.end = offset + start
+            test = TestSpan(event.test, event.test_id, offset + start)
+            tests.append(test)
+        if test is not None:
+            test.records += 1
+            test.end = offset + position
+            if event.event_type == EventType.TEST_END:
+                test = None
+        start = position
+    if test is not None:
+        test.end = offset + start
+    statistics.current = test
+    statistics.records += records
+    for event_id, count in counts.items():
+        ids[event_id] = ids.get(event_id, 0) + count
+        event_type = base_events[event_id].event_type
+        types[event_type] = types.get(event_type, 0) + count
+    for event_id, n in id_bytes.items():
+        event_type = base_events[event_id].event_type
+        type_bytes[event_type] = type_bytes.get(event_type, 0) + n
+    statistics.size = offset + start
+    return statistics
+
+
+def scan_stream(stream: BinaryIO, base_events: Dict[int, Event]) -> TraceStatistics:
+    return scan_buffer(stream.read(), base_events)
+
+
+def scan(path, base_events: Dict[int, Event]) -> TraceStatistics:
+    statistics = TraceStatistics()
+    offset = 0
+    for segment in segment_paths(path) or [path]:
+        with open(segment, "rb") as fp:
+            size = os.fstat(fp.fileno()).st_size
+            if size == 0:
+                continue
+            buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            scan_buffer(buffer, base_events, statistics, offset)
+        finally:
+            buffer.close()
+        offset += size
+    return statistics
+
+
+def select(
+    base_events: Dict[int, Event],
+    event_types: Optional[Set[EventType]] = None,
+    files: Optional[Set[str]] = None,
+    lines: Optional[Set[int]] = None,
+    predicate: Optional[Callable[[Event], bool]] = None,
+) -> Set[int]:
+    # the ids of the base events that match all given conditions
+    return {
+        event_id
+        for event_id, event in base_events.items()
+        if (event_types is None or event.event_type in event_types)
+        and (files is None or event.file in files)
+        and (lines is None or event.line in lines)
+        and (predicate is None or predicate(event))
+    }
+
+
+# event types whose records start with a var_id
+VAR_TYPES = {
+    EventType.DEF,
+    EventType.USE,
+    EventType.LEN,
+    EventType.TEST_DEF,
+    EventType.TEST_USE,
+}
+
+
+def load_filtered_stream(
+    stream: BinaryIO,
+    base_events: Dict[int, Event],
+    ids: Optional[Set[int]] = None,
+    header: Optional[Callable[[Event, int], bool]] = None,
+) -> Iterator[Event]:
+    # Yields only the events with an id in ids, e.g. from select(), and, for
+    # records with a var_id, for which header(base_event, var_id) holds. The
+    # payload of every other record is skipped without decoding it.
+    fmt = Format()
+    while True:
+        # noinspection PyBroadException
+        try:
+            events = load_filtered_record(stream, base_events, fmt, ids, header)
+        except:
+            break
+        yield from events
+
+
+def load_var_record(
+    stream: BinaryIO,
+    event: Event,
+    fmt: Format,
+    header: Callable[[Event, int], bool],
+) -> List[Event]:
+    # reads the var_id first, such that the value of a rejected record is
+    # skipped and never unpickled
+    event_type = event.event_type
+    var_id = fmt.read_len_int(stream, 1)
+    result = []
+    if header(event, var_id):
+        if event_type == EventType.DEF:
+            value = fmt.read_len_bytes(stream, 4)
+            type_ = fmt.read_len_str(stream, 2)
+            result = [event.instantiate(var_id, load_value(value), type_)]
+        elif event_type == EventType.LEN:
+            result = [event.instantiate(var_id, fmt.read_len_int(stream, 1))]
+        else:
+            result = [event.instantiate(var_id)]
+    elif event_type == EventType.DEF:
+        fmt.skip_len(stream, 4)
+        fmt.skip_len(stream, 2)
+    elif event_type == EventType.LEN:
+        fmt.skip_len_int(stream, 1)
+    read_timestamp(stream, fmt)
+    return result
+
+
+def load_filtered_record(
+    stream: BinaryIO,
+    base_events: Dict[int, Event],
+    fmt: Format,
+    ids: Optional[Set[int]],
+    header: Optional[Callable[[Event, int], bool]],
+) -> List[Event]:
+    event = load_next_base_event(stream, base_events, fmt)
+    if event.extended:
+        if event.event_id is None:
+            record = event.instantiate(*load_event_args(stream, event, fmt))
+            if ids is not None:
+                record.counts = [c for c in record.counts if c[0] in ids]
+            return record.expand()
+        elif isinstance(event, LoopSummary):
+            # a summary stands for the events of three ids
+            events = event.instantiate(*load_event_args(stream, event, fmt)).expand()
+            if ids is None:
+                return events
+            return [e for e in events if e.event_id in ids]
+        elif ids is None or event.event_id in ids:
+            if (
+                header is not None
+                and isinstance(event, CapturedValue)
+                and event.event.event_type in VAR_TYPES
+            ):
+                events = load_var_record(stream, event.event, fmt, header)
+                for e in events:
+                    e.capture = event.capture
+                return events
+            return event.instantiate(*load_event_args(stream, event, fmt)).expand()
+        skip_event_args(stream, event, fmt)
+        return []
+    if ids is not None and event.event_id not in ids:
+        skip_event_args(stream, event, fmt)
+        return []
+    if header is None or event.event_type not in VAR_TYPES:
+        return [event.instantiate(*load_event_args(stream, event, fmt))]
+    return load_var_record(stream, event, fmt, header)
+
+
+def load_filtered(
+    path,
+    base_events: Dict[int, Event],
+    ids: Optional[Set[int]] = None,
+    header: Optional[Callable[[Event, int], bool]] = None,
+) -> List[Event]:
+    with open_trace(path) as fp:
+        return list(load_filtered_stream(fp, base_events, ids, header))
+
+
+class Timing:
+    # The time in ns spent in a function or loop over all of its runs.
+    # inclusive counts everything until the matching exit or end, exclusive
+    # leaves out the functions called meanwhile, but not nested loops.
+    def __init__(self, event: Event):
+        self.event = event
+        self.runs = 0
+        self.inclusive = 0
+        self.exclusive = 0
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}({self.event},{self.runs},"
+            f"{self.inclusive},{self.exclusive})"
+        )
+
+
+class Timings:
+    def __init__(self):
+        # function_id -> Timing of the function, loop_id -> Timing of the loop
+        self.functions: Dict[int, Timing] = dict()
+        self.loops: Dict[int, Timing] = dict()
+        # the time of the last record since the first one
+        self.time = 0
+
+
+def close_frames(stack: List[list], timing: Optional[Timing], time: int):
+    # Pops the frames down to the topmost one of timing. Frames above it were
+    # left without their exit or end, e.g. by an exception, and end together
+    # with it. The time of a function is added to the called time of all
+    # frames up to and including the function it was called from.
+    if timing is None or not any(frame[0] is timing for frame in stack):
+        return
+    while True:
+        frame_timing, start, called, function = stack.pop()
+        inclusive = time - start
+        frame_timing.runs += 1
+        frame_timing.inclusive += inclusive
+        frame_timing.exclusive += inclusive - called
+        if function:
+            for frame in reversed(stack):
+                frame[2] += inclusive
+                if frame[3]:
+                    break
+        if frame_timing is timing:
+            return
+
+
+def timings_stream(stream: BinaryIO, base_events: Dict[int, Event]) -> Timings:
+    # Reads the records of a timestamped trace without their payloads and pairs
+    # each FUNCTION_ENTER with the next FUNCTION_EXIT or FUNCTION_ERROR of its
+    # function_id and each LOOP_BEGIN with the next LOOP_END of its loop_id.
+    # Recursive runs count their inclusive time for every run. A trace without
+    # timestamps has all times 0.
+    result = Timings()
+    fmt = Format()
+    stack = list()
+    while True:
+        # noinspection PyBroadException
+        try:
+            event = load_next_base_event(stream, base_events, fmt)
+            skip_event_args(stream, event, fmt)
+        except:
+            break
+        event_type = event.event_type
+        if event.extended:
+            # loop summaries are written at the end of the loop and have no
+            # duration
+            if event_type != EventType.FUNCTION_EXIT:
+                continue
+            event = event.event
+        if event_type == EventType.FUNCTION_ENTER:
+            timing = result.functions.get(event.function_id)
+            if timing is None:
+                timing = result.functions[event.function_id] = Timing(event)
+            stack.append([timing, fmt.time, 0, True])
+        elif event_type == EventType.LOOP_BEGIN:
+            timing = result.loops.get(event.loop_id)
+            if timing is None:
+                timing = result.loops[event.loop_id] = Timing(event)
+            stack.append([timing, fmt.time, 0, False])
+        elif event_type in (EventType.FUNCTION_EXIT, EventType.FUNCTION_ERROR):
+            close_frames(stack, result.functions.get(event.function_id), fmt.time)
+        elif event_type == EventType.LOOP_END:
+            close_frames(stack, result.loops.get(event.loop_id), fmt.time)
+    result.time = fmt.time
+    return result
+
+
+def timings(path, base_events: Dict[int, Event]) -> Timings:
+    with open_trace(path) as fp:
+        return timings_stream(fp, base_events)
+
+
 def load_json(path) -> Dict[int, Event]:
     with open(path, "r") as fp:
         events = json.load(fp)
     return {event.event_id: event for event in map(deserialize, events)}
+
+
+def dispatch_stream(stream: BinaryIO, base_events: Dict[int, Event], *models: Any):
+    fmt = Format()
+    while True:
+        # noinspection PyBroadException
+        try:
+            event = load_next_base_event(stream, base_events, fmt)
+            args = load_event_args(stream, event, fmt)
+        except:
+            break
+        # payload-free events are handled by their base event without allocation
+        if args:
+            event = event.instantiate(*args)
+        for model in models:
+            event.handle(model)
+
+
+def dispatch(path, base_events: Dict[int, Event], *models: Any):
+    with open_trace(path) as fp:
+        dispatch_stream(fp, base_events, *models)
@@ -0,0 +1,202 @@
+import sys
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from sflkitlib.events import EventType
+from sflkitlib.events.event import Event, Format, load_next_event, open_trace
+
+sys.path = sys.path[1:] + sys.path[:1]
+import array
+
+sys.path = sys.path[-1:] + sys.path[:-1]
+
+# positions and calls that do not exist, e.g. the parent of an outermost call
+NONE = -1
+DEF_TYPES = (EventType.DEF, EventType.TEST_DEF)
+USE_TYPES = (EventType.USE, EventType.TEST_USE)
+
+
+class TraceIndex:
+    # The events of a trace with their call tree and def-use chains, built in
+    # one pass while decoding. Events are addressed by their position in
+    # events, calls by their number in the order they were entered. All links
+    # are arrays of positions or call numbers with NONE for missing ones.
+    def __init__(self):
+        self.events: List[Event] = list()
+        # position -> the innermost call the event belongs to, a FUNCTION_ENTER
+        # and its exit belong to the call they start and end
+        self.event_calls = array.array("q")
+        # call -> position of its FUNCTION_ENTER and its last event, the call
+        # it was made from, its first and last callee and the next call made
+        # from the same caller
+        self.call_starts = array.array("q")
+        self.call_ends = array.array("q")
+        self.call_parents = array.array("q")
+        self.first_callees = array.array("q")
+        self.last_callees = array.array("q")
+        self.next_callees = array.array("q")
+        # position of a use -> position of the def it reads, position of a def
+        # -> its first use, position of a use -> the next use of the same def
+        self.reaching_defs = array.array("q")
+        self.first_uses = array.array("q")
+        self.next_uses = array.array("q")
+        # the state while building
+        self.stack: List[int] = list()
+        self.last_defs: Dict[Tuple[str, int], int] = dict()
+        self.last_uses: Dict[int, int] = dict()
+
+    def __len__(self):
+        return len(self.events)
+
+    @property
+    def calls(self) -> int:
+        return len(self.call_starts)
+
+    def enter(self, position: int, parent: int) -> int:
+        call = len(self.call_starts)
+        self.call_starts.append(position)
+        self.call_ends.append(NONE)
+        self.call_parents.append(parent)
+        self.first_callees.append(NONE)
+        self.last_callees.append(NONE)
+        self.next_callees.append(NONE)
+        if parent != NONE:
+            last = self.last_callees[parent]
+            if last == NONE:
+                self.first_callees[parent] = call
+            else:
+                self.next_callees[last] = call
+            self.last_callees[parent] = call
+        self.stack.append(call)
+        return call
+
+    def leave(self, position: int, function_id: int) -> int:
+        # Ends the topmost call of function_id at position. Calls above it
+        # were left without their exit, e.g. by an exception, and end right
+        # before it. Returns the ended call, or NONE for an exit without a
+        # running call.
+        for depth in range(len(self.stack) - 1, -1, -1):
+            if self.events[self.call_starts[self.stack[depth]]].function_id == (
+                function_id
+            ):
+                break
+        else:
+            return NONE
+        while len(self.stack) > depth + 1:
+            self.call_ends[self.stack.pop()] = position - 1
+        call = self.stack.pop()
+        self.call_ends[call] = position
+        return call
+
+    def add(self, event: Event):
+        position = len(self.events)
+        self.events.append(event)
+        event_type = event.event_type
+        call = self.stack[-1] if self.stack else NONE
+        reaching, first_use = NONE, NONE
+        if event_type == EventType.FUNCTION_ENTER:
+            call = self.enter(position, call)
+        elif event_type in (EventType.FUNCTION_EXIT, EventType.FUNCTION_ERROR):
+            ended = self.leave(position, event.function_id)
+            if ended != NONE:
+                call = ended
+        elif event_type in DEF_TYPES:
+            self.last_defs[(event.var, event.var_id)] = position
+        elif event_type in USE_TYPES:
+            reaching = self.last_defs.get((event.var, event.var_id), NONE)
+            if reaching != NONE:
+                last = self.last_uses.get(reaching)
+                if last is None:
+                    self.first_uses[reaching] = position
+                else:
+                    self.next_uses[last] = position
+                self.last_uses[reaching] = position
+        elif event_type == EventType.TEST_START:
+            # object ids are reused by later tests
+            self.last_defs.clear()
+            self.last_uses.clear()
+        self.event_calls.append(call)
+        self.reaching_defs.append(reaching)
+        self.first_uses.append(first_use)
+        self.next_uses.append(NONE)
+
+    def finish(self):
+        # calls still running at the end of the trace end with it
+        while self.stack:
+            self.call_ends[self.stack.pop()] = len(self.events) - 1
+        self.last_defs.clear()
+        self.last_uses.clear()
+
+    def call_of(self, position: int) -> Optional[int]:
+        call = self.event_calls[position]
+        return None if call == NONE else call
+
+    def parent(self, call: int) -> Optional[int]:
+        parent = self.call_parents[call]
+        return None if parent == NONE else parent
+
+    def call_stack(self, position: int) -> List[int]:
+        # the calls the event is nested in, outermost first
+        stack = list()
+        call = self.event_calls[position]
+        while call != NONE:
+            stack.append(call)
+            call = self.call_parents[call]
+        stack.reverse()
+        return stack
+
+    def callees(self, call: int) -> List[int]:
+        callees = list()
+        callee = self.first_callees[call]
+        while callee != NONE:
+            callees.append(callee)
+            callee = self.next_callees[callee]
+        return callees
+
+    def roots(self) -> List[int]:
+        return [c for c in range(self.calls) if self.call_parents[c] == NONE]
+
+    def span(self, call: int) -> Tuple[int, int]:
+        return self.call_starts[call], self.call_ends[call]
+
+    def events_in_call(self, call: int) -> List[Event]:
+        # the events of the call including the ones of its callees
+        start, end = self.span(call)
+        return self.events[start : end + 1]
+
+    def function(self, call: int) -> Event:
+        return self.events[self.call_starts[call]]
+
+    def reaching_def(self, position: int) -> Optional[int]:
+        reaching = self.reaching_defs[position]
+        return None if reaching == NONE else reaching
+
+    def uses(self, position: int) -> List[int]:
+        uses = list()
+        use = self.first_uses[position]
+        while use != NONE:
+            uses.append(use)
+            use = self.next_uses[use]
+        return uses
+
+
+def build_index_stream(stream: BinaryIO, base_events: Dict[int, Event]) -> TraceIndex:
+    index = TraceIndex()
+    fmt = Format()
+    while True:
+        # noinspection PyBroadException
+        try:
+            event = load_next_event(stream, base_events, fmt)
+        except:
+            break
+        if event.extended:
+            for expanded in event.expand():
+                index.add(expanded)
+        else:
+            index.add(event)
+    index.finish()
+    return index
+
+
+def build_index(path, base_events: Dict[int, Event]) -> TraceIndex:
+    with open_trace(path) as fp:
+        return build_index_stream(fp, base_events)
@@ -0,0 +1,239 @@
+import sys
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple
+
+from sflkitlib.events import EventType
+from sflkitlib.events.codec import LEGACY, SyncWriter, encode_format
+from sflkitlib.events.event import (
+    Event,
+    Format,
+    load_json,
+    load_next_base_event,
+    open_trace,
+    skip_event_args,
+    skip_sync_records,
+)
+
+sys.path = sys.path[1:] + sys.path[:1]
+import argparse
+import heapq
+import io
+import json
+import zlib
+
+sys.path = sys.path[-1:] + sys.path[:-1]
+
+CHUNK_SIZE = 1 << 20
+
+
+class Segment:
+    # A byte range [start, end) of a trace. Segments start at the beginning of
+    # the trace or at a TEST_START record, so TEST_START/TEST_END blocks are
+    # never split. version is the format in effect at start, end_version the
+    # one in effect at end. The sync records in the range are not copied.
+    def __init__(
+        self,
+        source: str,
+        start: int,
+        end: int,
+        test: Optional[str] = None,
+        test_id: Optional[int] = None,
+        version: int = LEGACY,
+    ):
+        self.source = source
+        self.start = start
+        self.end = end
+        self.test = test
+        self.test_id = test_id
+        self.version = version
+        self.end_version = version
+        self.syncs: List[Tuple[int, int]] = list()
+
+    def __len__(self):
+        return self.end - self.start - sum(end - start for start, end in self.syncs)
+
+    def ranges(self) -> List[Tuple[int, int]]:
+        result = list()
+        start = self.start
+        for sync_start, sync_end in self.syncs:
+            if sync_start > start:
+                result.append((start, sync_start))
+            start = sync_end
+        if self.end > start:
+            result.append((start, self.end))
+        return result
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}({self.source},{self.start},{self.end},"
+            f"{self.test})"
+        )
+
+    def serialize(self, offset: int, length: int):
+        return {
+            "source": self.source,
+            "test": self.test,
+            "test_id": self.test_id,
+            "offset": offset,
+            "length": length,
+            "version": self.version,
+        }
+
+
+def default_key(segment: Segment):
+    return -1 if segment.test_id is None else segment.test_id
+
+
+def segments(path, base_events: Dict[int, Event]) -> List[Segment]:
+    # Splits a trace into segments by walking the record headers. A truncated
+    # or corrupt tail is excluded from the last segment. A rotated trace is
+    # walked across all of its segment files, its offsets are those of the
+    # segment files concatenated.
+    path = str(path)
+    result = list()
+    current = Segment(path, 0, 0)
+    fmt = Format()
+    with open_trace(path) as fp:
+        size = fp.seek(0, io.SEEK_END)
+        fp.seek(0)
+        while True:
+            start = fp.tell()
+            version = fmt.version
+            # noinspection PyBroadException
+            try:
+                syncs = skip_sync_records(fp, fmt)
+                event = load_next_base_event(fp, base_events, fmt)
+                skip_event_args(fp, event, fmt)
+            except:
+                break
+            if fp.tell() > size:
+                break
+            if event.event_type == EventType.TEST_START:
+                if len(current) > 0:
+                    result.append(current)
+                current = Segment(
+                    path, start, start, event.test, event.test_id, version
+                )
+            current.syncs.extend(syncs)
+            current.end = fp.tell()
+            current.end_version = fmt.version
+    if len(current) > 0:
+        result.append(current)
+    return result
+
+
+def copy(source: BinaryIO, output: BinaryIO, segment: Segment):
+    for start, end in segment.ranges():
+        source.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            data = source.read(min(CHUNK_SIZE, remaining))
+            if not data:
+                return
+            output.write(data)
+            remaining -= len(data)
+
+
+def write(
+    ordered: Any, sources: Dict[str, BinaryIO], output, index=None, sync: int = 0
+) -> List[Segment]:
+    # With sync, a new sync record is written after every sync bytes of the
+    # output, the ones of the sources are dropped with the segments.
+    written = list()
+    entries = list()
+    version = LEGACY
+    with open(output, "wb") as out:
+        stream = SyncWriter(out, sync, zlib.crc32) if sync > 0 else out
+        for segment in ordered:
+            if segment.version != version:
+                # the segment was written in another format than the one
+                # that is in effect at this point of the output
+                stream.write(encode_format(segment.version))
+            offset = out.tell()
+            copy(sources[segment.source], stream, segment)
+            version = segment.end_version
+            entries.append(segment.serialize(offset, out.tell() - offset))
+            written.append(segment)
+        stream.close()
+    if index is not None:
+        with open(index, "w") as fp:
+            json.dump({"trace": str(output), "segments": entries}, fp)
+    return written
+
+
+def concat(
+    paths: List[Any], base_events: Dict[int, Event], output, index=None, sync: int = 0
+) -> List[Segment]:
+    return merge(
+        paths, base_events, output, index=index, key=None, ordered=False, sync=sync
+    )
+
+
+def merge(
+    paths: List[Any],
+    base_events: Dict[int, Event],
+    output,
+    index=None,
+    key: Optional[Callable[[Segment], Any]] = default_key,
+    ordered: bool = True,
+    sync: int = 0,
+) -> List[Segment]:
+    # Combines the traces at record level without instantiating events. If
+    # ordered, the segments of the traces are k-way merged by key, which
+    # assumes that every trace is already ordered by key, e.g. by test id.
+    # Otherwise, the traces are concatenated. With index, a JSON index of the
+    # segments in the output is written alongside. With sync, the output gets
+    # a sync record after every sync bytes.
+    paths = [str(path) for path in paths]
+    per_trace = [segments(path, base_events) for path in paths]
+    sources = {path: open_trace(path) for path in paths}
+    try:
+        if ordered:
+            combined = heapq.merge(*per_trace, key=key)
+        else:
+            combined = (segment for trace in per_trace for segment in trace)
+        return write(combined, sources, output, index=index, sync=sync)
+    finally:
+        for source in sources.values():
+            source.close()
+
+
+def load_index(path) -> List[Dict[str, Any]]:
+    with open(path, "r") as fp:
+        return json.load(fp)["segments"]
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Concatenate or merge sflkit traces at record level."
+    )
+    parser.add_argument("traces", nargs="+", help="the traces to combine")
+    parser.add_argument(
+        "-e", "--events", required=True, help="the json file of the base events"
+    )
+    parser.add_argument("-o", "--output", required=True, help="the combined trace")
+    parser.add_argument("-i", "--index", help="write a segment index to this file")
+    parser.add_argument(
+        "-c",
+        "--concat",
+        action="store_true",
+        help="concatenate the traces instead of merging them by test id",
+    )
+    parser.add_argument(
+        "-s",
+        "--sync",
+        type=int,
+        default=0,
+        help="write a sync record after every n bytes of the combined trace",
+    )
+    args = parser.parse_args(args)
+    base_events = load_json(args.events)
+    if args.concat:
+        concat(
+            args.traces, base_events, args.output, index=args.index, sync=args.sync
+        )
+    else:
+        merge(args.traces, base_events, args.output, index=args.index, sync=args.sync)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import sys
+from typing import Dict, List, Optional
+
+from sflkitlib.events.codec import EXTENDED, SYNC, SYNC_MARKER, ENDIAN
+from sflkitlib.events.event import Event, Format, load_next_event, segment_paths
+
+sys.path = sys.path[1:] + sys.path[:1]
+import mmap
+import os
+import zlib
+
+sys.path = sys.path[-1:] + sys.path[:-1]
+
+SYNC_PREFIX = bytes((EXTENDED, SYNC)) + SYNC_MARKER
+SYNC_LENGTH = len(SYNC_PREFIX) + 4
+
+
+class DecodeError:
+    # Decoding failed at offset for reason, resumed is the offset at which
+    # decoding continued or None if nothing after offset could be salvaged.
+    def __init__(self, offset: int, reason: str, resumed: Optional[int] = None):
+        self.offset = offset
+        self.reason = reason
+        self.resumed = resumed
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}({self.offset},{self.reason},{self.resumed})"
+        )
+
+
+class Recovery:
+    def __init__(self, size: int):
+        self.size = size
+        self.events: List[Event] = list()
+        self.errors: List[DecodeError] = list()
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}({len(self.events)} events,"
+            f"{len(self.errors)} errors)"
+        )
+
+    @property
+    def complete(self) -> bool:
+        return not self.errors
+
+
+def decodes(
+    buffer: mmap.mmap,
+    offset: int,
+    end: int,
+    base_events: Dict[int, Event],
+    fmt: Format,
+    lookahead: int,
+) -> bool:
+    # checks whether lookahead records, or all records up to the sync record
+    # at end, decode from offset. Reaching the end of the trace early is not
+    # enough, since the bytes of a truncated record often decode on their own.
+    buffer.seek(offset)
+    fmt = Format(fmt.version)
+    for _ in range(lookahead):
+        if buffer.tell() == end and end < buffer.size():
+            return True
+        # noinspection PyBroadException
+        try:
+            load_next_event(buffer, base_events, fmt)
+        except:
+            return False
+        if buffer.tell() > end:
+            return False
+    return True
+
+
+def resync(
+    buffer: mmap.mmap,
+    offset: int,
+    base_events: Dict[int, Event],
+    fmt: Format,
+    lookahead: int,
+) -> Optional[int]:
+    # The next sync record is the safest place to continue. Without one, the
+    # first offset from which lookahead records decode is taken.
+    sync = buffer.find(SYNC_PREFIX, offset + 1)
+    end = buffer.size() if sync < 0 else sync
+    for candidate in range(offset + 1, end):
+        if decodes(buffer, candidate, end, base_events, fmt, lookahead):
+            return candidate
+    return None if sync < 0 else sync
+
+
+def recover_segment(
+    path,
+    start: int,
+    recovery: Recovery,
+    base_events: Dict[int, Event],
+    lookahead: int,
+    drop_corrupt: bool,
+):
+    # Decodes a single file into recovery, its offsets are reported relative
+    # to start.
+    size = os.path.getsize(path)
+    if size == 0:
+        return
+    with open(path, "rb") as fp:
+        buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        fmt = Format()
+        offset, chunk_start = 0, 0
+        chunk: List[Event] = list()
+        while offset < size:
+            if buffer[offset : offset + len(SYNC_PREFIX)] == SYNC_PREFIX:
+                expected = int.from_bytes(
+                    buffer[offset + len(SYNC_PREFIX) : offset + SYNC_LENGTH], ENDIAN
+                )
+                if zlib.crc32(buffer[chunk_start:offset]) != expected:
+                    recovery.errors.append(
+                        DecodeError(
+                            start + chunk_start, "checksum mismatch", start + offset
+                        )
+                    )
+                    if drop_corrupt:
+                        chunk = list()
+                recovery.events.extend(chunk)
+                chunk = list()
+                offset += SYNC_LENGTH
+                chunk_start = offset
+                continue
+            buffer.seek(offset)
+            try:
+                event = load_next_event(buffer, base_events, fmt)
+            except Exception as e:
+                if isinstance(e, EOFError):
+                    reason = "truncated record"
+                else:
+                    reason = f"{e.__class__.__name__}: {e}"
+                resumed = resync(buffer, offset, base_events, fmt, lookahead)
+                recovery.errors.append(
+                    DecodeError(
+                        start + offset,
+                        reason,
+                        None if resumed is None else start + resumed,
+                    )
+                )
+                if resumed is None:
+                    break
+                offset = resumed
+                continue
+            offset = buffer.tell()
+            if event.extended:
+                chunk.extend(event.expand())
+            else:
+                chunk.append(event)
+        # events after the last sync record cannot be verified but are kept
+        recovery.events.extend(chunk)
+    finally:
+        buffer.close()
+
+
+def recover(
+    path,
+    base_events: Dict[int, Event],
+    lookahead: int = 4,
+    drop_corrupt: bool = True,
+) -> Recovery:
+    # Decodes as much of a damaged trace as possible. Every position at which
+    # decoding failed is reported with its byte offset and reason, then the
+    # decoding resynchronizes at the next valid record. If the trace contains
+    # sync records (EVENTS_SYNC), the bytes between two of them are verified
+    # against the checksum and with drop_corrupt, the events of a chunk that
+    # fails verification are dropped. The segments of a rotated trace are
+    # recovered one after another, as each starts with its own header and
+    # checksum, and offsets are those of the segment files concatenated.
+    paths = segment_paths(path) or [str(path)]
+    recovery = Recovery(sum(os.path.getsize(p) for p in paths))
+    start = 0
+    for segment in paths:
+        recover_segment(segment, start, recovery, base_events, lookahead, drop_corrupt)
+        start += os.path.getsize(segment)
+    return recovery
@@ -0,0 +1,213 @@
+import sys
+from typing import Optional
+
+sys.path = sys.path[1:] + sys.path[:1]
+import os
+import struct
+import time
+from multiprocessing import shared_memory
+
+sys.path = sys.path[-1:] + sys.path[:-1]
+
+# The shared memory starts with four unsigned 64-bit integers: the capacity of
+# the ring, the total number of bytes written (head), the total number of bytes
+# consumed (tail) and the state flags. The single producer only moves head and
+# the single consumer only moves tail, data is always copied before the
+# corresponding counter is published.
+HEADER = struct.Struct("=QQQQ")
+CAPACITY, HEAD, TAIL, STATE = 0, 8, 16, 24
+CLOSED = 1
+SPILLED = 2
+
+BLOCK = "block"
+SPILL = "spill"
+
+
+class RingBuffer:
+    def __init__(self, shm: shared_memory.SharedMemory):
+        self.shm = shm
+        self.buf = shm.buf
+        self.capacity = self.get(CAPACITY)
+
+    @staticmethod
+    def create(capacity: int = 1 << 24, name: str = None) -> "RingBuffer":
+        shm = shared_memory.SharedMemory(
+            name=name, create=True, size=HEADER.size + capacity
+        )
+        HEADER.pack_into(shm.buf, 0, capacity, 0, 0, 0)
+        return RingBuffer(shm)
+
+    @staticmethod
+    def attach(name: str) -> "RingBuffer":
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # before Python 3.13 attaching registers the segment with the
+            # resource tracker, which would unlink it when this process exits
+            from multiprocessing import resource_tracker
+
+            shm = shared_memory.SharedMemory(name=name)
+            # noinspection PyProtectedMember
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return RingBuffer(shm)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def get(self, field: int) -> int:
+        return struct.unpack_from("=Q", self.buf, field)[0]
+
+    def set(self, field: int, value: int):
+        struct.pack_into("=Q", self.buf, field, value)
+
+    def set_state(self, flag: int):
+        self.set(STATE, self.get(STATE) | flag)
+
+    def free(self) -> int:
+        return self.capacity - (self.get(HEAD) - self.get(TAIL))
+
+    def available(self) -> int:
+        return self.get(HEAD) - self.get(TAIL)
+
+    def put(self, data: memoryview):
+        # the caller guarantees that len(data) <= self.free()
+        head = self.get(HEAD)
+        position = head % self.capacity
+        first = min(len(data), self.capacity - position)
+        self.buf[HEADER.size + position : HEADER.size + position + first] = data[
+            :first
+        ]
+        if first < len(data):
+            self.buf[HEADER.size : HEADER.size + len(data) - first] = data[first:]
+        self.set(HEAD, head + len(data))
+
+    def take(self) -> bytes:
+        tail = self.get(TAIL)
+        n = self.get(HEAD) - tail
+        position = tail % self.capacity
+        first = min(n, self.capacity - position)
+        data = bytes(self.buf[HEADER.size + position : HEADER.size + position + first])
+        if first < n:
+            data += bytes(self.buf[HEADER.size : HEADER.size + n - first])
+        self.set(TAIL, tail + n)
+        return data
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+class RingWriter:
+    # File-like producer side used by sflkitlib.lib for EVENTS_TRANSPORT=shm:<name>.
+    # If a record does not fit, the writer either waits for the consumer (block)
+    # or writes this and all following records to spill_path (spill), such that
+    # the ring followed by the spill file always forms the complete trace.
+    def __init__(
+        self,
+        name: str,
+        overflow: str = BLOCK,
+        spill_path: str = "EVENTS_PATH",
+        poll_interval: float = 0.0001,
+    ):
+        if overflow not in (BLOCK, SPILL):
+            raise ValueError(f"unknown overflow policy {overflow}")
+        self.ring = RingBuffer.attach(name)
+        self.overflow = overflow
+        self.spill_path = spill_path
+        self.poll_interval = poll_interval
+        self.spill = None
+        self.closed = False
+
+    def write(self, data: bytes):
+        if self.closed:
+            raise ValueError("write to closed ring")
+        if self.spill is not None:
+            self.spill.write(data)
+            return
+        data = memoryview(data)
+        if len(data) <= self.ring.free():
+            self.ring.put(data)
+        elif self.overflow == SPILL:
+            self.spill = open(self.spill_path, "wb")
+            self.ring.set_state(SPILLED)
+            self.spill.write(data)
+        else:
+            while data:
+                free = self.ring.free()
+                if free:
+                    self.ring.put(data[:free])
+                    data = data[free:]
+                else:
+                    time.sleep(self.poll_interval)
+
+    def flush(self):
+        if self.spill is not None:
+            self.spill.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.spill is not None:
+            self.spill.close()
+        self.ring.set_state(CLOSED)
+        self.ring.close()
+
+
+class RingReader:
+    # File-like consumer side, read(n) blocks until n bytes are available or the
+    # writer has closed the ring, so it can be passed to the decoders of
+    # sflkitlib.events.event. Without activity for timeout seconds it reports
+    # the end of the trace.
+    def __init__(
+        self,
+        ring: RingBuffer,
+        spill_path: str = "EVENTS_PATH",
+        poll_interval: float = 0.0001,
+        timeout: Optional[float] = None,
+    ):
+        self.ring = ring
+        self.spill_path = spill_path
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.pending = bytearray()
+        self.spill = None
+
+    def fill(self, n: int):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while len(self.pending) < n:
+            if self.spill is not None:
+                data = self.spill.read(n - len(self.pending))
+                if not data:
+                    return
+                self.pending += data
+                continue
+            state = self.ring.get(STATE)
+            if self.ring.available():
+                self.pending += self.ring.take()
+                if deadline is not None:
+                    deadline = time.monotonic() + self.timeout
+            elif state & CLOSED:
+                if state & SPILLED and os.path.exists(self.spill_path):
+                    self.spill = open(self.spill_path, "rb")
+                else:
+                    return
+            elif deadline is not None and time.monotonic() >= deadline:
+                return
+            else:
+                time.sleep(self.poll_interval)
+
+    def read(self, n: int) -> bytes:
+        if len(self.pending) < n:
+            self.fill(n)
+        data = bytes(self.pending[:n])
+        del self.pending[:n]
+        return data
+
+    def close(self):
+        if self.spill is not None:
+            self.spill.close()
@@ -0,0 +1,158 @@
+import sys
+from typing import BinaryIO, Dict, List, Optional
+
+from sflkitlib.events import EventType
+from sflkitlib.events.codec import ENDIAN
+from sflkitlib.events.event import (
+    Event,
+    Format,
+    load_event_args,
+    load_next_base_event,
+    open_trace,
+    skip_event_args,
+    read_int,
+    read_len_str,
+)
+
+sys.path = sys.path[1:] + sys.path[:1]
+import array
+
+sys.path = sys.path[-1:] + sys.path[:-1]
+
+MAGIC = b"SFLS"
+VERSION = 1
+COUNTS = 1
+
+
+class Spectrum:
+    def __init__(self, size: int, counts: bool = False):
+        self.size = size
+        self.tests: List[str] = list()
+        self.hits: List[bytes] = list()
+        self.counts: Optional[List[array.array]] = list() if counts else None
+
+    def __len__(self):
+        return len(self.tests)
+
+    def add(self, test: str, hits: bytes, counts: array.array = None):
+        self.tests.append(test)
+        self.hits.append(bytes(hits))
+        if self.counts is not None:
+            self.counts.append(counts)
+
+    def is_hit(self, test: int, event_id: int) -> bool:
+        return bool(self.hits[test][event_id >> 3] & (1 << (event_id & 7)))
+
+    def bitset(self, test: int) -> int:
+        # bit i of the returned integer is set iff event id i was hit
+        return int.from_bytes(self.hits[test], "little")
+
+    def event_ids(self, test: int) -> List[int]:
+        bits = self.bitset(test)
+        return [i for i in range(self.size) if bits >> i & 1]
+
+    def count(self, test: int, event_id: int) -> int:
+        if self.counts is None:
+            raise ValueError("spectrum was built without hit counts")
+        return self.counts[test][event_id]
+
+    def dump(self, path):
+        with open(path, "wb") as fp:
+            self.dump_stream(fp)
+
+    def dump_stream(self, stream: BinaryIO):
+        stream.write(MAGIC)
+        stream.write(VERSION.to_bytes(1, ENDIAN))
+        stream.write((0 if self.counts is None else COUNTS).to_bytes(1, ENDIAN))
+        stream.write(self.size.to_bytes(4, ENDIAN))
+        stream.write(len(self.tests).to_bytes(4, ENDIAN))
+        for i, test in enumerate(self.tests):
+            test = test.encode("utf8")
+            stream.write(len(test).to_bytes(2, ENDIAN))
+            stream.write(test)
+            stream.write(self.hits[i])
+            if self.counts is not None:
+                counts = array.array("Q", self.counts[i])
+                if sys.byteorder != ENDIAN:
+                    counts.byteswap()
+                stream.write(counts.tobytes())
+
+    @staticmethod
+    def load(path) -> "Spectrum":
+        with open(path, "rb") as fp:
+            return Spectrum.load_stream(fp)
+
+    @staticmethod
+    def load_stream(stream: BinaryIO) -> "Spectrum":
+        if stream.read(len(MAGIC)) != MAGIC:
+            raise ValueError("not a spectrum file")
+        version = read_int(stream, 1)
+        if version != VERSION:
+            raise ValueError(f"unsupported spectrum version {version}")
+        flags = read_int(stream, 1)
+        spectrum = Spectrum(read_int(stream, 4), counts=bool(flags & COUNTS))
+        row_length = (spectrum.size + 7) // 8
+        for _ in range(read_int(stream, 4)):
+            test = read_len_str(stream, 2)
+            hits = stream.read(row_length)
+            counts = None
+            if spectrum.counts is not None:
+                counts = array.array("Q")
+                counts.frombytes(stream.read(8 * spectrum.size))
+                if sys.byteorder != ENDIAN:
+                    counts.byteswap()
+            spectrum.add(test, hits, counts)
+        return spectrum
+
+
+def build_spectrum_stream(
+    stream: BinaryIO, base_events: Dict[int, Event], counts: bool = False
+) -> Spectrum:
+    spectrum = Spectrum(max(base_events, default=-1) + 1, counts=counts)
+    row_length = (spectrum.size + 7) // 8
+    test, hits, hit_counts = None, None, None
+    fmt = Format()
+    while True:
+        # noinspection PyBroadException
+        try:
+            event = load_next_base_event(stream, base_events, fmt)
+            if event.extended:
+                event = event.instantiate(*load_event_args(stream, event, fmt))
+            else:
+                skip_event_args(stream, event, fmt)
+        except:
+            break
+        if event.event_type == EventType.TEST_START:
+            if hits is not None:
+                spectrum.add(test, hits, hit_counts)
+            test = event.test
+            hits = bytearray(row_length)
+            if counts:
+                hit_counts = array.array("Q", bytes(8 * spectrum.size))
+        if hits is None:
+            # events outside of a TEST_START/TEST_END block belong to no test
+            continue
+        if event.extended:
+            for event_id, count in event.hit_counts():
+                if count:
+                    hits[event_id >> 3] |= 1 << (event_id & 7)
+                    if counts:
+                        hit_counts[event_id] += count
+        else:
+            event_id = event.event_id
+            hits[event_id >> 3] |= 1 << (event_id & 7)
+            if counts:
+                hit_counts[event_id] += 1
+        if event.event_type == EventType.TEST_END:
+            spectrum.add(test, hits, hit_counts)
+            test, hits, hit_counts = None, None, None
+    if hits is not None:
+        spectrum.add(test, hits, hit_counts)
+    return spectrum
+
+
+def build_spectrum(
+    path, base_events: Dict[int, Event], counts: bool = False
+) -> Spectrum:
+    with open_trace(path) as fp:
+        return build_spectrum_stream(fp, base_events, counts=counts)
@@ -0,0 +1,293 @@
+import sys
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+
+from sflkitlib.events import EventType
+from sflkitlib.events.codec import LEGACY, SyncWriter, encode_format, encodings
+from sflkitlib.events.event import (
+    Event,
+    Format,
+    load_next_base_event,
+    load_next_event,
+    open_trace,
+    skip_event_args,
+    skip_sync_records,
+)
+
+sys.path = sys.path[1:] + sys.path[:1]
+import hashlib
+import io
+import json
+import os
+import zlib
+
+sys.path = sys.path[-1:] + sys.path[:-1]
+
+MANIFEST = "manifest.json"
+SEGMENTS = "segments"
+
+
+class Reference:
+    # One block of a trace: the TEST_START and TEST_END ids around a body that
+    # is stored once per content. Blocks outside of tests have neither. version
+    # is the format the body starts in, end_version the one it ends in.
+    def __init__(
+        self,
+        digest: str,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        version: int = LEGACY,
+        end_version: int = LEGACY,
+    ):
+        self.digest = digest
+        self.start = start
+        self.end = end
+        self.version = version
+        self.end_version = end_version
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.digest[:12]},{self.start},{self.end})"
+
+    def serialize(self) -> Dict[str, Any]:
+        return {
+            "digest": self.digest,
+            "start": self.start,
+            "end": self.end,
+            "version": self.version,
+            "end_version": self.end_version,
+        }
+
+    @staticmethod
+    def deserialize(s: Dict[str, Any]) -> "Reference":
+        return Reference(
+            *[s[p] for p in ["digest", "start", "end", "version", "end_version"]]
+        )
+
+
+class Block:
+    def __init__(self, start: Optional[int], offset: int, version: int):
+        self.start = start
+        self.begin = offset
+        self.finish = offset
+        self.end = None
+        self.version = version
+        self.end_version = version
+        self.syncs: List[Tuple[int, int]] = list()
+
+    def body(self, stream: BinaryIO) -> bytes:
+        # the bytes of the block without its sync records
+        data = list()
+        start = self.begin
+        for sync_start, sync_end in self.syncs + [(self.finish, self.finish)]:
+            stream.seek(start)
+            data.append(stream.read(sync_start - start))
+            start = sync_end
+        return b"".join(data)
+
+
+def blocks(stream: BinaryIO, base_events: Dict[int, Event]) -> List[Block]:
+    # Splits a trace into blocks by walking the record headers. Format records
+    # in front of a TEST_END belong to the body, the ones in front of a
+    # TEST_START to the block before. Sync records are left out of the blocks,
+    # so equal bodies are equal bytes. A truncated tail is dropped.
+    result = list()
+    current = None
+    fmt = Format()
+    size = stream.seek(0, io.SEEK_END)
+    stream.seek(0)
+    while True:
+        start = stream.tell()
+        version = fmt.version
+        # noinspection PyBroadException
+        try:
+            syncs = skip_sync_records(stream, fmt)
+            event = load_next_base_event(stream, base_events, fmt)
+            skip_event_args(stream, event, fmt)
+        except:
+            break
+        end = stream.tell()
+        if end > size:
+            break
+        if fmt.timestamps:
+            # the TEST_START and TEST_END records are not stored with their
+            # timestamps and timed bodies are hardly ever equal
+            raise ValueError("timestamped traces cannot be stored")
+        if event.event_type == EventType.TEST_START:
+            own = end - len(encodings[fmt.version].event(event.event_id))
+            if own > start:
+                if current is None or current.start is not None:
+                    current = Block(None, start, version)
+                    result.append(current)
+                current.syncs.extend(syncs)
+                current.finish = own
+                current.end_version = fmt.version
+            current = Block(event.event_id, end, fmt.version)
+            result.append(current)
+        elif event.event_type == EventType.TEST_END and (
+            current is not None and current.start is not None
+        ):
+            current.syncs.extend(syncs)
+            current.finish = end - len(encodings[fmt.version].event(event.event_id))
+            current.end = event.event_id
+            current.end_version = fmt.version
+            current = None
+        else:
+            if current is None:
+                current = Block(None, start, version)
+                result.append(current)
+            current.syncs.extend(syncs)
+            current.finish = end
+            current.end_version = fmt.version
+    return result
+
+
+class TraceStore:
+    # Stores traces as references to content-addressed bodies of their
+    # TEST_START/TEST_END blocks, so identical per-test event sequences are
+    # stored and decoded once. The manifest records the references of every
+    # trace and the multiplicity of every body.
+    def __init__(self, directory):
+        self.directory = str(directory)
+        self.traces: Dict[str, List[Reference]] = dict()
+        self.segments: Dict[str, Dict[str, Any]] = dict()
+        self.decoded: Dict[str, List[Event]] = dict()
+        manifest = os.path.join(self.directory, MANIFEST)
+        if os.path.exists(manifest):
+            with open(manifest, "r") as fp:
+                data = json.load(fp)
+            self.traces = {
+                name: list(map(Reference.deserialize, references))
+                for name, references in data["traces"].items()
+            }
+            self.segments = data["segments"]
+
+    def segment_path(self, digest: str) -> str:
+        return os.path.join(self.directory, SEGMENTS, digest)
+
+    def save(self):
+        os.makedirs(os.path.join(self.directory, SEGMENTS), exist_ok=True)
+        with open(os.path.join(self.directory, MANIFEST), "w") as fp:
+            json.dump(
+                {
+                    "traces": {
+                        name: [r.serialize() for r in references]
+                        for name, references in self.traces.items()
+                    },
+                    "segments": self.segments,
+                },
+                fp,
+            )
+
+    def add(self, name: str, path, base_events: Dict[int, Event]) -> List[Reference]:
+        if name in self.traces:
+            raise ValueError(f"trace {name} is already stored")
+        os.makedirs(os.path.join(self.directory, SEGMENTS), exist_ok=True)
+        references = list()
+        with open_trace(path) as fp:
+            for block in blocks(fp, base_events):
+                body = block.body(fp)
+                digest = hashlib.sha256(bytes((block.version,)) + body).hexdigest()
+                segment = self.segments.get(digest)
+                if segment is None:
+                    with open(self.segment_path(digest), "wb") as out:
+                        out.write(body)
+                    segment = self.segments[digest] = {
+                        "size": len(body),
+                        "version": block.version,
+                        "count": 0,
+                    }
+                segment["count"] += 1
+                references.append(
+                    Reference(
+                        digest, block.start, block.end, block.version, block.end_version
+                    )
+                )
+        self.traces[name] = references
+        self.save()
+        return references
+
+    def multiplicities(self, name: Optional[str] = None) -> Dict[str, int]:
+        if name is None:
+            return {digest: s["count"] for digest, s in self.segments.items()}
+        counts = dict()
+        for reference in self.traces[name]:
+            counts[reference.digest] = counts.get(reference.digest, 0) + 1
+        return counts
+
+    def decode(self, digest: str, base_events: Dict[int, Event]) -> List[Event]:
+        # decodes the body once, later calls return the same events
+        events = self.decoded.get(digest)
+        if events is None:
+            events = list()
+            fmt = Format(self.segments[digest]["version"])
+            with open(self.segment_path(digest), "rb") as fp:
+                while True:
+                    # noinspection PyBroadException
+                    try:
+                        event = load_next_event(fp, base_events, fmt)
+                    except:
+                        break
+                    if event.extended:
+                        events.extend(event.expand())
+                    else:
+                        events.append(event)
+            self.decoded[digest] = events
+        return events
+
+    def iter_blocks(self, name: str, base_events: Dict[int, Event]):
+        for reference in self.traces[name]:
+            events = self.decode(reference.digest, base_events)
+            if reference.start is not None:
+                events = [base_events[reference.start]] + events
+            if reference.end is not None:
+                events = events + [base_events[reference.end]]
+            yield reference, events
+
+    def load(self, name: str, base_events: Dict[int, Event]) -> List[Event]:
+        events = list()
+        for _, block in self.iter_blocks(name, base_events):
+            events.extend(block)
+        return events
+
+    def dispatch(self, name: str, base_events: Dict[int, Event], *models: Any):
+        for _, block in self.iter_blocks(name, base_events):
+            for event in block:
+                for model in models:
+                    event.handle(model)
+
+    def hit_counts(
+        self, base_events: Dict[int, Event], name: Optional[str] = None
+    ) -> Dict[int, int]:
+        # the hits per event id, each body is counted once and weighted by its
+        # multiplicity
+        counts = dict()
+        for digest, multiplicity in self.multiplicities(name).items():
+            for event in self.decode(digest, base_events):
+                counts[event.event_id] = counts.get(event.event_id, 0) + multiplicity
+        references = (
+            [r for t in self.traces.values() for r in t]
+            if name is None
+            else self.traces[name]
+        )
+        for reference in references:
+            for event_id in (reference.start, reference.end):
+                if event_id is not None:
+                    counts[event_id] = counts.get(event_id, 0) + 1
+        return counts
+
+    def export(self, name: str, output, sync: int = 0):
+        # writes the trace back, equal to the stored one record by record except
+        # for sync records, which are written anew after every sync bytes
+        version = LEGACY
+        with open(output, "wb") as fp:
+            out = SyncWriter(fp, sync, zlib.crc32) if sync > 0 else fp
+            for reference in self.traces[name]:
+                if reference.version != version:
+                    out.write(encode_format(reference.version))
+                if reference.start is not None:
+                    out.write(encodings[reference.version].event(reference.start))
+                with open(self.segment_path(reference.digest), "rb") as segment:
+                    out.write(segment.read())
+                version = reference.end_version
+                if reference.end is not None:
+                    out.write(encodings[version].event(reference.end))
+            out.close()
@@ -4,14 +4,251 @@ import sys
 sys.path = sys.path[1:] + sys.path[:1]
 import atexit
 import os
-import pickle
-from typing import Any
 
 sys.path = sys.path[-1:] + sys.path[:-1]
 
-from sflkitlib.events import codec
+# typing is only imported by type checkers, see sflkitlib.events
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, BinaryIO, Callable, Optional, Tuple
 
-_event_path_file = open(os.getenv("EVENTS_PATH", default="EVENTS_PATH"), "wb")
+from sflkitlib.events import codec, EventType
+
+
+def import_module(name: str):
+    # imports a module with the directory of the instrumented program moved to
+    # the end of sys.path, like the imports at the top of this module
+    sys.path = sys.path[1:] + sys.path[:1]
+    try:
+        return __import__(name)
+    finally:
+        sys.path = sys.path[-1:] + sys.path[:-1]
+
+
+class LazyModule:
+    # Imports the module on first use and replaces itself with it, so only
+    # processes that need e.g. pickle for a value pay for importing it.
+    def __init__(self, name: str):
+        self.name = name
+
+    def __getattr__(self, item: str):
+        module = import_module(self.name)
+        globals()[self.name] = module
+        return getattr(module, item)
+
+
+pickle = LazyModule("pickle")
+socket = LazyModule("socket")
+time = LazyModule("time")
+zlib = LazyModule("zlib")
+
+# EVENTS_FORMAT selects the record encoding, see codec.FORMATS
+_trace_encoding = codec.encodings[
+    codec.FORMATS[os.getenv("EVENTS_FORMAT", default="legacy")]
+]
+_encoding = _trace_encoding
+# EVENTS_TIMESTAMPS=1 ends every record in the nanoseconds since the previous
+# one, see codec.TIMESTAMPED
+_timestamps = os.getenv("EVENTS_TIMESTAMPS", default="0") != "0"
+
+
+def remove_segments(path: str):
+    # removes the segments of a previous rotated trace at path, as listed in
+    # its manifest, and the manifest itself
+    manifest = path + codec.SEGMENTS
+    if not os.path.exists(manifest):
+        return
+    directory = os.path.dirname(path)
+    with open(manifest, "r") as fp:
+        names = fp.read().split()
+    for name in names:
+        segment = os.path.join(directory, name)
+        if os.path.exists(segment):
+            os.remove(segment)
+    os.remove(manifest)
+
+
+def resolve_output() -> "Tuple[str, str]":
+    # The output is opened at the first event, when the program may already
+    # have changed its working directory, so relative paths are resolved when
+    # the module is imported or reset.
+    transport = os.getenv("EVENTS_TRANSPORT", default="file")
+    scheme, _, address = transport.partition(":")
+    if scheme in ("unix", "pipe"):
+        transport = f"{scheme}:{os.path.abspath(address)}"
+    return transport, os.path.abspath(os.getenv("EVENTS_PATH", default="EVENTS_PATH"))
+
+
+_events_transport, _events_path = resolve_output()
+
+
+def open_events(transport: str, path: str) -> "BinaryIO":
+    # EVENTS_TRANSPORT=unix:<path> streams the events to a collector listening on
+    # a unix domain socket, EVENTS_TRANSPORT=pipe:<path> writes them to a named
+    # pipe, EVENTS_TRANSPORT=shm:<name> appends them to a shared memory ring
+    # buffer, otherwise they are written to the file path (EVENTS_PATH).
+    scheme, _, address = transport.partition(":")
+    buffering = int(os.getenv("EVENTS_BUFFER", default=str(1 << 16)))
+    if scheme == "unix":
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(address)
+        stream = sock.makefile("wb", buffering=buffering)
+        # the connection stays open until the stream is closed
+        sock.close()
+        return stream
+    elif scheme == "pipe":
+        return open(address, "wb", buffering=buffering)
+    elif scheme == "shm":
+        from sflkitlib.events.ring import RingWriter
+
+        return RingWriter(
+            address,
+            overflow=os.getenv("EVENTS_OVERFLOW", default="block"),
+            spill_path=path,
+        )
+    elif scheme == "file":
+        # a manifest left by a previous rotated trace would add its segments
+        if os.path.exists(path + codec.SEGMENTS):
+            os.remove(path + codec.SEGMENTS)
+        return open(path, "wb")
+    else:
+        raise ValueError(f"unknown events transport {transport}")
+
+
+def open_sync(stream: "BinaryIO") -> "BinaryIO":
+    # EVENTS_SYNC=<n> adds a sync record to the trace after every n bytes
+    sync_interval = int(os.getenv("EVENTS_SYNC", default="0"))
+    if sync_interval > 0:
+        stream = codec.SyncWriter(stream, sync_interval, zlib.crc32)
+    return stream
+
+
+STOP = "stop"
+FIRST = "first"
+LAST = "last"
+COUNTS = "counts"
+
+
+class RotatingWriter:
+    # Writes the trace to path, path.1, path.2, ... and starts a new segment
+    # before a record would grow the current one beyond segment_size bytes.
+    # The current segments are listed in the manifest path + codec.SEGMENTS.
+    # Records are never split and every segment starts with the format header,
+    # so segments decode on their own. If the segments would exceed budget
+    # bytes in total, the policy applies: STOP drops all further records and
+    # calls on_stop, FIRST drops all further records, LAST removes the oldest
+    # segments and COUNTS calls on_counts, after which records are written
+    # without limit as they are expected to be aggregated by the caller.
+    def __init__(
+        self,
+        path: str,
+        segment_size: int = 0,
+        budget: int = 0,
+        policy: str = STOP,
+        header: bytes = b"",
+        on_stop=None,
+        on_counts=None,
+    ):
+        if policy not in (STOP, FIRST, LAST, COUNTS):
+            raise ValueError(f"unknown budget policy {policy}")
+        self.path = path
+        self.segment_size = segment_size or budget
+        self.budget = budget
+        self.policy = policy
+        self.header = header
+        self.on_stop = on_stop
+        self.on_counts = on_counts
+        self.segments = list()
+        self.total = 0
+        self.stopped = False
+        self.counting = False
+        self.stream = None
+        self.number = 0
+        remove_segments(path)
+        self.rotate()
+
+    @property
+    def written(self) -> int:
+        return self.segments[-1][1]
+
+    def rotate(self):
+        if self.stream is not None:
+            self.stream.close()
+        path = f"{self.path}.{self.number}" if self.number else self.path
+        self.number += 1
+        self.stream = open_sync(open(path, "wb"))
+        self.stream.write(self.header)
+        self.segments.append([path, len(self.header)])
+        self.total += len(self.header)
+        self.write_manifest()
+
+    def drop_oldest(self):
+        path, size = self.segments.pop(0)
+        self.write_manifest()
+        os.remove(path)
+        self.total -= size
+
+    def write_manifest(self):
+        # replaced at once, such that readers never see a partial manifest
+        manifest = self.path + codec.SEGMENTS
+        with open(manifest + ".tmp", "w") as fp:
+            for path, _ in self.segments:
+                fp.write(os.path.basename(path) + "\n")
+        os.replace(manifest + ".tmp", manifest)
+
+    def write(self, data: bytes):
+        if self.stopped:
+            return
+        if not self.counting:
+            exceeded = self.budget and self.total + len(data) > self.budget
+            if exceeded and self.policy == COUNTS:
+                # this record is kept, all following ones are aggregated
+                self.counting = True
+                if self.on_counts is not None:
+                    self.on_counts()
+            elif exceeded and self.policy != LAST:
+                self.stopped = True
+                if self.policy == STOP and self.on_stop is not None:
+                    self.on_stop()
+                return
+            elif (
+                self.written + len(data) > self.segment_size
+                and self.written > len(self.header)
+            ):
+                self.rotate()
+            if exceeded and self.policy == LAST:
+                while self.total + len(data) > self.budget and len(self.segments) > 1:
+                    self.drop_oldest()
+        self.stream.write(data)
+        self.segments[-1][1] += len(data)
+        self.total += len(data)
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        self.stream.close()
+
+
+def open_output() -> "BinaryIO":
+    # EVENTS_ROTATE=<n> rotates the trace file after n bytes, EVENTS_BUDGET=<n>
+    # limits all segments together to about n bytes and EVENTS_BUDGET_POLICY
+    # selects what happens once the budget is exhausted, see RotatingWriter
+    segment_size = int(os.getenv("EVENTS_ROTATE", default="0"))
+    budget = int(os.getenv("EVENTS_BUDGET", default="0"))
+    if (segment_size or budget) and _events_transport == "file":
+        return RotatingWriter(
+            _events_path,
+            segment_size=segment_size,
+            budget=budget,
+            policy=os.getenv("EVENTS_BUDGET_POLICY", default=STOP),
+            header=_trace_encoding.header(_timestamps),
+            on_stop=pause_recording,
+            on_counts=count_events,
+        )
+    stream = open_sync(open_events(_events_transport, _events_path))
+    stream.write(_trace_encoding.header(_timestamps))
+    return stream
 
 
 def reset():
@@ -20,18 +257,20 @@ def reset():
         dump_events()
     except:
         pass
-    global _event_path_file
-    _event_path_file = open(os.getenv("EVENTS_PATH", default="EVENTS_PATH"), "wb")
+    global _event_path_file, _encoding, _events_transport, _events_path
+    _encoding = _trace_encoding
+    _events_transport, _events_path = resolve_output()
+    _event_path_file = open_output()
 
 
-def get_id(x: Any):
+def get_id(x: "Any"):
     try:
         return id(x)
     except (AttributeError, TypeError):
         return None
 
 
-def get_type(x: Any):
+def get_type(x: "Any"):
     try:
         return type(x)
     except (AttributeError, TypeError):
@@ -39,6 +278,9 @@ def get_type(x: Any):
 
 
 def dump_events():
+    flush_condition_blocks()
+    leave_loops()
+    write_counts()
     try:
         _event_path_file.flush()
         _event_path_file.close()
@@ -46,30 +288,410 @@ def dump_events():
         pass
 
 
-def write(encoded_event: bytes):
+def write_record(encoded_event: bytes):
     global _event_path_file
     try:
         _event_path_file.write(encoded_event)
     except ValueError:
         pass
+    except OSError:
+        # the collector of a socket or pipe transport is gone or was never
+        # there, the program under test keeps running without its trace
+        failed, _event_path_file = _event_path_file, ClosedOutput()
+        # noinspection PyBroadException
+        try:
+            failed.close()
+        except:
+            pass
+
+
+def write_timestamped(encoded_event: bytes):
+    # the timestamp is written with its record, so sync records and segment
+    # boundaries never separate them, counted events write nothing
+    global _last_time
+    if not encoded_event:
+        return
+    now = time.perf_counter_ns()
+    write_record(encoded_event + codec.encode_varint(now - _last_time))
+    _last_time = now
+
+
+if _timestamps:
+    _last_time = time.perf_counter_ns()
+    write = write_timestamped
+else:
+    write = write_record
 
 
 atexit.register(dump_events)
 
 
+class EventFilter:
+    # Decides at capture time which events are recorded: types is a collection
+    # of EventTypes or their names, ids and exclude_ids are collections of ids
+    # and inclusive (first, last) ranges of ids. As every id belongs to exactly
+    # one event type, the decision is cached per id.
+    def __init__(self, types=None, ids=None, exclude_ids=None):
+        self.types = None
+        if types is not None:
+            self.types = {EventType[t] if isinstance(t, str) else t for t in types}
+        self.ids = None if ids is None else list(ids)
+        self.exclude_ids = list(exclude_ids or [])
+        self.decisions = dict()
+
+    @staticmethod
+    def matches(ids, event_id: int) -> bool:
+        for i in ids:
+            if isinstance(i, tuple):
+                if i[0] <= event_id <= i[1]:
+                    return True
+            elif i == event_id:
+                return True
+        return False
+
+    def skips(self, event_type: EventType, event_id: int) -> bool:
+        try:
+            return self.decisions[event_id]
+        except KeyError:
+            skip = (
+                (self.types is not None and event_type not in self.types)
+                or (self.ids is not None and not self.matches(self.ids, event_id))
+                or self.matches(self.exclude_ids, event_id)
+            )
+            self.decisions[event_id] = skip
+            return skip
+
+
+def parse_ids(ids: str):
+    # parses e.g. "1-100,200" into [(1, 100), 200]
+    result = list()
+    for part in ids.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-", 1)
+            result.append((int(first), int(last)))
+        else:
+            result.append(int(part))
+    return result
+
+
+def set_filter(types=None, ids=None, exclude_ids=None):
+    global _filter
+    if types is None and ids is None and exclude_ids is None:
+        _filter = None
+    else:
+        _filter = EventFilter(types, ids, exclude_ids)
+
+
+def clear_filter():
+    set_filter()
+
+
+def load_filter():
+    # EVENTS_TYPES, EVENTS_IDS and EVENTS_EXCLUDE_IDS configure the filter, e.g.
+    # EVENTS_TYPES=FUNCTION_ENTER,CONDITION EVENTS_IDS=1-100,200
+    types = os.getenv("EVENTS_TYPES")
+    ids = os.getenv("EVENTS_IDS")
+    exclude_ids = os.getenv("EVENTS_EXCLUDE_IDS")
+    set_filter(
+        None if types is None else [t for t in map(str.strip, types.split(",")) if t],
+        None if ids is None else parse_ids(ids),
+        None if exclude_ids is None else parse_ids(exclude_ids),
+    )
+
+
+_filter = None
+load_filter()
+
+# EVENTS_RECORDING=0 starts the program with recording switched off
+_recording = os.getenv("EVENTS_RECORDING", default="1") != "0"
+
+
+def start_recording():
+    global _recording
+    _recording = True
+
+
+def stop_recording():
+    global _recording
+    if _recording:
+        _recording = False
+        # pending outcomes and running loops belong to the closed window
+        flush_condition_blocks()
+        leave_loops()
+
+
+def pause_recording():
+    # Only switches recording off, such that it is safe while a hook is
+    # running, e.g. when the writer exhausts the budget. Pending condition
+    # blocks and running loops are kept, nothing is written until recording is
+    # started again, so they continue then or are flushed at exit.
+    global _recording
+    _recording = False
+
+
+def is_recording() -> bool:
+    return _recording
+
+
+class Recording:
+    # Records the events inside a with block, the previous state is restored
+    # on exit such that windows can be nested.
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.previous = None
+
+    def __enter__(self):
+        self.previous = _recording
+        if self.enabled:
+            start_recording()
+        else:
+            stop_recording()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.previous:
+            start_recording()
+        else:
+            stop_recording()
+
+
+def recording(enabled: bool = True) -> Recording:
+    return Recording(enabled)
+
+
+def toggle_recording(*_):
+    # runs as a signal handler between any two bytecodes of a hook, so it only
+    # switches the flag and never writes
+    if _recording:
+        pause_recording()
+    else:
+        start_recording()
+
+
+def install_toggle(signum=None):
+    # toggles recording whenever the process receives signum, e.g. SIGUSR1,
+    # which can also be set by EVENTS_TOGGLE_SIGNAL=SIGUSR1
+    import signal
+
+    if isinstance(signum, str):
+        signum = getattr(signal, signum)
+    signal.signal(signal.SIGUSR1 if signum is None else signum, toggle_recording)
+
+
+if os.getenv("EVENTS_TOGGLE_SIGNAL"):
+    install_toggle(os.getenv("EVENTS_TOGGLE_SIGNAL"))
+
+# Once the budget of the trace is exhausted with EVENTS_BUDGET_POLICY=counts,
+# the hooks only count the events, the counts are written as one record at exit.
+_counts = None
+
+
+def count_event(event_id: int, *_) -> bytes:
+    _counts[event_id] = _counts.get(event_id, 0) + 1
+    return b""
+
+
+def count_condition_block(event_id: int, count: int, _: int) -> bytes:
+    _counts[event_id] = _counts.get(event_id, 0) + count
+    return b""
+
+
+def count_capture(*_) -> bytes:
+    # the event itself is counted by the encoder of its record
+    return b""
+
+
+def count_loop_summary(begin_id: int, count: int, hit_id: int, end_id: int):
+    _counts[begin_id] = _counts.get(begin_id, 0) + 1
+    if count:
+        _counts[hit_id] = _counts.get(hit_id, 0) + count
+    if end_id is not None:
+        _counts[end_id] = _counts.get(end_id, 0) + 1
+    return b""
+
+
+def count_events():
+    global _encoding, _counts
+    _counts = dict()
+    _encoding = codec.Encoding(
+        _trace_encoding.version,
+        count_event,
+        count_event,
+        count_event,
+        count_event,
+        count_event,
+        count_event,
+        count_event,
+        count_condition_block,
+        _trace_encoding.hit_counts,
+        count_capture,
+        count_loop_summary,
+    )
+
+
+def write_counts():
+    global _counts
+    if _counts:
+        write(_trace_encoding.hit_counts(sorted(_counts.items())))
+    _counts = None
+
+
+class LazyOutput:
+    # Stands in for the output until the first event is written, such that a
+    # process that never writes an event neither opens nor creates it.
+    def write(self, data: bytes):
+        global _event_path_file
+        _event_path_file = open_output()
+        _event_path_file.write(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class ClosedOutput:
+    # Replaces an output that failed, all further records are dropped.
+    def write(self, data: bytes):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+_event_path_file = LazyOutput()
+
+
 def add_line_event(event_id: int):
-    write(codec.encode_event(event_id))
+    if not _recording:
+        return
+    if _filter is not None and _filter.skips(EventType.LINE, event_id):
+        return
+    write(_encoding.event(event_id))
 
 
 def add_branch_event(event_id: int):
-    write(codec.encode_event(event_id))
+    if not _recording:
+        return
+    if _filter is not None and _filter.skips(EventType.BRANCH, event_id):
+        return
+    write(_encoding.event(event_id))
+
+
+# EVENTS_VALUES=truncate keeps only the first EVENTS_VALUE_LIMIT elements of
+# longer str, bytes and bytearray values, EVENTS_VALUES=fingerprint keeps only
+# their length and CRC-32, the default exact keeps them entirely.
+_value_policy = codec.CAPTURE_POLICIES[os.getenv("EVENTS_VALUES", default="exact")]
+_value_limit = int(os.getenv("EVENTS_VALUE_LIMIT", default="1024"))
+_bounded_types = (str, bytes, bytearray)
+
+
+def capture_value(value: "Any"):
+    # returns the capture record for a value longer than the limit and the
+    # value that is kept
+    if _value_policy == codec.TRUNCATE:
+        return _encoding.capture(codec.TRUNCATE, len(value)), value[:_value_limit]
+    data = value.encode("utf8", "surrogatepass") if isinstance(value, str) else value
+    return _encoding.capture(codec.FINGERPRINT, len(value), zlib.crc32(data)), None
+
+
+# Values of other than primitive types are recorded as a summary, by default
+# bool(value). A summarizer registered for a type or one of its bases replaces
+# it, None skips the summary, such that a value whose __bool__ or __len__ is
+# expensive or raises is recorded as None without calling them. The types named
+# in EVENTS_SUMMARY_SKIP, e.g. EVENTS_SUMMARY_SKIP=numpy.ndarray, are skipped,
+# EVENTS_SUMMARY=skip skips all types without a summarizer.
+_summarizers = dict()
+_summary_skip = {
+    name
+    for name in map(str.strip, os.getenv("EVENTS_SUMMARY_SKIP", default="").split(","))
+    if name
+}
+_summary_policy = os.getenv("EVENTS_SUMMARY", default="bool")
+# type -> (encoded type name, function from a value to its pickled summary),
+# filled on the first value of a type
+_summaries = dict()
+
+
+def register_summarizer(type_: type, summarizer: "Optional[Callable[[Any], Any]]"):
+    _summarizers[type_] = summarizer
+    _summaries.clear()
+
+
+def skip_summary(type_: type):
+    register_summarizer(type_, None)
+
 
+def constant_summary(summary: "Any"):
+    value = pickle.dumps(summary)
+    return lambda _: value
 
-def add_def_event(event_id: int, var_id: int, value: Any, type_: type):
+
+def pickled_summary(summarizer: "Callable[[Any], Any]"):
+    none = pickle.dumps(None)
+
+    def summarize(value: "Any") -> bytes:
+        # noinspection PyBroadException
+        try:
+            return pickle.dumps(summarizer(value))
+        except:
+            return none
+
+    return summarize
+
+
+def summarize_type(type_: type):
+    name = f"{type_.__module__}.{type_.__name__}"
+    for base in type_.__mro__:
+        if base in _summarizers:
+            summarizer = _summarizers[base]
+            break
+    else:
+        if name in _summary_skip or _summary_policy == "skip":
+            summarizer = None
+        elif not hasattr(type_, "__bool__") and not hasattr(type_, "__len__"):
+            # bool() of such values is always True
+            summarizer = True
+        else:
+            summarizer = bool
+    if summarizer is None or summarizer is True:
+        summarize = constant_summary(summarizer)
+    else:
+        summarize = pickled_summary(summarizer)
+    summary = _summaries[type_] = (name.encode("utf8"), summarize)
+    return summary
+
+
+def add_def_event(event_id: int, var_id: int, value: "Any", type_: type):
+    if not _recording:
+        return
+    if _filter is not None and _filter.skips(EventType.DEF, event_id):
+        return
     if var_id is not None:
-        if type_ in [int, float, complex, str, bytes, bytearray, bool] or value is None:
+        if _value_policy and type_ in _bounded_types and len(value) > _value_limit:
+            capture, value = capture_value(value)
             write(
-                codec.encode_def_event(
+                capture
+                + _encoding.def_event(
+                    event_id,
+                    var_id,
+                    pickle.dumps(value),
+                    type_.__name__,
+                )
+            )
+        elif (
+            type_ in [int, float, complex, str, bytes, bytearray, bool]
+            or value is None
+        ):
+            write(
+                _encoding.def_event(
                     event_id,
                     var_id,
                     pickle.dumps(value),
@@ -77,110 +699,283 @@ def add_def_event(event_id: int, var_id: int, value: Any, type_: type):
                 )
             )
         else:
+            summary = _summaries.get(type_) or summarize_type(type_)
             write(
-                codec.encode_def_event(
+                _encoding.def_event(
                     event_id,
                     var_id,
                     pickle.dumps(None),
-                    f"{type_.__module__}.{type_.__name__}",
+                    summary[0],
                 )
             )
 
 
 def add_function_enter_event(event_id: int):
-    write(codec.encode_event(event_id))
+    if not _recording:
+        return
+    if _filter is not None and _filter.skips(EventType.FUNCTION_ENTER, event_id):
+        return
+    write(_encoding.event(event_id))
 
 
 def add_function_exit_event(
     event_id: int,
-    return_value: Any,
+    return_value: "Any",
     type_: type,
 ):
+    if not _recording:
+        return
+    if _filter is not None and _filter.skips(EventType.FUNCTION_EXIT, event_id):
+        return
     if (
+        _value_policy
+        and type_ in _bounded_types
+        and len(return_value) > _value_limit
+    ):
+        capture, return_value = capture_value(return_value)
+        write(
+            capture
+            + _encoding.function_exit_event(
+                event_id,
+                pickle.dumps(return_value),
+                type_.__name__,
+            )
+        )
+    elif (
         type_ in [int, float, complex, str, bytes, bytearray, bool]
         or return_value is None
     ):
         write(
-            codec.encode_function_exit_event(
+            _encoding.function_exit_event(
                 event_id,
                 pickle.dumps(return_value),
                 type_.__name__,
             )
         )
     else:
-        # noinspection PyBroadException
-        try:
-            write(
-                codec.encode_function_exit_event(
-                    event_id,
-                    pickle.dumps(bool(return_value)),
-                    f"{type_.__module__}.{type_.__name__}",
-                )
-            )
-        except:
-            write(
-                codec.encode_function_exit_event(
-                    event_id,
-                    pickle.dumps(None),
-                    f"{type_.__module__}.{type_.__name__}",
-                )
-            )
+        name, summarize = _summaries.get(type_) or summarize_type(type_)
+        write(
+            _encoding.function_exit_event(event_id, summarize(return_value), name)
+        )
 
 
 def add_function_error_event(event_id: int):
-    write(codec.encode_event(event_id))
+    if not _recording:
+        return
+    if _filter is not None and _filter.skips(EventType.FUNCTION_ERROR, event_id):
+        return
+    write(_encoding.event(event_id))
+
+
+# With EVENTS_CONDITION_BLOCK=<n>, the outcomes of a condition are packed into
+# bits and written as a block after n evaluations, at test boundaries and at
+# exit. The order of outcomes is kept per condition but not across conditions.
+_condition_block_size = int(os.getenv("EVENTS_CONDITION_BLOCK", default="0"))
+_condition_blocks = dict()
+
+
+def flush_condition_blocks():
+    for event_id, (count, bits) in _condition_blocks.items():
+        write(_encoding.condition_block(event_id, count, bits))
+    _condition_blocks.clear()
+
+
+def add_condition_event(event_id: int, value: "Any"):
+    if not _recording:
+        return
+    if _filter is not None and _filter.skips(EventType.CONDITION, event_id):
+        return
+    if _condition_block_size:
+        block = _condition_blocks.get(event_id)
+        if block is None:
+            block = _condition_blocks[event_id] = [0, 0]
+        if value:
+            block[1] |= 1 << block[0]
+        block[0] += 1
+        if block[0] >= _condition_block_size:
+            write(_encoding.condition_block(event_id, block[0], block[1]))
+            del _condition_blocks[event_id]
+    elif value:
+        write(_encoding.condition_event(event_id, True))
+    else:
+        write(_encoding.condition_event(event_id, False))
 
 
-def add_condition_event(event_id: int, value: Any):
-    if value:
-        write(codec.encode_condition_event(event_id, True))
-    else:
-        write(codec.encode_condition_event(event_id, False))
+# With EVENTS_LOOP_SUMMARY=1, each run of a loop is written as one summary
+# record with its number of iterations at its end instead of one record per
+# LOOP_BEGIN, LOOP_HIT and LOOP_END. Whether a run is recorded is decided by
+# the filter for its LOOP_BEGIN.
+_loop_summary = os.getenv("EVENTS_LOOP_SUMMARY", default="0") != "0"
+# the running loops as [begin id, hit id, iterations], the innermost last
+_loops = []
+
+
+def load_loop_begins(path: str) -> dict:
+    # the begin id of every hit and end id, by the loop_ids of the catalog
+    from sflkitlib.events.catalog import iter_catalog
+
+    begins, members = dict(), list()
+    for event in iter_catalog(path):
+        if event.event_type == EventType.LOOP_BEGIN:
+            begins[event.loop_id] = event.event_id
+        elif event.event_type in (EventType.LOOP_HIT, EventType.LOOP_END):
+            members.append(event)
+    return {e.event_id: begins[e.loop_id] for e in members if e.loop_id in begins}
+
+
+# The begin id of every hit and end id, such that loops left by an exception
+# are recognized when a hit or the end of an outer loop arrives. With
+# EVENTS_CATALOG=<path> of the base events, they are read from the catalog.
+# Otherwise an id is bound to the innermost running loop when it first
+# arrives, which is wrong if that loop was left by an exception before.
+_loop_catalog = os.getenv("EVENTS_CATALOG") if _loop_summary else None
+_loop_begins = load_loop_begins(_loop_catalog) if _loop_catalog else dict()
+
+
+def write_loop_summary(loop: list, end_id: int = None):
+    begin_id, hit_id, count = loop
+    if _filter is not None and _filter.skips(EventType.LOOP_BEGIN, begin_id):
+        return
+    write(_encoding.loop_summary(begin_id, count, hit_id, end_id))
+
+
+def find_loop(event_id: int) -> "Optional[int]":
+    # the index of the running loop of a hit or end id
+    begin_id = _loop_begins.get(event_id)
+    if begin_id is None:
+        if _loop_catalog or not _loops:
+            return None
+        _loop_begins[event_id] = _loops[-1][0]
+        return len(_loops) - 1
+    for index in range(len(_loops) - 1, -1, -1):
+        if _loops[index][0] == begin_id:
+            return index
+    return None
+
+
+def leave_loops(index: int = -1):
+    # writes the loops above index, which were left without their end
+    while len(_loops) > index + 1:
+        write_loop_summary(_loops.pop())
 
 
 def add_loop_begin_event(event_id: int):
-    write(codec.encode_event(event_id))
+    if not _recording:
+        return
+    if _loop_summary:
+        _loops.append([event_id, None, 0])
+        return
+    if _filter is not None and _filter.skips(EventType.LOOP_BEGIN, event_id):
+        return
+    write(_encoding.event(event_id))
 
 
 def add_loop_hit_event(event_id: int):
-    write(codec.encode_event(event_id))
+    if not _recording:
+        return
+    if _filter is not None and _filter.skips(EventType.LOOP_HIT, event_id):
+        return
+    if _loop_summary:
+        index = find_loop(event_id)
+        if index is not None:
+            leave_loops(index)
+            loop = _loops[index]
+            loop[1] = event_id
+            loop[2] += 1
+            return
+    write(_encoding.event(event_id))
 
 
 def add_loop_end_event(event_id: int):
-    write(codec.encode_event(event_id))
+    if not _recording:
+        return
+    if _loop_summary:
+        index = find_loop(event_id)
+        if index is not None:
+            leave_loops(index)
+            if _filter is not None and _filter.skips(EventType.LOOP_END, event_id):
+                # the summary expands to no LOOP_END event
+                write_loop_summary(_loops.pop())
+            else:
+                write_loop_summary(_loops.pop(), event_id)
+            return
+    if _filter is not None and _filter.skips(EventType.LOOP_END, event_id):
+        return
+    write(_encoding.event(event_id))
 
 
 def add_use_event(event_id: int, var_id: int):
+    if not _recording:
+        return
+    if _filter is not None and _filter.skips(EventType.USE, event_id):
+        return
     if var_id is not None:
-        write(codec.encode_use_event(event_id, var_id))
+        write(_encoding.use_event(event_id, var_id))
 
 
 def add_len_event(event_id: int, var_id: int, length: int):
+    if not _recording:
+        return
+    if _filter is not None and _filter.skips(EventType.LEN, event_id):
+        return
     if var_id is not None:
-        write(codec.encode_len_event(event_id, var_id, length))
+        write(_encoding.len_event(event_id, var_id, length))
 
 
 def add_test_start_event(event_id: int):
-    write(codec.encode_event(event_id))
+    if not _recording:
+        return
+    if _filter is not None and _filter.skips(EventType.TEST_START, event_id):
+        return
+    if _condition_blocks:
+        flush_condition_blocks()
+    if _loops:
+        # loops still running at a test boundary were left by an exception
+        leave_loops()
+    write(_encoding.event(event_id))
 
 
 def add_test_end_event(event_id: int):
-    write(codec.encode_event(event_id))
+    if not _recording:
+        return
+    if _filter is not None and _filter.skips(EventType.TEST_END, event_id):
+        return
+    if _condition_blocks:
+        flush_condition_blocks()
+    if _loops:
+        leave_loops()
+    write(_encoding.event(event_id))
 
 
 def add_test_line_event(event_id: int):
-    write(codec.encode_event(event_id))
+    if not _recording:
+        return
+    if _filter is not None and _filter.skips(EventType.TEST_LINE, event_id):
+        return
+    write(_encoding.event(event_id))
 
 
 def add_test_def_event(event_id: int, var_id: int):
+    if not _recording:
+        return
+    if _filter is not None and _filter.skips(EventType.TEST_DEF, event_id):
+        return
     if var_id is not None:
-        write(codec.encode_base_def_event(event_id, var_id))
+        write(_encoding.base_def_event(event_id, var_id))
 
 
 def add_test_use_event(event_id: int, var_id: int):
+    if not _recording:
+        return
+    if _filter is not None and _filter.skips(EventType.TEST_USE, event_id):
+        return
     if var_id is not None:
-        write(codec.encode_use_event(event_id, var_id))
+        write(_encoding.use_event(event_id, var_id))
 
 
 def add_test_assert_event(event_id: int):
-    write(codec.encode_event(event_id))
+    if not _recording:
+        return
+    if _filter is not None and _filter.skips(EventType.TEST_ASSERT, event_id):
+        return
+    write(_encoding.event(event_id))
@@ -0,0 +1,101 @@
+import os
+import pickle
+import shutil
+import time
+import unittest
+from pathlib import Path
+
+from sflkitlib.events import cache, catalog, codec, event
+
+FILE = "main.py"
+
+
+class CacheTest(unittest.TestCase):
+    def setUp(self):
+        self.events = [
+            event.LineEvent(FILE, 1, 0),
+            event.DefEvent(FILE, 2, 1, "x"),
+            event.ConditionEvent(FILE, 3, 2, "x", "tmp"),
+            event.FunctionExitEvent(FILE, 4, 3, "f", 0, "tmp"),
+        ]
+        self.base_events = {e.event_id: e for e in self.events}
+        self.catalog = Path("tmp_cache_catalog")
+        self.path = Path("tmp_cache_trace")
+        self.directory = Path("tmp_cache")
+        catalog.dump_catalog(self.catalog, self.events)
+        self.write(10)
+
+    def tearDown(self):
+        for path in (self.catalog, self.path):
+            if path.exists():
+                os.remove(path)
+        if self.directory.exists():
+            shutil.rmtree(self.directory)
+
+    def write(self, n: int):
+        with self.path.open("wb") as fp:
+            for i in range(n):
+                fp.write(codec.encode_event(0))
+                fp.write(codec.encode_def_event(1, 7, pickle.dumps(i), "int"))
+                fp.write(codec.encode_condition_block(2, 3, 0b101))
+                fp.write(codec.encode_capture(codec.FINGERPRINT, 100, 42))
+                fp.write(codec.encode_function_exit_event(3, pickle.dumps(None), "str"))
+
+    def assertSameEvents(self, expected, actual):
+        self.assertEqual(expected, actual)
+        for e, a in zip(expected, actual):
+            self.assertEqual(e.serialize(), a.serialize())
+            self.assertEqual(e.capture, a.capture)
+
+    def test_memory(self):
+        traces = cache.TraceCache()
+        expected = event.load(self.path, self.base_events)
+        first = traces.load(self.path, self.catalog)
+        self.assertSameEvents(expected, first)
+        second = traces.load(self.path, self.catalog)
+        self.assertSameEvents(expected, second)
+        self.assertIs(first[0], second[0])
+        # a changed trace is decoded again
+        time.sleep(0.01)
+        self.write(3)
+        self.assertEqual(
+            event.load(self.path, self.base_events),
+            traces.load(self.path, self.catalog),
+        )
+        self.assertEqual((3, 3), (traces.hits, traces.misses))
+
+    def test_base_events(self):
+        traces = cache.TraceCache(content=True)
+        events = traces.load(self.path, self.base_events)
+        self.assertIs(events[0], traces.load(self.path, self.base_events)[0])
+        other = dict(self.base_events)
+        self.assertIsNot(events[0], traces.load(self.path, other)[0])
+
+    def test_budget(self):
+        size = cache.estimate_size(event.load(self.path, self.base_events))
+        traces = cache.TraceCache(budget=size)
+        traces.load(self.path, self.base_events)
+        self.assertEqual(1, len(traces))
+        other = dict(self.base_events)
+        traces.load(self.path, other)
+        self.assertEqual(1, len(traces))
+        self.assertLessEqual(traces.size, size)
+        traces.load(self.path, self.base_events)
+        self.assertEqual(0, traces.hits)
+
+    def test_size_values(self):
+        def_ = event.DefEvent(FILE, 2, 1, "x")
+        small = def_.instantiate(1, "", "str")
+        large = def_.instantiate(1, "x" * 100_000, "str")
+        self.assertLessEqual(
+            100_000 + cache.estimate_size([small]), cache.estimate_size([large])
+        )
+
+    def test_persistence(self):
+        expected = event.load(self.path, self.base_events)
+        traces = cache.TraceCache(directory=self.directory)
+        self.assertSameEvents(expected, traces.load(self.path, self.catalog))
+        self.assertEqual(0, traces.restores)
+        restored = cache.TraceCache(directory=self.directory)
+        self.assertSameEvents(expected, restored.load(self.path, self.catalog))
+        self.assertEqual(1, restored.restores)
@@ -0,0 +1,61 @@
+import json
+import os
+import unittest
+from pathlib import Path
+
+from sflkitlib.events import catalog, event
+
+FILE = "main.py"
+OTHER = "other.py"
+
+
+class CatalogTest(unittest.TestCase):
+    def setUp(self):
+        self.events = [
+            event.LineEvent(FILE, 1, 0),
+            event.BranchEvent(FILE, 2, 1, 2, 3),
+            event.DefEvent(FILE, 3, 2, "x"),
+            event.FunctionEnterEvent(OTHER, 4, 3, "f", 0),
+            event.FunctionExitEvent(OTHER, 5, 4, "f", 0, "tmp"),
+            event.FunctionErrorEvent(OTHER, 6, 5, "f", 0),
+            event.ConditionEvent(FILE, 7, 6, "x < y", "tmp"),
+            event.LoopBeginEvent(FILE, 8, 7, 0),
+            event.LoopHitEvent(FILE, 9, 8, 0),
+            event.LoopEndEvent(FILE, 10, 9, 0),
+            event.UseEvent(FILE, 11, 10, "x"),
+            event.LenEvent(FILE, 12, 11, "x"),
+            event.TestStartEvent(OTHER, 13, 12, "test", 1),
+            event.TestEndEvent(OTHER, 14, 13, "test", 1),
+            event.TestLineEvent(OTHER, 15, 14),
+            event.TestDefEvent(OTHER, 16, 15, "y"),
+            event.TestUseEvent(OTHER, 17, 16, "y"),
+            event.TestAssertEvent(OTHER, 18, 17),
+        ]
+        self.path = Path("tmp_catalog")
+
+    def tearDown(self):
+        if self.path.exists():
+            os.remove(self.path)
+
+    def assertSameEvents(self, loaded):
+        self.assertEqual(self.events, loaded)
+        for expected, actual in zip(self.events, loaded):
+            self.assertIs(type(expected), type(actual))
+            self.assertEqual(expected.serialize(), actual.serialize())
+
+    def test_compact(self):
+        catalog.dump_catalog(self.path, iter(self.events))
+        loaded = list(catalog.iter_catalog(self.path))
+        self.assertSameEvents(loaded)
+        # every file string is written once and shared by its events
+        self.assertEqual(1, self.path.read_text().count(json.dumps(OTHER)))
+        self.assertIs(loaded[3].file, loaded[4].file)
+
+    def test_lines(self):
+        catalog.dump_lines(self.path, self.events)
+        self.assertSameEvents(list(catalog.iter_catalog(self.path)))
+
+    def test_json_document(self):
+        with self.path.open("w") as fp:
+            json.dump(self.events, fp, cls=event.EventEncoder)
+        self.assertEqual(event.load_json(self.path), catalog.load_catalog(self.path))
@@ -95,3 +95,93 @@ class CodecTest(unittest.TestCase):
             self.assertEqual(e_3, events[2])
         finally:
             os.remove(path)
+
+    def test_condition_block(self):
+        e = event.ConditionEvent(FILE, LINE, ID, "x < y", "tmp")
+        dump = codec.encode_condition_block(ID, 10, 0b1000000101)
+        block = event.load_next_event(io.BytesIO(dump), {ID: e})
+        self.assertIsInstance(block, event.ConditionBlock)
+        self.assertEqual(dump, block.dump())
+        self.assertEqual(3, block.true_count)
+        self.assertEqual(7, block.false_count)
+        expanded = block.expand()
+        self.assertEqual(10, len(expanded))
+        self.assertEqual(
+            [True, False, True] + [False] * 6 + [True], [c.value for c in expanded]
+        )
+        self.assertTrue(all(c == e for c in expanded))
+
+
+class VarintCodecTest(unittest.TestCase):
+    def _assert(self, e: event.Event, dump: bytes, mapping: Dict[int, Event]):
+        encoding = codec.encodings[codec.VARINT]
+        self.assertEqual(e.dump(encoding), dump)
+        fmt = event.Format(codec.VARINT)
+        self.assertEqual(e, event.load_next_event(io.BytesIO(dump), mapping, fmt))
+
+    def test_varint(self):
+        for x in [0, 1, 127, 128, 300, 2**14 - 1, 2**14, 2**32, 2**70]:
+            self.assertEqual(
+                x, event.read_varint(io.BytesIO(codec.encode_varint(x)))
+            )
+        self.assertEqual(b"\xff\x7f", codec.encode_varint(2**14 - 1))
+        self.assertEqual(b"\x80\x80\x01", codec.encode_varint(2**14))
+        self.assertEqual(b"\x01", codec.encode_varint_event(0))
+        self.assertEqual(b"\x7f", codec.encode_varint_event(126))
+        self.assertEqual(b"\x80\x01", codec.encode_varint_event(127))
+        self.assertEqual(2, len(codec.encode_varint_event(200)))
+
+    def test_line(self):
+        e = event.LineEvent(FILE, LINE, 300)
+        self._assert(e, codec.encode_varint_event(300), {300: e})
+
+    def test_def(self):
+        e = event.DefEvent(FILE, LINE, ID, "x", 1, 1, "int")
+        dump = codec.encode_varint_def_event(ID, 1, 1, "int")
+        self._assert(e, dump, {ID: e})
+
+    def test_function_exit(self):
+        e = event.FunctionExitEvent(FILE, LINE, ID, "main", 1, "tmp", 1, "int")
+        dump = codec.encode_varint_function_exit_event(ID, 1, "int")
+        self._assert(e, dump, {ID: e})
+
+    def test_condition(self):
+        e = event.ConditionEvent(FILE, LINE, ID, "x < y", "tmp", True)
+        dump = codec.encode_varint_condition_event(ID, True)
+        self._assert(e, dump, {ID: e})
+
+    def test_use(self):
+        e = event.UseEvent(FILE, LINE, ID, "x", 2**40)
+        dump = codec.encode_varint_use_event(ID, 2**40)
+        self._assert(e, dump, {ID: e})
+
+    def test_len(self):
+        e = event.LenEvent(FILE, LINE, ID, "x", 1, 5)
+        dump = codec.encode_varint_len_event(ID, 1, 5)
+        self._assert(e, dump, {ID: e})
+
+    def test_condition_block(self):
+        e = event.ConditionEvent(FILE, LINE, ID, "x < y", "tmp")
+        block = event.ConditionBlock(e, 3, 0b101)
+        dump = block.dump(codec.encodings[codec.VARINT])
+        loaded = event.load_next_event(
+            io.BytesIO(dump), {ID: e}, event.Format(codec.VARINT)
+        )
+        self.assertEqual([True, False, True], loaded.outcomes)
+
+    def test_load_versioned(self):
+        events = [
+            event.LineEvent(FILE, 1, 0),
+            event.DefEvent(FILE, 2, 1, "x", 7, 3, "int"),
+            event.LineEvent(FILE, 3, 200),
+        ]
+        mapping = {e.event_id: e for e in events}
+        path = Path("tmp")
+        event.dump(path, events, codec.encodings[codec.VARINT])
+        try:
+            self.assertEqual(events, event.load(path, mapping))
+            self.assertRaises(
+                ValueError, event.load_next_event, path.open("rb"), mapping
+            )
+        finally:
+            os.remove(path)
@@ -0,0 +1,76 @@
+import os
+import subprocess
+import sys
+import threading
+import unittest
+from pathlib import Path
+
+from sflkitlib.events import event
+from sflkitlib.events.collector import Collector, collect_pipe
+
+FILE = "main.py"
+SRC = str(Path(__file__).parent.parent / "src")
+
+PROGRAM = """
+import sflkitlib.lib
+sflkitlib.lib.add_line_event(0)
+sflkitlib.lib.add_condition_event(1, True)
+sflkitlib.lib.add_line_event(0)
+"""
+
+
+class RecordingModel:
+    def __init__(self):
+        self.events = []
+
+    def __getattr__(self, item):
+        if item.startswith("handle_"):
+            return self.events.append
+        raise AttributeError(item)
+
+
+class CollectorTest(unittest.TestCase):
+    def setUp(self):
+        self.line = event.LineEvent(FILE, 1, 0)
+        self.condition = event.ConditionEvent(FILE, 2, 1, "x", "tmp")
+        self.base_events = {0: self.line, 1: self.condition}
+        self.expected = [self.line, self.condition, self.line]
+
+    @staticmethod
+    def run_program(transport: str):
+        env = dict(os.environ)
+        env["EVENTS_TRANSPORT"] = transport
+        env["PYTHONPATH"] = SRC
+        return subprocess.Popen([sys.executable, "-c", PROGRAM], env=env)
+
+    def test_unix_socket(self):
+        path = "tmp_collector.sock"
+        output = "tmp_collector_{}"
+        model = RecordingModel()
+        with Collector(path, self.base_events, model, output=output) as collector:
+            process = self.run_program(f"unix:{path}")
+            collector.serve(connections=1, timeout=10)
+            process.wait()
+        try:
+            self.assertEqual(self.expected, model.events)
+            self.assertEqual(
+                self.expected, event.load(output.format(0), self.base_events)
+            )
+        finally:
+            os.remove(output.format(0))
+        self.assertFalse(os.path.exists(path))
+
+    def test_named_pipe(self):
+        path = "tmp_collector.fifo"
+        os.mkfifo(path)
+        model = RecordingModel()
+        try:
+            reader = threading.Thread(
+                target=collect_pipe, args=(path, self.base_events, model)
+            )
+            reader.start()
+            self.run_program(f"pipe:{path}").wait()
+            reader.join(10)
+        finally:
+            os.remove(path)
+        self.assertEqual(self.expected, model.events)
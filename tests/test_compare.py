@@ -0,0 +1,93 @@
+import os
+import unittest
+from pathlib import Path
+
+from sflkitlib.events import codec, compare, event
+
+FILE = "main.py"
+
+
+class CompareTest(unittest.TestCase):
+    def setUp(self):
+        self.first = event.TestStartEvent(FILE, 1, 0, "first", 0)
+        self.first_end = event.TestEndEvent(FILE, 2, 1, "first", 0)
+        self.second = event.TestStartEvent(FILE, 3, 2, "second", 1)
+        self.second_end = event.TestEndEvent(FILE, 4, 3, "second", 1)
+        self.condition = event.ConditionEvent(FILE, 5, 6, "x", "tmp")
+        self.base_events = {
+            0: self.first,
+            1: self.first_end,
+            2: self.second,
+            3: self.second_end,
+            4: event.LineEvent(FILE, 6, 4),
+            5: event.LineEvent(FILE, 7, 5),
+            6: self.condition,
+        }
+        self.passing = Path("tmp_passing")
+        self.failing = Path("tmp_failing")
+
+    def tearDown(self):
+        for path in (self.passing, self.failing):
+            if path.exists():
+                os.remove(path)
+
+    def write(self, path, records):
+        with path.open("wb") as fp:
+            for record in records:
+                fp.write(record)
+
+    def test_compare(self):
+        self.write(
+            self.passing,
+            [
+                codec.encode_event(0),
+                codec.encode_event(4),
+                codec.encode_event(4),
+                codec.encode_event(1),
+                codec.encode_event(2),
+                codec.encode_event(4),
+                codec.encode_condition_block(6, 2, 0b11),
+                codec.encode_event(3),
+            ],
+        )
+        self.write(
+            self.failing,
+            [
+                codec.encode_event(0),
+                codec.encode_event(4),
+                codec.encode_event(4),
+                codec.encode_event(1),
+                codec.encode_event(2),
+                codec.encode_event(4),
+                codec.encode_event(5),
+                codec.encode_condition_block(6, 3, 0b011),
+                codec.encode_event(3),
+            ],
+        )
+        comparison = compare.compare([self.passing, self.failing], self.base_events)
+        self.assertEqual({5}, comparison.differences())
+        self.assertEqual({5: 1, 6: 1}, comparison.deltas())
+        self.assertEqual({0, 1, 2, 3, 4, 6}, comparison.hit_sets()[0])
+        first = comparison.tests["first"]
+        self.assertIsNone(first.divergence)
+        self.assertEqual({}, first.deltas())
+        divergence = comparison.tests["second"].divergence
+        self.assertIs(divergence, comparison.divergence)
+        self.assertEqual(("second", 2), (divergence.test, divergence.position))
+        self.assertEqual([6, 5], divergence.event_ids)
+        self.assertEqual([12, 12], divergence.offsets)
+
+    def test_different_tests(self):
+        self.write(
+            self.passing,
+            [codec.encode_event(0), codec.encode_event(4), codec.encode_event(1)],
+        )
+        self.write(
+            self.failing,
+            [codec.encode_event(2), codec.encode_event(4), codec.encode_event(3)],
+        )
+        comparison = compare.compare([self.passing, self.failing], self.base_events)
+        self.assertEqual([1, 0], comparison.tests["first"].runs)
+        self.assertEqual([0, 1], comparison.tests["second"].runs)
+        self.assertEqual([None, 0], comparison.tests["second"].divergence.offsets)
+        self.assertEqual([1, 1], comparison.counts[4])
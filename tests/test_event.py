@@ -0,0 +1,413 @@
+import asyncio
+import io
+import os
+import pickle
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from sflkitlib.events import EventType, codec, event
+
+FILE = "main.py"
+
+
+class RecordingModel:
+    def __init__(self):
+        self.events = []
+
+    def __getattr__(self, item):
+        if item.startswith("handle_"):
+            return self.events.append
+        raise AttributeError(item)
+
+
+class DispatchTest(unittest.TestCase):
+    def setUp(self):
+        self.line = event.LineEvent(FILE, 1, 0)
+        self.def_ = event.DefEvent(FILE, 2, 1, "x")
+        self.condition = event.ConditionEvent(FILE, 3, 2, "x < y", "tmp")
+        self.base_events = {0: self.line, 1: self.def_, 2: self.condition}
+        self.path = Path("tmp_dispatch")
+        with self.path.open("wb") as fp:
+            fp.write(self.line.dump())
+            fp.write(codec.encode_def_event(1, 1, pickle.dumps(5), "int"))
+            fp.write(self.condition.instantiate(True).dump())
+            fp.write(self.line.dump())
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_dispatch_multiple_models(self):
+        first, second = RecordingModel(), RecordingModel()
+        event.dispatch(self.path, self.base_events, first, second)
+        self.assertEqual(event.load(self.path, self.base_events), first.events)
+        self.assertEqual(first.events, second.events)
+
+    def test_dispatch_payload_free_uses_base_event(self):
+        model = RecordingModel()
+        event.dispatch(self.path, self.base_events, model)
+        self.assertIs(self.line, model.events[0])
+        self.assertIs(self.line, model.events[3])
+        self.assertIsNot(self.def_, model.events[1])
+        self.assertEqual(5, model.events[1].value)
+        self.assertTrue(model.events[2].value)
+
+    def test_dispatch_condition_block(self):
+        class CountingModel:
+            def __init__(self):
+                self.counts = []
+
+            def handle_condition_block(self, block):
+                self.counts.append((block.true_count, block.false_count))
+
+        class ConditionModel:
+            def __init__(self):
+                self.values = []
+
+            def handle_condition_event(self, e):
+                self.values.append(e.value)
+
+        with self.path.open("wb") as fp:
+            fp.write(codec.encode_condition_block(2, 5, 0b10110))
+        counting, conditions = CountingModel(), ConditionModel()
+        event.dispatch(self.path, self.base_events, counting, conditions)
+        self.assertEqual([(3, 2)], counting.counts)
+        self.assertEqual([False, True, True, False, True], conditions.values)
+
+    def test_hit_counts(self):
+        with self.path.open("wb") as fp:
+            fp.write(codec.encode_event(0))
+            fp.write(codec.encode_hit_counts([(0, 2), (2, 300)]))
+        events = event.load(self.path, self.base_events)
+        self.assertEqual(303, len(events))
+        self.assertEqual(3, sum(e.event_id == 0 for e in events))
+
+
+class FollowTest(unittest.TestCase):
+    def setUp(self):
+        self.line = event.LineEvent(FILE, 1, 0)
+        self.def_ = event.DefEvent(FILE, 2, 1, "x")
+        self.base_events = {0: self.line, 1: self.def_}
+        self.path = Path("tmp_follow")
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_follow_partial_record(self):
+        record = codec.encode_def_event(1, 1, pickle.dumps("value"), "str")
+        with self.path.open("wb") as fp:
+            fp.write(self.line.dump())
+            fp.write(record[:5])
+        events = event.follow(
+            self.path, self.base_events, poll_interval=0.01, timeout=0.1
+        )
+        self.assertEqual(self.line, next(events))
+
+        def append():
+            with self.path.open("ab") as f:
+                f.write(record[5:])
+                f.write(self.line.dump())
+
+        writer = threading.Timer(0.05, append)
+        writer.start()
+        e = next(events)
+        writer.join()
+        self.assertEqual(self.def_, e)
+        self.assertEqual("value", e.value)
+        self.assertEqual(self.line, next(events))
+        self.assertRaises(StopIteration, next, events)
+
+    def test_load_drops_truncated_record(self):
+        record = codec.encode_def_event(1, 1, pickle.dumps("value"), "str")
+        with self.path.open("wb") as fp:
+            fp.write(self.line.dump())
+            fp.write(record[:-1])
+        self.assertEqual([self.line], event.load(self.path, self.base_events))
+
+
+def run_async(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class AsyncLoadTest(unittest.TestCase):
+    def setUp(self):
+        self.line = event.LineEvent(FILE, 1, 0)
+        self.def_ = event.DefEvent(FILE, 2, 1, "x")
+        self.base_events = {0: self.line, 1: self.def_}
+        self.trace = (
+            self.line.dump()
+            + codec.encode_def_event(1, 1, pickle.dumps("value"), "str")
+            + self.line.dump()
+        )
+
+    def test_many_stream_readers(self):
+        async def collect(reader):
+            return [e async for e in event.load_async(reader, self.base_events, 3)]
+
+        async def run():
+            readers = []
+            for _ in range(50):
+                reader = asyncio.StreamReader()
+                reader.feed_data(self.trace)
+                reader.feed_eof()
+                readers.append(reader)
+            return await asyncio.gather(*map(collect, readers))
+
+        results = run_async(run())
+        self.assertEqual(50, len(results))
+        for events in results:
+            self.assertEqual([self.line, self.def_, self.line], events)
+            self.assertEqual("value", events[1].value)
+
+    def test_path(self):
+        path = Path("tmp_async")
+        path.write_bytes(self.trace)
+
+        async def run():
+            return [e async for e in event.load_path_async(path, self.base_events)]
+
+        try:
+            events = run_async(run())
+        finally:
+            os.remove(path)
+        self.assertEqual([self.line, self.def_, self.line], events)
+
+
+class ScanTest(unittest.TestCase):
+    def setUp(self):
+        self.start = event.TestStartEvent(FILE, 1, 0, "test", 0)
+        self.end = event.TestEndEvent(FILE, 2, 1, "test", 0)
+        self.line = event.LineEvent(FILE, 3, 2)
+        self.def_ = event.DefEvent(FILE, 4, 3, "x")
+        self.condition = event.ConditionEvent(FILE, 5, 4, "x", "tmp")
+        self.base_events = {
+            0: self.start,
+            1: self.end,
+            2: self.line,
+            3: self.def_,
+            4: self.condition,
+        }
+        self.path = Path("tmp_scan")
+        self.def_record = codec.encode_def_event(3, 1, pickle.dumps("x" * 100), "str")
+        with self.path.open("wb") as fp:
+            fp.write(self.line.dump())
+            for _ in range(2):
+                fp.write(self.start.dump())
+                fp.write(self.line.dump())
+                fp.write(self.def_record)
+                fp.write(codec.encode_condition_block(4, 5, 0b10110))
+                fp.write(self.end.dump())
+            fp.write(self.def_record[:-1])
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_scan(self):
+        statistics = event.scan(self.path, self.base_events)
+        self.assertEqual(11, statistics.records)
+        self.assertEqual({0: 2, 1: 2, 2: 3, 3: 2, 4: 10}, statistics.ids)
+        self.assertEqual(10, statistics.types[EventType.CONDITION])
+        self.assertEqual(3, statistics.types[EventType.LINE])
+        self.assertEqual(
+            2 * len(self.def_record), statistics.bytes[EventType.DEF]
+        )
+        self.assertEqual(
+            os.path.getsize(self.path) - len(self.def_record) + 1, statistics.size
+        )
+        self.assertEqual(2, len(statistics.tests))
+        first, second = statistics.tests
+        self.assertEqual(("test", 2, 5), (first.test, first.start, first.records))
+        self.assertEqual(first.end, second.start)
+        self.assertEqual(statistics.size, second.end)
+
+    def test_scan_varint(self):
+        encoding = codec.encodings[codec.VARINT]
+        with self.path.open("wb") as fp:
+            fp.write(encoding.header())
+            fp.write(encoding.event(0))
+            fp.write(encoding.def_event(3, 1, pickle.dumps("x" * 200), "str"))
+            fp.write(encoding.condition_block(4, 3, 0b101))
+            fp.write(encoding.event(1))
+        statistics = event.scan(self.path, self.base_events)
+        self.assertEqual(4, statistics.records)
+        self.assertEqual({0: 1, 1: 1, 3: 1, 4: 3}, statistics.ids)
+        self.assertEqual(os.path.getsize(self.path), statistics.tests[0].end)
+
+
+class FilteredLoadTest(unittest.TestCase):
+    def setUp(self):
+        self.line = event.LineEvent(FILE, 1, 0)
+        self.other = event.LineEvent("other.py", 1, 1)
+        self.def_ = event.DefEvent(FILE, 2, 2, "x")
+        self.len_ = event.LenEvent(FILE, 3, 3, "x")
+        self.condition = event.ConditionEvent(FILE, 4, 4, "x", "tmp")
+        self.base_events = {
+            0: self.line,
+            1: self.other,
+            2: self.def_,
+            3: self.len_,
+            4: self.condition,
+        }
+        self.path = Path("tmp_filtered")
+        with self.path.open("wb") as fp:
+            fp.write(codec.encode_format(codec.VARINT))
+            encoding = codec.encodings[codec.VARINT]
+            for var_id in range(4):
+                fp.write(encoding.event(0))
+                fp.write(encoding.event(1))
+                fp.write(encoding.def_event(2, var_id, pickle.dumps(var_id), "int"))
+                fp.write(encoding.len_event(3, var_id, 10 * var_id))
+                fp.write(encoding.condition_block(4, 2, 0b01))
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_select_file(self):
+        ids = event.select(self.base_events, files={"other.py"})
+        self.assertEqual({1}, ids)
+        self.assertEqual(
+            [self.other] * 4, event.load_filtered(self.path, self.base_events, ids)
+        )
+
+    def test_header(self):
+        ids = event.select(
+            self.base_events, event_types={EventType.DEF, EventType.CONDITION}
+        )
+        events = event.load_filtered(
+            self.path, self.base_events, ids, header=lambda e, var_id: var_id >= 2
+        )
+        defs = [e for e in events if e.event_type == EventType.DEF]
+        self.assertEqual([2, 3], [e.value for e in defs])
+        self.assertEqual(8, len(events) - len(defs))
+
+    def test_header_captured(self):
+        encoding = codec.encodings[codec.VARINT]
+        with self.path.open("ab") as fp:
+            for var_id in range(4):
+                fp.write(
+                    encoding.capture(codec.TRUNCATE, 100)
+                    + encoding.def_event(2, var_id, pickle.dumps("x"), "str")
+                )
+        with mock.patch.object(
+            event, "load_value", wraps=event.load_value
+        ) as load_value:
+            events = event.load_filtered(
+                self.path, self.base_events, {2}, header=lambda e, var_id: var_id >= 2
+            )
+        # rejected values are not unpickled
+        self.assertEqual(4, load_value.call_count)
+        self.assertEqual([2, 3, 2, 3], [e.var_id for e in events])
+        capture = event.Capture(codec.TRUNCATE, 100)
+        self.assertEqual(
+            [None, None, capture, capture], [e.capture for e in events]
+        )
+
+    def test_unfiltered(self):
+        self.assertEqual(
+            event.load(self.path, self.base_events),
+            event.load_filtered(self.path, self.base_events),
+        )
+
+
+class TimingTest(unittest.TestCase):
+    def setUp(self):
+        self.enter_f = event.FunctionEnterEvent(FILE, 1, 0, "f", 0)
+        self.exit_f = event.FunctionExitEvent(FILE, 2, 1, "f", 0, "tmp")
+        self.error_f = event.FunctionErrorEvent(FILE, 3, 2, "f", 0)
+        self.enter_g = event.FunctionEnterEvent(FILE, 4, 3, "g", 1)
+        self.exit_g = event.FunctionExitEvent(FILE, 5, 4, "g", 1, "tmp")
+        self.begin = event.LoopBeginEvent(FILE, 6, 5, 0)
+        self.end = event.LoopEndEvent(FILE, 7, 6, 0)
+        self.base_events = {
+            e.event_id: e
+            for e in (
+                self.enter_f,
+                self.exit_f,
+                self.error_f,
+                self.enter_g,
+                self.exit_g,
+                self.begin,
+                self.end,
+            )
+        }
+        self.path = Path("tmp_timing")
+        records = [
+            (codec.encode_event(0), 5),
+            (codec.encode_event(5), 10),
+            (codec.encode_event(3), 10),
+            (codec.encode_function_exit_event(4, pickle.dumps(1), "int"), 20),
+            (codec.encode_event(6), 5),
+            (codec.encode_function_exit_event(1, pickle.dumps(2), "int"), 50),
+            # the error leaves the loop without its end
+            (codec.encode_event(0), 0),
+            (codec.encode_event(5), 10),
+            (codec.encode_event(2), 30),
+        ]
+        with self.path.open("wb") as fp:
+            fp.write(codec.DEFAULT_ENCODING.header(timestamps=True))
+            for record, delta in records:
+                fp.write(record + codec.encode_varint(delta))
+                if delta == 50:
+                    fp.write(codec.encode_sync(0))
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_timings(self):
+        timings = event.timings(self.path, self.base_events)
+        self.assertEqual(140, timings.time)
+        f, g = timings.functions[0], timings.functions[1]
+        loop = timings.loops[0]
+        self.assertEqual((2, 135, 115), (f.runs, f.inclusive, f.exclusive))
+        self.assertEqual((1, 20, 20), (g.runs, g.inclusive, g.exclusive))
+        self.assertEqual((2, 65, 45), (loop.runs, loop.inclusive, loop.exclusive))
+        self.assertIs(self.enter_f, f.event)
+
+    def test_load_timestamped(self):
+        events = event.load(self.path, self.base_events)
+        self.assertEqual(9, len(events))
+        self.assertEqual(2, events[5].return_value)
+        self.assertEqual(9, event.scan(self.path, self.base_events).records)
+
+
+class LoopSummaryTest(unittest.TestCase):
+    def test_dump_load(self):
+        begin = event.LoopBeginEvent(FILE, 1, 0, 0)
+        hit = event.LoopHitEvent(FILE, 1, 300, 0)
+        end = event.LoopEndEvent(FILE, 1, 2, 0)
+        base_events = {0: begin, 300: hit, 2: end}
+        for version in (codec.LEGACY, codec.VARINT):
+            encoding = codec.encodings[version]
+            data = encoding.header() + b"".join(
+                event.LoopSummary(base_events, begin, *args).dump(encoding)
+                for args in ((5, hit, end), (0, None, end), (1, hit, None))
+            )
+            fmt = event.Format()
+            stream = io.BytesIO(data)
+            records = [
+                event.load_next_event(stream, base_events, fmt) for _ in range(3)
+            ]
+            self.assertEqual([begin] + [hit] * 5 + [end], records[0].expand())
+            self.assertEqual([begin, end], records[1].expand())
+            self.assertEqual([begin, hit], records[2].expand())
+            statistics = event.scan_buffer(data, base_events)
+            self.assertEqual({0: 3, 300: 6, 2: 2}, statistics.ids)
+
+    def test_load_filtered(self):
+        begin = event.LoopBeginEvent(FILE, 1, 0, 0)
+        hit = event.LoopHitEvent(FILE, 1, 1, 0)
+        end = event.LoopEndEvent(FILE, 1, 2, 0)
+        base_events = {0: begin, 1: hit, 2: end}
+        path = Path("tmp_loop_summary")
+        self.addCleanup(os.remove, path)
+        path.write_bytes(event.LoopSummary(base_events, begin, 3, hit, end).dump())
+        self.assertEqual([hit] * 3, event.load_filtered(path, base_events, {1}))
+        self.assertEqual([begin], event.load_filtered(path, base_events, {0}))
+        self.assertEqual(
+            [begin, hit, hit, hit, end], event.load_filtered(path, base_events)
+        )
@@ -0,0 +1,81 @@
+import os
+import pickle
+import unittest
+from pathlib import Path
+
+from sflkitlib.events import codec, event, index
+
+FILE = "main.py"
+
+
+class IndexTest(unittest.TestCase):
+    def setUp(self):
+        self.base_events = {
+            0: event.TestStartEvent(FILE, 1, 0, "test", 0),
+            1: event.FunctionEnterEvent(FILE, 2, 1, "f", 0),
+            2: event.FunctionExitEvent(FILE, 3, 2, "f", 0, "tmp"),
+            3: event.FunctionEnterEvent(FILE, 4, 3, "g", 1),
+            4: event.FunctionErrorEvent(FILE, 5, 4, "g", 1),
+            5: event.DefEvent(FILE, 6, 5, "x"),
+            6: event.UseEvent(FILE, 7, 6, "x"),
+            7: event.LineEvent(FILE, 8, 7),
+            8: event.FunctionEnterEvent(FILE, 9, 8, "h", 2),
+        }
+        self.path = Path("tmp_index")
+        value = pickle.dumps(1)
+        records = [
+            codec.encode_event(0),  # 0 test start
+            codec.encode_event(1),  # 1 enter f
+            codec.encode_def_event(5, 10, value, "int"),  # 2 x = ...
+            codec.encode_event(3),  # 3 enter g
+            codec.encode_use_event(6, 10),  # 4 use x
+            codec.encode_event(8),  # 5 enter h, left by an exception
+            codec.encode_event(7),  # 6
+            codec.encode_event(4),  # 7 g raises
+            codec.encode_use_event(6, 10),  # 8 use x
+            codec.encode_def_event(5, 11, value, "int"),  # 9 x = ...
+            codec.encode_use_event(6, 11),  # 10 use x
+            codec.encode_function_exit_event(2, value, "int"),  # 11 f returns
+            codec.encode_event(3),  # 12 enter g
+            codec.encode_event(0),  # 13 test start
+            codec.encode_use_event(6, 11),  # 14 use x
+        ]
+        with self.path.open("wb") as fp:
+            fp.write(b"".join(records))
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_calls(self):
+        trace = index.build_index(self.path, self.base_events)
+        self.assertEqual(15, len(trace))
+        self.assertEqual(4, trace.calls)
+        f, g, h, second = range(4)
+        self.assertEqual([f, second], trace.roots())
+        self.assertEqual((1, 11), trace.span(f))
+        self.assertEqual((3, 7), trace.span(g))
+        self.assertEqual((5, 6), trace.span(h))
+        # the call still running at the end ends with the trace
+        self.assertEqual((12, 14), trace.span(second))
+        self.assertEqual([g], trace.callees(f))
+        self.assertEqual([h], trace.callees(g))
+        self.assertEqual(g, trace.parent(h))
+        self.assertIsNone(trace.parent(f))
+        self.assertEqual([f, g, h], trace.call_stack(6))
+        self.assertEqual(f, trace.call_of(8))
+        self.assertIsNone(trace.call_of(0))
+        self.assertEqual("g", trace.function(g).function)
+        self.assertEqual(
+            [3, 6, 8, 7, 4], [e.event_id for e in trace.events_in_call(g)]
+        )
+
+    def test_def_use(self):
+        trace = index.build_index(self.path, self.base_events)
+        self.assertEqual(2, trace.reaching_def(4))
+        self.assertEqual(2, trace.reaching_def(8))
+        self.assertEqual(9, trace.reaching_def(10))
+        self.assertEqual([4, 8], trace.uses(2))
+        self.assertEqual([10], trace.uses(9))
+        # defs do not reach into later tests
+        self.assertIsNone(trace.reaching_def(14))
+        self.assertIsNone(trace.reaching_def(3))
@@ -0,0 +1,590 @@
+import os
+import subprocess
+import sys
+import unittest
+import zlib
+from pathlib import Path
+
+from sflkitlib.events import catalog, codec, event
+
+FILE = "main.py"
+SRC = str(Path(__file__).parent.parent / "src")
+
+
+def run_lib(program: str, **env):
+    environment = dict(os.environ)
+    environment["PYTHONPATH"] = SRC
+    environment.update(env)
+    subprocess.run([sys.executable, "-c", program], env=environment, check=True)
+
+
+class LibTest(unittest.TestCase):
+    def setUp(self):
+        self.path = Path("tmp_lib_events")
+
+    def tearDown(self):
+        if self.path.exists():
+            os.remove(self.path)
+
+    def test_condition_blocks(self):
+        start = event.TestStartEvent(FILE, 1, 0, "test", 0)
+        end = event.TestEndEvent(FILE, 2, 1, "test", 0)
+        first = event.ConditionEvent(FILE, 3, 2, "x", "tmp")
+        second = event.ConditionEvent(FILE, 4, 3, "y", "tmp")
+        base_events = {0: start, 1: end, 2: first, 3: second}
+        run_lib(
+            "import sflkitlib.lib as lib\n"
+            "lib.add_test_start_event(0)\n"
+            "for i in range(10):\n"
+            "    lib.add_condition_event(2, i % 3 == 0)\n"
+            "    lib.add_condition_event(3, i > 6)\n"
+            "lib.add_test_end_event(1)\n",
+            EVENTS_PATH=str(self.path),
+            EVENTS_CONDITION_BLOCK="4",
+        )
+        events = event.load(self.path, base_events)
+        self.assertEqual(22, len(events))
+        self.assertEqual(start, events[0])
+        self.assertEqual(end, events[-1])
+        self.assertEqual(
+            [i % 3 == 0 for i in range(10)],
+            [e.value for e in events if e.event_id == 2],
+        )
+        self.assertEqual(
+            [i > 6 for i in range(10)], [e.value for e in events if e.event_id == 3]
+        )
+
+    def test_varint_format(self):
+        line = event.LineEvent(FILE, 1, 300)
+        def_ = event.DefEvent(FILE, 2, 1, "x")
+        base_events = {300: line, 1: def_}
+        run_lib(
+            "import sflkitlib.lib as lib\n"
+            "lib.add_line_event(300)\n"
+            "lib.add_def_event(1, 5, 'value', str)\n",
+            EVENTS_PATH=str(self.path),
+            EVENTS_FORMAT="varint",
+        )
+        events = event.load(self.path, base_events)
+        self.assertEqual([line, def_], events)
+        self.assertEqual("value", events[1].value)
+
+    def test_sync_records(self):
+        from sflkitlib.events.recovery import recover
+
+        line = event.LineEvent(FILE, 1, 0)
+        run_lib(
+            "import sflkitlib.lib as lib\n"
+            "for _ in range(100):\n"
+            "    lib.add_line_event(0)\n",
+            EVENTS_PATH=str(self.path),
+            EVENTS_SYNC="64",
+        )
+        self.assertEqual(200 + 4 * 10, self.path.stat().st_size)
+        recovery = recover(self.path, {0: line})
+        self.assertTrue(recovery.complete)
+        self.assertEqual([line] * 100, recovery.events)
+
+    def test_filter(self):
+        first = event.LineEvent(FILE, 1, 0)
+        second = event.LineEvent(FILE, 2, 1)
+        third = event.LineEvent(FILE, 3, 2)
+        enter = event.FunctionEnterEvent(FILE, 4, 3, "f", 0)
+        def_ = event.DefEvent(FILE, 5, 4, "x")
+        base_events = {0: first, 1: second, 2: third, 3: enter, 4: def_}
+        run_lib(
+            "import sflkitlib.lib as lib\n"
+            "for i in range(5):\n"
+            "    lib.add_line_event(i % 3)\n"
+            "lib.add_function_enter_event(3)\n"
+            "lib.add_def_event(4, 1, object(), object)\n"
+            "lib.set_filter(types=['FUNCTION_ENTER'])\n"
+            "lib.add_line_event(0)\n"
+            "lib.add_function_enter_event(3)\n"
+            "lib.clear_filter()\n"
+            "lib.add_line_event(2)\n",
+            EVENTS_PATH=str(self.path),
+            EVENTS_TYPES="LINE, FUNCTION_ENTER, ",
+            EVENTS_IDS="0-1,3",
+            EVENTS_EXCLUDE_IDS="1",
+        )
+        events = event.load(self.path, base_events)
+        self.assertEqual([first, first, enter, enter, third], events)
+
+    def test_recording_windows(self):
+        first = event.LineEvent(FILE, 1, 0)
+        second = event.LineEvent(FILE, 2, 1)
+        third = event.LineEvent(FILE, 3, 2)
+        base_events = {0: first, 1: second, 2: third}
+        run_lib(
+            "import os, signal\n"
+            "import sflkitlib.lib as lib\n"
+            "lib.add_line_event(0)\n"
+            "with lib.recording():\n"
+            "    lib.add_line_event(1)\n"
+            "    with lib.recording(False):\n"
+            "        lib.add_line_event(0)\n"
+            "    lib.add_line_event(1)\n"
+            "lib.add_line_event(0)\n"
+            "os.kill(os.getpid(), signal.SIGUSR1)\n"
+            "lib.add_line_event(2)\n"
+            "lib.stop_recording()\n"
+            "lib.add_line_event(0)\n",
+            EVENTS_PATH=str(self.path),
+            EVENTS_RECORDING="0",
+            EVENTS_TOGGLE_SIGNAL="SIGUSR1",
+        )
+        events = event.load(self.path, base_events)
+        self.assertEqual([second, second, third], events)
+
+    def test_toggle_inside_hook(self):
+        # a toggle signal can arrive while a hook writes, switching recording
+        # off and on again there must neither write nor lose pending state
+        condition = event.ConditionEvent(FILE, 1, 0, "x", "tmp")
+        begin = event.LoopBeginEvent(FILE, 2, 1, 0)
+        hit = event.LoopHitEvent(FILE, 2, 2, 0)
+        end = event.LoopEndEvent(FILE, 2, 3, 0)
+        base_events = {0: condition, 1: begin, 2: hit, 3: end}
+        program = (
+            "import sflkitlib.lib as lib\n"
+            "{}"
+            "for i in range(3):\n"
+            "    lib.add_loop_begin_event(1)\n"
+            "    for j in range(10):\n"
+            "        lib.add_loop_hit_event(2)\n"
+            "        lib.add_condition_event(0, j % 3 == 0)\n"
+            "    lib.add_loop_end_event(3)\n"
+        )
+        interrupt = (
+            "write = lib.write\n"
+            "def interrupted(data):\n"
+            "    write(data)\n"
+            "    lib.toggle_recording()\n"
+            "    lib.toggle_recording()\n"
+            "lib.write = interrupted\n"
+        )
+        env = dict(
+            EVENTS_PATH=str(self.path),
+            EVENTS_CONDITION_BLOCK="4",
+            EVENTS_LOOP_SUMMARY="1",
+            EVENTS_SYNC="16",
+        )
+        run_lib(program.format(""), **env)
+        expected = event.load(self.path, base_events)
+        run_lib(program.format(interrupt), **env)
+        self.assertEqual(expected, event.load(self.path, base_events))
+
+    def rotate(self, policy: str, **env):
+        line = event.LineEvent(FILE, 1, 0)
+        other = event.LineEvent(FILE, 2, 1)
+        base_events = {0: line, 1: other}
+        run_lib(
+            "import sflkitlib.lib as lib\n"
+            "for i in range(100):\n"
+            "    lib.add_line_event(i % 2)\n",
+            **{
+                "EVENTS_PATH": str(self.path),
+                "EVENTS_ROTATE": "20",
+                "EVENTS_BUDGET_POLICY": policy,
+                **env,
+            },
+        )
+        paths = event.segment_paths(self.path)
+        for path in paths + [f"{self.path}{codec.SEGMENTS}"]:
+            if path != str(self.path):
+                self.addCleanup(os.remove, path)
+        return paths, event.load(self.path, base_events)
+
+    def test_rotation(self):
+        paths, events = self.rotate("stop")
+        self.assertEqual(10, len(paths))
+        self.assertTrue(all(os.path.getsize(path) == 20 for path in paths))
+        self.assertEqual([i % 2 for i in range(100)], [e.event_id for e in events])
+
+    def test_budget_stop(self):
+        paths, events = self.rotate("stop", EVENTS_BUDGET="50")
+        self.assertEqual(3, len(paths))
+        self.assertEqual([i % 2 for i in range(25)], [e.event_id for e in events])
+
+    def test_budget_stop_pending(self):
+        # stopping at the budget inside a hook keeps the pending condition
+        # blocks and running loops of the hook intact
+        condition = event.ConditionEvent(FILE, 1, 0, "x", "tmp")
+        loops = [
+            event.LoopBeginEvent(FILE, 2, 1, 0),
+            event.LoopHitEvent(FILE, 2, 2, 0),
+            event.LoopEndEvent(FILE, 2, 3, 0),
+            event.LoopBeginEvent(FILE, 3, 4, 1),
+            event.LoopHitEvent(FILE, 3, 5, 1),
+        ]
+        base_events = {e.event_id: e for e in [condition] + loops}
+        run_lib(
+            "import sflkitlib.lib as lib\n"
+            "for i in range(50):\n"
+            "    lib.add_condition_event(0, i % 2 == 0)\n",
+            EVENTS_PATH=str(self.path),
+            EVENTS_BUDGET="40",
+            EVENTS_CONDITION_BLOCK="8",
+        )
+        events = event.load(self.path, base_events)
+        self.assertLess(0, len(events))
+        self.assertEqual(
+            [i % 2 == 0 for i in range(len(events))], [e.value for e in events]
+        )
+        run_lib(
+            "import sflkitlib.lib as lib\n"
+            "lib.add_loop_begin_event(1)\n"
+            "for i in range(5):\n"
+            "    lib.add_loop_hit_event(2)\n"
+            "    lib.add_loop_begin_event(4)\n"
+            "    lib.add_loop_hit_event(5)\n"
+            "lib.add_loop_end_event(3)\n",
+            EVENTS_PATH=str(self.path),
+            EVENTS_BUDGET="12",
+            EVENTS_LOOP_SUMMARY="1",
+        )
+        events = event.load(self.path, base_events)
+        self.assertEqual([loops[3], loops[4]], events)
+
+    def test_budget_last(self):
+        paths, events = self.rotate("last", EVENTS_BUDGET="50")
+        self.assertNotIn(str(self.path), paths)
+        self.assertEqual(str(self.path) + ".9", paths[-1])
+        self.assertLessEqual(sum(map(os.path.getsize, paths)), 50)
+        self.assertEqual(2 * len(events), sum(map(os.path.getsize, paths)))
+        self.assertEqual(
+            [i % 2 for i in range(100 - len(events), 100)],
+            [e.event_id for e in events],
+        )
+
+    def test_budget_last_single(self):
+        # only the last numbered segment remains
+        paths, events = self.rotate("last", EVENTS_BUDGET="50", EVENTS_ROTATE="50")
+        self.assertEqual([str(self.path) + ".3"], paths)
+        self.assertEqual(
+            [i % 2 for i in range(100 - len(events), 100)],
+            [e.event_id for e in events],
+        )
+
+    def test_unrelated_segments(self):
+        # files that merely look like segments are neither read nor removed
+        other = Path(f"{self.path}.1")
+        other.write_bytes(codec.encode_event(0))
+        self.addCleanup(os.remove, other)
+        run_lib(
+            "import sflkitlib.lib as lib\n"
+            "lib.add_line_event(1)\n",
+            EVENTS_PATH=str(self.path),
+        )
+        self.assertTrue(other.exists())
+        self.assertEqual([str(self.path)], event.segment_paths(self.path))
+        line = event.LineEvent(FILE, 1, 1)
+        self.assertEqual([line], event.load(self.path, {1: line}))
+        # a rotated trace lists its segments, a later plain trace drops the list
+        run_lib(
+            "import sflkitlib.lib as lib\n"
+            "for i in range(20):\n"
+            "    lib.add_line_event(1)\n",
+            EVENTS_PATH=str(self.path),
+            EVENTS_ROTATE="20",
+        )
+        self.assertEqual(
+            [str(self.path), str(other)], event.segment_paths(self.path)
+        )
+        run_lib(
+            "import sflkitlib.lib as lib\n"
+            "lib.add_line_event(1)\n",
+            EVENTS_PATH=str(self.path),
+        )
+        self.assertEqual([str(self.path)], event.segment_paths(self.path))
+
+    def test_budget_counts(self):
+        paths, events = self.rotate(
+            "counts", EVENTS_BUDGET="50", EVENTS_FORMAT="varint"
+        )
+        self.assertEqual(100, len(events))
+        self.assertEqual(50, sum(e.event_id for e in events))
+
+    def test_lazy_output(self):
+        run_lib(
+            "import sflkitlib.lib as lib\n"
+            "assert isinstance(lib.pickle, lib.LazyModule)\n",
+            EVENTS_PATH=str(self.path),
+        )
+        self.assertFalse(self.path.exists())
+        run_lib(
+            "import sflkitlib.lib as lib\n"
+            "lib.add_def_event(0, 1, 5, int)\n"
+            "assert not isinstance(lib.pickle, lib.LazyModule)\n",
+            EVENTS_PATH=str(self.path),
+        )
+        def_ = event.DefEvent(FILE, 1, 0, "x")
+        events = event.load(self.path, {0: def_})
+        self.assertEqual(5, events[0].value)
+
+    def test_transport_failure(self):
+        # neither a missing collector nor one that goes away ends the program
+        address = str(self.path)
+        run_lib(
+            "import sflkitlib.lib as lib\n"
+            "lib.add_line_event(0)\n"
+            "lib.add_line_event(1)\n"
+            "assert isinstance(lib._event_path_file, lib.ClosedOutput)\n",
+            EVENTS_TRANSPORT=f"unix:{address}",
+        )
+        run_lib(
+            "import socket, sflkitlib.lib as lib\n"
+            "server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)\n"
+            f"server.bind({address!r})\n"
+            "server.listen(1)\n"
+            "lib.add_line_event(0)\n"
+            "server.accept()[0].close()\n"
+            "server.close()\n"
+            "for _ in range(1 << 16):\n"
+            "    lib.add_line_event(0)\n"
+            "assert isinstance(lib._event_path_file, lib.ClosedOutput)\n",
+            EVENTS_TRANSPORT=f"unix:{address}",
+            EVENTS_BUFFER="0",
+        )
+
+    def test_output_after_chdir(self):
+        # the trace is written relative to the directory at import
+        directory = Path("tmp_lib_directory")
+        directory.mkdir()
+        self.addCleanup(directory.rmdir)
+        run_lib(
+            "import os, sflkitlib.lib as lib\n"
+            f"os.chdir({str(directory)!r})\n"
+            "lib.add_line_event(0)\n",
+            EVENTS_PATH=str(self.path),
+        )
+        line = event.LineEvent(FILE, 1, 0)
+        self.assertEqual([line], event.load(self.path, {0: line}))
+
+    def test_lazy_asyncio(self):
+        # the catalog of loop summaries imports the event module
+        run_lib(
+            "import sys, sflkitlib.events.event\n"
+            "assert 'asyncio' not in sys.modules\n",
+        )
+
+    def test_value_capture(self):
+        def_ = event.DefEvent(FILE, 1, 0, "x")
+        exit_ = event.FunctionExitEvent(FILE, 2, 1, "f", 0, "tmp")
+        base_events = {0: def_, 1: exit_}
+        program = (
+            "import sflkitlib.lib as lib\n"
+            "lib.add_def_event(0, 1, 'short', str)\n"
+            "lib.add_def_event(0, 1, 'x' * 100, str)\n"
+            "lib.add_function_exit_event(1, b'y' * 100, bytes)\n"
+        )
+        run_lib(
+            program,
+            EVENTS_PATH=str(self.path),
+            EVENTS_VALUES="truncate",
+            EVENTS_VALUE_LIMIT="10",
+        )
+        short, long, returned = event.load(self.path, base_events)
+        self.assertEqual(("short", None), (short.value, short.capture))
+        self.assertEqual("x" * 10, long.value)
+        self.assertEqual(event.Capture(codec.TRUNCATE, 100), long.capture)
+        self.assertEqual(b"y" * 10, returned.return_value)
+        run_lib(
+            program,
+            EVENTS_PATH=str(self.path),
+            EVENTS_VALUES="fingerprint",
+            EVENTS_VALUE_LIMIT="10",
+            EVENTS_FORMAT="varint",
+        )
+        short, long, returned = event.load(self.path, base_events)
+        self.assertEqual("short", short.value)
+        self.assertIsNone(long.value)
+        self.assertEqual(
+            event.Capture(codec.FINGERPRINT, 100, zlib.crc32(b"x" * 100)), long.capture
+        )
+        self.assertEqual(zlib.crc32(b"y" * 100), returned.capture.fingerprint)
+
+    def test_timestamps(self):
+        enter = event.FunctionEnterEvent(FILE, 1, 0, "f", 0)
+        exit_ = event.FunctionExitEvent(FILE, 2, 1, "f", 0, "tmp")
+        begin = event.LoopBeginEvent(FILE, 3, 2, 0)
+        end = event.LoopEndEvent(FILE, 4, 3, 0)
+        condition = event.ConditionEvent(FILE, 5, 4, "x", "tmp")
+        base_events = {0: enter, 1: exit_, 2: begin, 3: end, 4: condition}
+        run_lib(
+            "import sflkitlib.lib as lib\n"
+            "for _ in range(3):\n"
+            "    lib.add_function_enter_event(0)\n"
+            "    lib.add_loop_begin_event(2)\n"
+            "    for i in range(10):\n"
+            "        lib.add_condition_event(4, i % 2 == 0)\n"
+            "    lib.add_loop_end_event(3)\n"
+            "    lib.add_function_exit_event(1, 'x' * 100, str)\n",
+            EVENTS_PATH=str(self.path),
+            EVENTS_TIMESTAMPS="1",
+            EVENTS_FORMAT="varint",
+            EVENTS_CONDITION_BLOCK="4",
+            EVENTS_SYNC="16",
+        )
+        events = event.load(self.path, base_events)
+        self.assertEqual(42, len(events))
+        self.assertEqual(
+            ["x" * 100] * 3, [e.return_value for e in events if e.event_id == 1]
+        )
+        timings = event.timings(self.path, base_events)
+        function, loop = timings.functions[0], timings.loops[0]
+        self.assertEqual((3, 3), (function.runs, loop.runs))
+        self.assertEqual(function.inclusive, function.exclusive)
+        self.assertLess(0, loop.inclusive)
+        self.assertLess(loop.inclusive, function.inclusive)
+        self.assertLessEqual(function.inclusive, timings.time)
+
+    def test_loop_summary(self):
+        outer = [
+            event.LoopBeginEvent(FILE, 1, 0, 0),
+            event.LoopHitEvent(FILE, 1, 1, 0),
+            event.LoopEndEvent(FILE, 1, 2, 0),
+        ]
+        inner = [
+            event.LoopBeginEvent(FILE, 2, 3, 1),
+            event.LoopHitEvent(FILE, 2, 4, 1),
+            event.LoopEndEvent(FILE, 2, 5, 1),
+        ]
+        line = event.LineEvent(FILE, 3, 6)
+        base_events = {e.event_id: e for e in outer + inner + [line]}
+        program = (
+            "import sflkitlib.lib as lib\n"
+            "lib.add_loop_begin_event(0)\n"
+            "for i in range(3):\n"
+            "    lib.add_loop_hit_event(1)\n"
+            "    lib.add_loop_begin_event(3)\n"
+            "    try:\n"
+            "        for j in range(4):\n"
+            "            lib.add_loop_hit_event(4)\n"
+            "            lib.add_line_event(6)\n"
+            "            if i == 1 and j == 1:\n"
+            "                raise ValueError()\n"
+            "        lib.add_loop_end_event(5)\n"
+            "    except ValueError:\n"
+            "        pass\n"
+            "lib.add_loop_end_event(2)\n"
+            "lib.add_loop_begin_event(3)\n"
+            "lib.add_loop_end_event(5)\n"
+            "lib.add_loop_begin_event(3)\n"
+            "lib.add_loop_hit_event(4)\n"
+        )
+        run_lib(program, EVENTS_PATH=str(self.path))
+        expected = event.load(self.path, base_events)
+        run_lib(program, EVENTS_PATH=str(self.path), EVENTS_LOOP_SUMMARY="1")
+        with self.path.open("rb") as fp:
+            records = list()
+            while True:
+                try:
+                    records.append(event.load_next_event(fp, base_events))
+                except:
+                    break
+        summaries = [r for r in records if isinstance(r, event.LoopSummary)]
+        self.assertEqual(
+            [(3, 4, 5), (3, 2, None), (3, 4, 5), (0, 3, 2), (3, 0, 5), (3, 1, None)],
+            [
+                (s.event_id, s.count, None if s.end is None else s.end.event_id)
+                for s in summaries
+            ],
+        )
+        events = event.load(self.path, base_events)
+        self.assertEqual(len(expected), len(events))
+        # the loop events are rebuilt at the end of their loops, the other
+        # events keep their order
+        self.assertEqual(
+            [e for e in expected if e is line], [e for e in events if e is line]
+        )
+        for e in outer + inner:
+            self.assertEqual(expected.count(e), events.count(e))
+        # the summaries expand to no LOOP_END event that the filter excludes
+        types = "LOOP_BEGIN,LOOP_HIT,LINE"
+        run_lib(program, EVENTS_PATH=str(self.path), EVENTS_TYPES=types)
+        expected = event.load(self.path, base_events)
+        run_lib(
+            program,
+            EVENTS_PATH=str(self.path),
+            EVENTS_LOOP_SUMMARY="1",
+            EVENTS_TYPES=types,
+        )
+        events = event.load(self.path, base_events)
+        self.assertNotIn(outer[2], events)
+        self.assertNotIn(inner[2], events)
+        for e in outer + inner + [line]:
+            self.assertEqual(expected.count(e), events.count(e))
+
+    def test_loop_summary_exception(self):
+        outer = [
+            event.LoopBeginEvent(FILE, 1, 1, 0),
+            event.LoopHitEvent(FILE, 1, 2, 0),
+            event.LoopEndEvent(FILE, 1, 3, 0),
+        ]
+        inner = [
+            event.LoopBeginEvent(FILE, 2, 4, 1),
+            event.LoopHitEvent(FILE, 2, 5, 1),
+            event.LoopEndEvent(FILE, 2, 6, 1),
+        ]
+        base_events = {e.event_id: e for e in outer + inner}
+        events = Path("tmp_lib_catalog")
+        self.addCleanup(os.remove, events)
+        catalog.dump_catalog(events, outer + inner)
+        # the inner loop is left by an exception before the outer loop ends
+        run_lib(
+            "import sflkitlib.lib as lib\n"
+            "lib.add_loop_begin_event(1)\n"
+            "lib.add_loop_hit_event(2)\n"
+            "lib.add_loop_begin_event(4)\n"
+            "lib.add_loop_hit_event(5)\n"
+            "lib.add_loop_end_event(3)\n",
+            EVENTS_PATH=str(self.path),
+            EVENTS_LOOP_SUMMARY="1",
+            EVENTS_CATALOG=str(events),
+        )
+        self.assertEqual(
+            [inner[0], inner[1], outer[0], outer[1], outer[2]],
+            event.load(self.path, base_events),
+        )
+
+    def test_summarizers(self):
+        exits = {
+            i: event.FunctionExitEvent(FILE, i, i, "f", 0, "tmp") for i in range(5)
+        }
+        run_lib(
+            "import sflkitlib.lib as lib\n"
+            "class Lazy:\n"
+            "    def __len__(self):\n"
+            "        raise RuntimeError()\n"
+            "class Costly(Lazy):\n"
+            "    pass\n"
+            "class Plain:\n"
+            "    pass\n"
+            "lib.add_function_exit_event(0, Lazy(), Lazy)\n"
+            "lib.register_summarizer(Lazy, lambda value: 'lazy')\n"
+            "lib.add_function_exit_event(1, Costly(), Costly)\n"
+            "lib.skip_summary(Costly)\n"
+            "lib.add_function_exit_event(2, Costly(), Costly)\n"
+            "lib.add_function_exit_event(3, Plain(), Plain)\n"
+            "lib.add_function_exit_event(4, [], list)\n",
+            EVENTS_PATH=str(self.path),
+        )
+        events = event.load(self.path, exits)
+        self.assertEqual(
+            [None, "lazy", None, True, False], [e.return_value for e in events]
+        )
+        self.assertEqual(
+            ["__main__.Lazy", "__main__.Costly", "__main__.Costly"],
+            [e.type_ for e in events[:3]],
+        )
+        run_lib(
+            "import sflkitlib.lib as lib\n"
+            "lib.add_function_exit_event(0, [1], list)\n"
+            "lib.add_function_exit_event(1, {}, dict)\n",
+            EVENTS_PATH=str(self.path),
+            EVENTS_SUMMARY_SKIP="builtins.tuple, builtins.list",
+        )
+        self.assertEqual(
+            [None, False], [e.return_value for e in event.load(self.path, exits)]
+        )
@@ -0,0 +1,129 @@
+import os
+import pickle
+import unittest
+import zlib
+from pathlib import Path
+
+from sflkitlib.events import codec, event
+from sflkitlib.events.merge import concat, load_index, merge, segments
+from sflkitlib.events.recovery import recover
+
+FILE = "test_main.py"
+
+
+class MergeTest(unittest.TestCase):
+    def setUp(self):
+        self.base_events = {0: event.LineEvent(FILE, 1, 0)}
+        for test_id in range(4):
+            self.base_events[1 + 2 * test_id] = event.TestStartEvent(
+                FILE, 10 + test_id, 1 + 2 * test_id, f"test_{test_id}", test_id
+            )
+            self.base_events[2 + 2 * test_id] = event.TestEndEvent(
+                FILE, 20 + test_id, 2 + 2 * test_id, f"test_{test_id}", test_id
+            )
+        self.base_events[9] = event.DefEvent(FILE, 2, 9, "x")
+        self.paths = [Path("tmp_shard_0"), Path("tmp_shard_1")]
+        self.output = Path("tmp_merged")
+        self.index = Path("tmp_merged.json")
+        self.write(self.paths[0], [0, 2])
+        self.write(self.paths[1], [1, 3], truncated=True)
+
+    def write(
+        self, path: Path, tests, truncated: bool = False, version=None, sync: int = 0
+    ):
+        encoding = codec.encodings[version or codec.LEGACY]
+        with path.open("wb") as out:
+            fp = codec.SyncWriter(out, sync, zlib.crc32) if sync else out
+            fp.write(encoding.header())
+            for test_id in tests:
+                fp.write(encoding.event(1 + 2 * test_id))
+                fp.write(encoding.event(0))
+                fp.write(encoding.def_event(9, 1, pickle.dumps(test_id), "int"))
+                fp.write(encoding.event(2 + 2 * test_id))
+            if truncated:
+                fp.write(encoding.def_event(9, 1, pickle.dumps(1), "int")[:-2])
+            fp.close()
+
+    def tearDown(self):
+        for path in self.paths + [self.output, self.index]:
+            if path.exists():
+                os.remove(path)
+
+    def started(self, path):
+        return [
+            e.test
+            for e in event.load(path, self.base_events)
+            if isinstance(e, event.TestStartEvent)
+        ]
+
+    def test_segments(self):
+        result = segments(self.paths[1], self.base_events)
+        self.assertEqual(["test_1", "test_3"], [s.test for s in result])
+        self.assertEqual(result[0].end, result[1].start)
+        self.assertLess(result[1].end, os.path.getsize(self.paths[1]))
+
+    def test_merge(self):
+        merge(self.paths, self.base_events, self.output, index=self.index)
+        self.assertEqual(
+            ["test_0", "test_1", "test_2", "test_3"], self.started(self.output)
+        )
+        events = event.load(self.output, self.base_events)
+        self.assertEqual(16, len(events))
+        self.assertEqual([0, 1, 2, 3], [e.value for e in events if e.event_id == 9])
+        entries = load_index(self.index)
+        self.assertEqual(4, len(entries))
+        self.assertEqual(
+            os.path.getsize(self.output), sum(e["length"] for e in entries)
+        )
+
+    def test_concat(self):
+        concat(self.paths, self.base_events, self.output)
+        self.assertEqual(
+            ["test_0", "test_2", "test_1", "test_3"], self.started(self.output)
+        )
+
+    def test_merge_mixed_formats(self):
+        self.write(self.paths[0], [0, 2], version=codec.VARINT)
+        merge(self.paths, self.base_events, self.output)
+        self.assertEqual(
+            ["test_0", "test_1", "test_2", "test_3"], self.started(self.output)
+        )
+        events = event.load(self.output, self.base_events)
+        self.assertEqual([0, 1, 2, 3], [e.value for e in events if e.event_id == 9])
+
+    def test_merge_rotated(self):
+        # the second shard was rotated after its first test
+        data = self.paths[1].read_bytes()
+        first = segments(self.paths[1], self.base_events)[0]
+        rotated = Path(f"{self.paths[1]}.1")
+        manifest = Path(f"{self.paths[1]}{codec.SEGMENTS}")
+        self.paths += [rotated, manifest]
+        manifest.write_text(f"{self.paths[1].name}\n{rotated.name}\n")
+        header = codec.encodings[codec.LEGACY].header()
+        rotated.write_bytes(header + data[first.end :])
+        self.paths[1].write_bytes(data[: first.end])
+        merge(self.paths[:2], self.base_events, self.output)
+        self.assertEqual(
+            ["test_0", "test_1", "test_2", "test_3"], self.started(self.output)
+        )
+        events = event.load(self.output, self.base_events)
+        self.assertEqual([0, 1, 2, 3], [e.value for e in events if e.event_id == 9])
+
+    def test_merge_sync_records(self):
+        self.write(self.paths[0], [0, 2], sync=10)
+        self.write(self.paths[1], [1, 3], sync=10)
+        merge(self.paths, self.base_events, self.output, index=self.index)
+        expected = event.load(self.output, self.base_events)
+        self.assertEqual(16, len(expected))
+        self.assertEqual(
+            os.path.getsize(self.output),
+            sum(e["length"] for e in load_index(self.index)),
+        )
+        concat(self.paths, self.base_events, self.output, sync=16)
+        recovery = recover(self.output, self.base_events)
+        self.assertTrue(recovery.complete)
+        self.assertEqual(16, len(recovery.events))
+        merge(self.paths, self.base_events, self.output, index=self.index, sync=16)
+        recovery = recover(self.output, self.base_events)
+        self.assertTrue(recovery.complete)
+        self.assertEqual(expected, recovery.events)
@@ -0,0 +1,105 @@
+import os
+import pickle
+import unittest
+import zlib
+from pathlib import Path
+
+from sflkitlib.events import codec, event
+from sflkitlib.events.recovery import recover
+
+FILE = "main.py"
+
+
+class RecoveryTest(unittest.TestCase):
+    def setUp(self):
+        self.base_events = {i: event.LineEvent(FILE, i, i) for i in range(1, 5)}
+        self.base_events[5] = event.DefEvent(FILE, 5, 5, "x")
+        self.path = Path("tmp_recovery")
+
+    def tearDown(self):
+        for path in event.segment_paths(self.path):
+            os.remove(path)
+        manifest = Path(f"{self.path}{codec.SEGMENTS}")
+        if manifest.exists():
+            os.remove(manifest)
+
+    def records(self, n: int):
+        result = list()
+        for i in range(n):
+            result.append(codec.encode_event(1 + i % 4))
+            result.append(codec.encode_def_event(5, 1, pickle.dumps(i), "int"))
+        return result
+
+    def test_intact(self):
+        self.path.write_bytes(b"".join(self.records(10)))
+        recovery = recover(self.path, self.base_events)
+        self.assertTrue(recovery.complete)
+        self.assertEqual(event.load(self.path, self.base_events), recovery.events)
+
+    def test_truncated_tail(self):
+        data = b"".join(self.records(10))
+        self.path.write_bytes(data[:-3])
+        recovery = recover(self.path, self.base_events)
+        self.assertEqual(19, len(recovery.events))
+        self.assertEqual(1, len(recovery.errors))
+        error = recovery.errors[0]
+        self.assertEqual("truncated record", error.reason)
+        self.assertIsNone(error.resumed)
+        self.assertEqual(len(b"".join(self.records(10)[:-1])), error.offset)
+
+    def test_truncated_def(self):
+        lines = b"".join(codec.encode_event(1 + i % 4) for i in range(20))
+        def_ = codec.encode_def_event(5, 1, pickle.dumps(list(range(8))), "list")
+        for cut in range(1, len(def_)):
+            self.path.write_bytes(lines + def_[:cut])
+            recovery = recover(self.path, self.base_events)
+            self.assertEqual(20, len(recovery.events), cut)
+            self.assertEqual(1, len(recovery.errors), cut)
+            self.assertEqual(len(lines), recovery.errors[0].offset, cut)
+            self.assertIsNone(recovery.errors[0].resumed, cut)
+
+    def test_corrupt_middle(self):
+        records = self.records(10)
+        offset = len(b"".join(records[:6]))
+        records[6] = b"\x01\x63"  # an id that is not in the base events
+        self.path.write_bytes(b"".join(records))
+        self.assertEqual(6, len(event.load(self.path, self.base_events)))
+        recovery = recover(self.path, self.base_events)
+        self.assertEqual(19, len(recovery.events))
+        self.assertEqual(1, len(recovery.errors))
+        self.assertEqual(offset, recovery.errors[0].offset)
+        self.assertEqual(offset + 2, recovery.errors[0].resumed)
+        self.assertIn("KeyError", recovery.errors[0].reason)
+
+    def test_sync_records(self):
+        chunks = [b"".join(self.records(5)) for _ in range(3)]
+        data = b"".join(c + codec.encode_sync(zlib.crc32(c)) for c in chunks)
+        # corrupt a value byte in the middle chunk, which still decodes
+        corrupt = bytearray(data)
+        position = len(chunks[0]) + 10 + 11
+        corrupt[position] ^= 0x01
+        self.path.write_bytes(bytes(corrupt))
+        recovery = recover(self.path, self.base_events)
+        self.assertEqual(20, len(recovery.events))
+        self.assertEqual(1, len(recovery.errors))
+        self.assertEqual("checksum mismatch", recovery.errors[0].reason)
+        self.assertEqual(len(chunks[0]) + 10, recovery.errors[0].offset)
+        kept = recover(self.path, self.base_events, drop_corrupt=False)
+        self.assertEqual(30, len(kept.events))
+        self.assertEqual(30, len(event.load(self.path, self.base_events)))
+
+    def test_rotated(self):
+        header = codec.encodings[codec.LEGACY].header()
+        data = [header + b"".join(self.records(5)) for _ in range(3)]
+        Path(f"{self.path}.2").write_bytes(data[2][:-3])
+        Path(f"{self.path}.1").write_bytes(data[1])
+        self.path.write_bytes(data[0])
+        Path(f"{self.path}{codec.SEGMENTS}").write_text(
+            f"{self.path.name}\n{self.path.name}.1\n{self.path.name}.2\n"
+        )
+        recovery = recover(self.path, self.base_events)
+        self.assertEqual(sum(map(len, data)) - 3, recovery.size)
+        self.assertEqual(29, len(recovery.events))
+        self.assertEqual(1, len(recovery.errors))
+        self.assertEqual("truncated record", recovery.errors[0].reason)
+        self.assertLess(len(data[0]) + len(data[1]), recovery.errors[0].offset)
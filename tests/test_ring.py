@@ -0,0 +1,72 @@
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+from sflkitlib.events import event
+from sflkitlib.events.ring import RingBuffer, RingReader
+
+FILE = "main.py"
+SRC = str(Path(__file__).parent.parent / "src")
+
+PROGRAM = """
+import sflkitlib.lib
+for _ in range(100):
+    sflkitlib.lib.add_line_event(0)
+    sflkitlib.lib.add_def_event(1, 1, "x" * 50, str)
+"""
+
+
+class RingTest(unittest.TestCase):
+    def setUp(self):
+        self.line = event.LineEvent(FILE, 1, 0)
+        self.def_ = event.DefEvent(FILE, 2, 1, "x")
+        self.base_events = {0: self.line, 1: self.def_}
+        self.spill_path = Path("tmp_ring_spill")
+
+    def tearDown(self):
+        if self.spill_path.exists():
+            os.remove(self.spill_path)
+
+    def run_program(self, ring: RingBuffer, overflow: str):
+        env = dict(os.environ)
+        env["EVENTS_TRANSPORT"] = f"shm:{ring.name}"
+        env["EVENTS_OVERFLOW"] = overflow
+        env["EVENTS_PATH"] = str(self.spill_path)
+        env["PYTHONPATH"] = SRC
+        return subprocess.Popen([sys.executable, "-c", PROGRAM], env=env)
+
+    def consume(self, capacity: int, overflow: str, wait: bool = False):
+        ring = RingBuffer.create(capacity)
+        try:
+            process = self.run_program(ring, overflow)
+            if wait:
+                # nobody drains the ring while the program runs
+                process.wait()
+            reader = RingReader(ring, spill_path=str(self.spill_path), timeout=10)
+            events = []
+            while True:
+                try:
+                    events.append(event.load_next_event(reader, self.base_events))
+                except ValueError:
+                    break
+            reader.close()
+            process.wait()
+        finally:
+            ring.close()
+            ring.unlink()
+        return events
+
+    def check(self, events):
+        self.assertEqual(200, len(events))
+        self.assertEqual([self.line, self.def_] * 100, events)
+        self.assertTrue(all(e.value == "x" * 50 for e in events[1::2]))
+
+    def test_block(self):
+        self.check(self.consume(64, "block"))
+        self.assertFalse(self.spill_path.exists())
+
+    def test_spill(self):
+        self.check(self.consume(256, "spill", wait=True))
+        self.assertTrue(self.spill_path.exists())
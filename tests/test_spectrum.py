@@ -0,0 +1,62 @@
+import os
+import pickle
+import unittest
+from pathlib import Path
+
+from sflkitlib.events import codec, event
+from sflkitlib.events.spectrum import Spectrum, build_spectrum
+
+FILE = "test_main.py"
+
+
+class SpectrumTest(unittest.TestCase):
+    def setUp(self):
+        self.base_events = {
+            0: event.TestStartEvent(FILE, 1, 0, "test_a", 0),
+            1: event.TestEndEvent(FILE, 2, 1, "test_a", 0),
+            2: event.TestStartEvent(FILE, 3, 2, "test_b", 1),
+            3: event.TestEndEvent(FILE, 4, 3, "test_b", 1),
+            4: event.LineEvent(FILE, 5, 4),
+            5: event.DefEvent(FILE, 6, 5, "x"),
+            6: event.LineEvent(FILE, 7, 6),
+        }
+        self.path = Path("tmp_spectrum")
+        self.spectrum_path = Path("tmp_spectrum.bin")
+        with self.path.open("wb") as fp:
+            fp.write(codec.encode_event(6))
+            fp.write(codec.encode_event(0))
+            fp.write(codec.encode_event(4))
+            fp.write(codec.encode_def_event(5, 1, pickle.dumps("x" * 100), "str"))
+            fp.write(codec.encode_event(4))
+            fp.write(codec.encode_event(1))
+            fp.write(codec.encode_event(2))
+            fp.write(codec.encode_event(6))
+            fp.write(codec.encode_event(3))
+
+    def tearDown(self):
+        for path in (self.path, self.spectrum_path):
+            if path.exists():
+                os.remove(path)
+
+    def test_build(self):
+        spectrum = build_spectrum(self.path, self.base_events, counts=True)
+        self.assertEqual(["test_a", "test_b"], spectrum.tests)
+        self.assertEqual([0, 1, 4, 5], spectrum.event_ids(0))
+        self.assertEqual([2, 3, 6], spectrum.event_ids(1))
+        self.assertTrue(spectrum.is_hit(0, 5))
+        self.assertFalse(spectrum.is_hit(0, 6))
+        self.assertEqual(2, spectrum.count(0, 4))
+        self.assertEqual(1, spectrum.count(1, 6))
+
+    def test_dump_load(self):
+        spectrum = build_spectrum(self.path, self.base_events, counts=True)
+        spectrum.dump(self.spectrum_path)
+        loaded = Spectrum.load(self.spectrum_path)
+        self.assertEqual(spectrum.tests, loaded.tests)
+        self.assertEqual(spectrum.hits, loaded.hits)
+        self.assertEqual(spectrum.counts, loaded.counts)
+
+    def test_without_counts(self):
+        spectrum = build_spectrum(self.path, self.base_events)
+        self.assertIsNone(spectrum.counts)
+        self.assertRaises(ValueError, spectrum.count, 0, 4)
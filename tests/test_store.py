@@ -0,0 +1,121 @@
+import os
+import pickle
+import shutil
+import unittest
+import zlib
+from pathlib import Path
+
+from sflkitlib.events import codec, event, store
+from sflkitlib.events.recovery import recover
+
+FILE = "main.py"
+
+
+class StoreTest(unittest.TestCase):
+    def setUp(self):
+        self.base_events = {
+            0: event.TestStartEvent(FILE, 1, 0, "first", 0),
+            1: event.TestEndEvent(FILE, 2, 1, "first", 0),
+            2: event.TestStartEvent(FILE, 3, 2, "second", 1),
+            3: event.TestEndEvent(FILE, 4, 3, "second", 1),
+            4: event.LineEvent(FILE, 5, 4),
+            5: event.DefEvent(FILE, 6, 5, "x"),
+        }
+        body = event.LineEvent(FILE, 5, 4).dump() + codec.encode_def_event(
+            5, 1, pickle.dumps(7), "int"
+        )
+        self.trace = Path("tmp_store_trace")
+        self.other = Path("tmp_store_other")
+        self.exported = Path("tmp_store_exported")
+        self.directory = Path("tmp_store")
+        with self.trace.open("wb") as fp:
+            fp.write(codec.encode_event(4))
+            for start, end in ((0, 1), (2, 3), (0, 1)):
+                fp.write(codec.encode_event(start) + body + codec.encode_event(end))
+        with self.other.open("wb") as fp:
+            encoding = codec.encodings[codec.VARINT]
+            fp.write(encoding.header())
+            fp.write(encoding.event(2) + encoding.event(4) + encoding.event(3))
+
+    def tearDown(self):
+        for path in (self.trace, self.other, self.exported):
+            if path.exists():
+                os.remove(path)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_dedup(self):
+        traces = store.TraceStore(self.directory)
+        references = traces.add("trace", self.trace, self.base_events)
+        self.assertEqual(4, len(references))
+        self.assertEqual(
+            [None, 0, 2, 0], [reference.start for reference in references]
+        )
+        self.assertEqual(2, len(os.listdir(self.directory / store.SEGMENTS)))
+        self.assertEqual([1, 3], sorted(traces.multiplicities().values()))
+        expected = event.load(self.trace, self.base_events)
+        self.assertEqual(expected, traces.load("trace", self.base_events))
+        counts = traces.hit_counts(self.base_events)
+        self.assertEqual({0: 2, 1: 2, 2: 1, 3: 1, 4: 4, 5: 3}, counts)
+
+    def test_sync_records(self):
+        # sync records fall at other places of equal bodies
+        body = [codec.encode_event(4), codec.encode_def_event(5, 1, b"7", "int")]
+        with self.trace.open("wb") as fp:
+            synced = codec.SyncWriter(fp, 7, zlib.crc32)
+            synced.write(codec.encode_event(4))
+            for start, end in ((0, 1), (2, 3), (0, 1)):
+                for record in [codec.encode_event(start)] + body:
+                    synced.write(record)
+                synced.write(codec.encode_event(end))
+            synced.close()
+        traces = store.TraceStore(self.directory)
+        traces.add("trace", self.trace, self.base_events)
+        self.assertEqual([1, 3], sorted(traces.multiplicities().values()))
+        expected = event.load(self.trace, self.base_events)
+        self.assertEqual(expected, traces.load("trace", self.base_events))
+        traces.export("trace", self.exported, sync=16)
+        recovery = recover(self.exported, self.base_events)
+        self.assertTrue(recovery.complete)
+        self.assertEqual(expected, recovery.events)
+
+    def test_reopen_and_export(self):
+        traces = store.TraceStore(self.directory)
+        traces.add("trace", self.trace, self.base_events)
+        traces.add("other", self.other, self.base_events)
+        reopened = store.TraceStore(self.directory)
+        self.assertEqual(traces.multiplicities(), reopened.multiplicities())
+        for name, path in (("trace", self.trace), ("other", self.other)):
+            reopened.export(name, self.exported)
+            self.assertEqual(
+                event.load(path, self.base_events),
+                event.load(self.exported, self.base_events),
+            )
+        self.assertRaises(
+            ValueError, traces.add, "other", self.other, self.base_events
+        )
+
+    def test_rotated(self):
+        # a trace rotated into segments that each start with the format header
+        encoding = codec.encodings[codec.VARINT]
+        rotated = Path("tmp_store_rotated")
+        segments = [rotated, Path(f"{rotated}.1"), Path(f"{rotated}.2")]
+        manifest = Path(f"{rotated}{codec.SEGMENTS}")
+        for segment in segments + [manifest]:
+            self.addCleanup(os.remove, segment)
+        records = [
+            encoding.event(0) + encoding.event(4),
+            encoding.def_event(5, 1, pickle.dumps(7), "int") + encoding.event(1),
+            encoding.event(0) + encoding.event(4),
+            encoding.def_event(5, 1, pickle.dumps(7), "int") + encoding.event(1),
+        ]
+        segments[0].write_bytes(encoding.header() + records[0])
+        segments[1].write_bytes(encoding.header() + records[1] + records[2])
+        segments[2].write_bytes(encoding.header() + records[3])
+        manifest.write_text("".join(f"{segment.name}\n" for segment in segments))
+        traces = store.TraceStore(self.directory)
+        traces.add("rotated", rotated, self.base_events)
+        expected = event.load(rotated, self.base_events)
+        self.assertEqual(8, len(expected))
+        self.assertEqual(expected, traces.load("rotated", self.base_events))
+        traces.export("rotated", self.exported)
+        self.assertEqual(expected, event.load(self.exported, self.base_events))